@@ -0,0 +1,45 @@
+import numpy as np
+
+import pytest
+
+from pyro.dynamic import pendulum
+from pyro.dynamic import integrator
+from pyro.analysis import costfunction
+from pyro.planning import discretizer
+
+
+# Fixtures shared by the value iteration tests
+
+@pytest.fixture
+def pendulum_vi_problem():
+    """Generate a small discretized pendulum and its cost function"""
+
+    sys = pendulum.SinglePendulum()
+
+    grid_sys = discretizer.GridDynamicSystem(sys, (21, 21), (5, 1), 0.05)
+
+    cf = sys.cost_function
+    cf.xbar = np.array([-3.14, 0])
+    cf.INF = 10000
+
+    return grid_sys, cf
+
+
+@pytest.fixture
+def min_time_problem():
+    """Minimum time to the origin of a double integrator"""
+
+    sys = integrator.DoubleIntegrator()
+    sys.x_lb = np.array([-2., -2.])
+    sys.x_ub = np.array([+2., +2.])
+    sys.u_lb = np.array([-1.])
+    sys.u_ub = np.array([+1.])
+
+    grid_sys = discretizer.GridDynamicSystem(sys, (21, 21), (3, 1), 0.1,
+                                             transition_matrix=True)
+
+    cf = costfunction.TimeCostFunction(np.zeros(2))
+    cf.EPS = 0.01
+    cf.INF = 100
+
+    return grid_sys, cf
@@ -0,0 +1,80 @@
+import numpy as np
+
+from pyro.planning import discretizer
+from pyro.planning import valueiteration
+from pyro.planning import adaptivegrid
+
+
+def test_adaptive_grid_refined_everywhere_is_uniform(min_time_problem):
+    grid_sys, cf = min_time_problem
+
+    ag = adaptivegrid.AdaptiveGridDynamicSystem(grid_sys.sys, (11, 11), (3, 1),
+                                                0.1, max_depth=1,
+                                                adaptive_dt=False)
+    ag.refine(ag.leaves())
+
+    assert ag.nodes_n == grid_sys.nodes_n
+    assert np.allclose(ag.nodes_state, grid_sys.nodes_state)
+    assert abs(ag.P - grid_sys.P).max() < 1e-12
+
+    x = np.random.default_rng(0).uniform(-2, 2, (100, 2))
+    J = grid_sys.nodes_state[:, 0] ** 2 + grid_sys.nodes_state[:, 1]
+    assert np.allclose(ag.interpolate(J, x), x[:, 0] ** 2 + x[:, 1], atol=0.01)
+
+
+def test_adaptive_value_iteration(min_time_problem):
+    grid_sys, cf = min_time_problem
+    cf.EPS = 0.2
+
+    # Uniform grid at the finest resolution
+    uniform = discretizer.GridDynamicSystem(grid_sys.sys, (41, 41), (3, 1),
+                                            0.1, transition_matrix=True)
+    vi = valueiteration.ValueIteration_ND(uniform, cf)
+    vi.initialize()
+    vi.compute_steps(1000, threshold=1e-6)
+    vi.assign_interpol_controller()
+
+    ag = adaptivegrid.AdaptiveGridDynamicSystem(grid_sys.sys, (11, 11), (3, 1),
+                                                0.4, max_depth=2)
+    avi = adaptivegrid.AdaptiveValueIteration(ag, cf)
+    avi.initialize()
+    histories = avi.compute(2, 1000, 1e-6)
+    avi.assign_interpol_controller()
+
+    assert len(histories) == 3
+    assert ag.nodes_n < uniform.nodes_n
+
+    # Same bang-bang policy on most of the feasible nodes of the uniform grid
+    u = np.array([avi.ctl.c(x, np.zeros(2))[0] for x in uniform.nodes_state])
+    u_uniform = vi.u_policy_grid[0].ravel()
+    feasible  = vi.action_policy.ravel() >= 0
+
+    agree = np.sign(np.round(u, 6)) == u_uniform
+    assert agree[feasible].mean() > 0.95
+
+
+def test_local_refinement(min_time_problem):
+    grid_sys, cf = min_time_problem
+
+    ag = adaptivegrid.AdaptiveGridDynamicSystem(grid_sys.sys, (5, 5), (3, 1),
+                                                0.1, max_depth=2)
+    nodes_n = ag.nodes_n
+
+    # Split the cell at the center of the grid twice
+    center = ag.locate(np.zeros((1, 2)))
+    ag.refine(center)
+    ag.refine(ag.locate(np.zeros((1, 2))))
+
+    assert ag.nodes_n == nodes_n + 5 + 5
+    assert ag.cell_depth[ag.locate(np.zeros((1, 2)))] == 2
+    assert ag.cell_depth[ag.locate(np.array([[1.9, 1.9]]))] == 0
+
+    # Leaves next to the refined cells still interpolate affine values
+    x = np.random.default_rng(0).uniform(-2, 2, (500, 2))
+    J = 3 * ag.nodes_state[:, 0] - ag.nodes_state[:, 1]
+
+    assert np.allclose(ag.interpolate(J, x), 3 * x[:, 0] - x[:, 1])
+
+    # Rows of valid actions are convex combinations of the leaf corners
+    row_sums = np.asarray(ag.P.sum(axis=1)).ravel()
+    assert np.allclose(row_sums, ag.action_isok.ravel())
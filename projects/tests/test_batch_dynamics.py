@@ -0,0 +1,190 @@
+import numpy as np
+
+import pytest
+
+from pyro.dynamic import system
+from pyro.dynamic import pendulum
+from pyro.dynamic import manipulator
+from pyro.dynamic import cartpole
+from pyro.dynamic import vehicle
+from pyro.dynamic import integrator
+from pyro.dynamic import statespace
+
+
+# Fixtures
+
+@pytest.fixture(params=[
+    pendulum.SinglePendulum,
+    pendulum.DoublePendulum,
+    pendulum.TwoIndependentSinglePendulum,
+    vehicle.KinematicBicyleModel,
+    vehicle.HolonomicMobileRobot,
+    vehicle.Holonomic3DMobileRobot,
+    integrator.SimpleIntegrator,
+    integrator.DoubleIntegrator,
+    integrator.TripleIntegrator,
+    ])
+def sys_under_test(request):
+    return request.param()
+
+
+@pytest.fixture(params=[
+    pendulum.SinglePendulum,
+    pendulum.DoublePendulum,
+    pendulum.TwoIndependentSinglePendulum,
+    manipulator.OneLinkManipulator,
+    manipulator.TwoLinkManipulator,
+    manipulator.ThreeLinkManipulator3D,
+    cartpole.RotatingCartPole,
+    cartpole.UnderActuatedRotatingCartPole,
+    ])
+def mechanical_sys(request):
+    sys = request.param()
+    # Non-zero damping on all joints
+    for name in ['d1', 'd2', 'd3']:
+        if hasattr(sys, name):
+            setattr(sys, name, 0.3)
+    return sys
+
+
+def random_batch(sys, npts=25, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(npts, sys.n))
+    U = rng.normal(size=(npts, sys.m))
+    return X, U
+
+
+# Tests
+
+def test_f_batch_matches_f(sys_under_test):
+    X, U = random_batch(sys_under_test)
+
+    dX = sys_under_test.f_batch(X, U)
+    dX_ref = np.array([sys_under_test.f(x, u) for x, u in zip(X, U)])
+
+    assert dX.shape == X.shape
+    np.testing.assert_allclose(dX, dX_ref, atol=1e-12)
+
+
+def test_statespace_f_batch():
+    ss = statespace.linearize(pendulum.DoublePendulum(), 0.01)
+    X, U = random_batch(ss)
+
+    dX_ref = system.ContinuousDynamicSystem.f_batch(ss, X, U)
+
+    np.testing.assert_allclose(ss.f_batch(X, U), dX_ref, atol=1e-12)
+
+
+def test_f_batch_follows_overloaded_f():
+
+    class Drifting(vehicle.HolonomicMobileRobot):
+
+        def f(self, x, u, t=0):
+            return u + t
+
+    sys = Drifting()
+    X, U = random_batch(sys)
+    t = np.linspace(0, 1, X.shape[0])
+
+    np.testing.assert_allclose(sys.f_batch(X, U), U)
+    np.testing.assert_allclose(sys.f_batch(X, U, t), U + t[:, None])
+
+
+def test_mechanical_batch_terms(mechanical_sys):
+    sys = mechanical_sys
+    X, U = random_batch(sys)
+    Q, dQ = X[:, :sys.dof], X[:, sys.dof:]
+
+    H_ref = np.array([sys.H(q) for q in Q])
+    C_ref = np.array([sys.C(q, dq) for q, dq in zip(Q, dQ)])
+    B_ref = np.array([sys.B(q) for q in Q]).reshape(-1, sys.dof, sys.m)
+    g_ref = np.array([sys.g(q) for q in Q])
+    d_ref = np.array([sys.d(q, dq) for q, dq in zip(Q, dQ)])
+
+    np.testing.assert_allclose(sys.H_batch(Q), H_ref, atol=1e-12)
+    np.testing.assert_allclose(sys.C_batch(Q, dQ), C_ref, atol=1e-12)
+    np.testing.assert_allclose(sys.B_batch(Q), B_ref, atol=1e-12)
+    np.testing.assert_allclose(sys.g_batch(Q), g_ref, atol=1e-12)
+    np.testing.assert_allclose(sys.d_batch(Q, dQ), d_ref, atol=1e-12)
+
+    ddQ_ref = np.array([sys.ddq(q, dq, u) for q, dq, u in zip(Q, dQ, U)])
+
+    np.testing.assert_allclose(sys.ddq_batch(Q, dQ, U), ddQ_ref, atol=1e-10)
+    np.testing.assert_allclose(sys.f_batch(X, U)[:, sys.dof:], ddQ_ref,
+                               atol=1e-10)
+
+
+def test_batch_terms_follow_overloaded_terms():
+
+    class NoGravity(pendulum.SinglePendulum):
+
+        def g(self, q):
+            return np.zeros(self.dof)
+
+    class StiffJoints(manipulator.TwoLinkManipulator):
+
+        def d(self, q, dq):
+            return 2.0 * dq + q
+
+    for sys in [NoGravity(), StiffJoints()]:
+        X, U = random_batch(sys)
+        Q = X[:, :sys.dof]
+
+        dX_ref = np.array([sys.f(x, u) for x, u in zip(X, U)])
+
+        np.testing.assert_allclose(sys.g_batch(Q),
+                                   [sys.g(q) for q in Q], atol=1e-12)
+        np.testing.assert_allclose(sys.f_batch(X, U), dX_ref, atol=1e-10)
+
+
+@pytest.mark.parametrize('sys_class', [
+    pendulum.DoublePendulum,
+    vehicle.HolonomicMobileRobotwithObstacles,
+    vehicle.Holonomic3DMobileRobotwithObstacles,
+    vehicle.KinematicCarModelwithObstacles,
+    manipulator.TwoLinkManipulatorwithObstacles,
+    manipulator.FiveLinkPlanarManipulatorwithObstacles,
+    ])
+def test_validity_batch_matches_loop(sys_class):
+    sys = sys_class()
+
+    rng = np.random.default_rng(0)
+    lb  = np.where(np.isfinite(sys.x_lb), sys.x_lb, -10) * 1.2
+    ub  = np.where(np.isfinite(sys.x_ub), sys.x_ub, +10) * 1.2
+    X   = rng.uniform(lb, ub, (500, sys.n))
+    U   = rng.uniform(sys.u_lb * 1.2 - 0.1, sys.u_ub * 1.2 + 0.1, (500, sys.m))
+
+    x_ok = np.array([sys.isavalidstate(x) for x in X])
+    u_ok = np.array([sys.isavalidinput(x, u) for x, u in zip(X, U)])
+
+    assert 0 < x_ok.mean() < 1
+    assert np.array_equal(sys.isavalidstate_batch(X), x_ok)
+    assert np.array_equal(sys.isavalidinput_batch(X, U), u_ok)
+
+
+def test_validity_batch_follows_overloaded_check():
+
+    class HalfPlane(vehicle.HolonomicMobileRobotwithObstacles):
+
+        def isavalidstate(self, x):
+            return x[0] > 0
+
+    X = np.random.default_rng(0).uniform(-5, 5, (100, 2))
+
+    assert np.array_equal(HalfPlane().isavalidstate_batch(X), X[:, 0] > 0)
+
+    class FirstQuadrant(manipulator.TwoLinkManipulatorwithObstacles):
+
+        def isavalidstate(self, x):
+            return x[0] > 0 and x[1] > 0
+
+        def isavalidinput(self, x, u):
+            return u[0] > x[0]
+
+    sys = FirstQuadrant()
+    X = np.random.default_rng(1).uniform(-1, 1, (100, 4))
+    U = np.random.default_rng(2).uniform(-1, 1, (100, 2))
+
+    assert np.array_equal(sys.isavalidstate_batch(X),
+                          (X[:, 0] > 0) & (X[:, 1] > 0))
+    assert np.array_equal(sys.isavalidinput_batch(X, U), U[:, 0] > X[:, 0])
@@ -0,0 +1,109 @@
+import numpy as np
+
+import pytest
+
+from pyro.dynamic import pendulum
+from pyro.control import linear
+from pyro.analysis import simulation
+from pyro.analysis import costfunction
+
+
+# Fixtures
+
+@pytest.fixture
+def pendulum_sys():
+    sys = pendulum.SinglePendulum()
+    sys.cost_function = costfunction.QuadraticCostFunction.from_sys(sys)
+    return sys
+
+
+X0 = np.array([[1.0, 0.0], [0.5, 1.0], [-2.0, 0.3]])
+
+
+def test_euler_bundle_matches_simulator(pendulum_sys):
+
+    bundle = simulation.BatchSimulator(pendulum_sys, X0, tf=5, n=501,
+                                       solver='euler').compute()
+
+    assert bundle.x.shape == (3, 501, 2)
+    assert len(bundle) == 3
+
+    for i in range(3):
+        pendulum_sys.x0 = X0[i]
+        traj = simulation.Simulator(pendulum_sys, 5, 501, 'euler').compute()
+
+        np.testing.assert_allclose(bundle.x[i], traj.x)
+        np.testing.assert_allclose(bundle.J[i], traj.J[-1])
+        np.testing.assert_allclose(bundle[i].J, traj.J)
+
+
+def test_rk4_bundle_matches_odeint(pendulum_sys):
+
+    bundle = simulation.BatchSimulator(pendulum_sys, X0, tf=5, n=501,
+                                       solver='rk4').compute()
+
+    pendulum_sys.x0 = X0[1]
+    traj = simulation.Simulator(pendulum_sys, 5, 501, 'ode').compute()
+
+    np.testing.assert_allclose(bundle.x[1], traj.x, atol=1e-5)
+
+
+def test_params_are_set_per_run(pendulum_sys):
+
+    d1 = np.array([0.0, 0.5, 1.0])
+
+    bundle = simulation.BatchSimulator(pendulum_sys, X0, tf=5, n=501,
+                                       params={'d1': d1}).compute()
+
+    # Scalar value is restored
+    assert pendulum_sys.d1 == 0
+
+    pendulum_sys.d1 = 1.0
+    pendulum_sys.x0 = X0[2]
+    traj = simulation.Simulator(pendulum_sys, 5, 501, 'ode').compute()
+
+    np.testing.assert_allclose(bundle.x[2], traj.x, atol=1e-5)
+
+
+def test_closed_loop_bundle(pendulum_sys):
+
+    ctl = linear.ProportionalController(np.array([[10.0, 2.0]]))
+    cl_sys = ctl + pendulum_sys
+
+    Y = np.random.default_rng(0).normal(size=(10, 2))
+    R = np.random.default_rng(1).normal(size=(10, 2))
+
+    expected = np.array([ctl.c(y, r) for y, r in zip(Y, R)])
+
+    np.testing.assert_allclose(ctl.c_batch(Y, R), expected)
+
+    sim = simulation.BatchSimulator(cl_sys, X0, tf=5, n=501, solver='euler')
+    sim.decimation = 10
+
+    bundle = sim.compute()
+
+    cl_sys.x0 = X0[0]
+    traj = simulation.CLosedLoopSimulator(cl_sys, 5, 501, 'euler').compute()
+
+    assert bundle.t.size == 51
+    np.testing.assert_allclose(bundle.x[0], traj.x[::10])
+    np.testing.assert_allclose(bundle.u[0], traj.u[::10])
+    np.testing.assert_allclose(bundle.J[0], traj.J[-1])
+
+
+def test_c_batch_follows_overloaded_c():
+
+    class Saturated(linear.ProportionalController):
+
+        def c(self, y, r, t=0):
+            return np.clip(linear.ProportionalController.c(self, y, r, t),
+                           -1, 1)
+
+    ctl = Saturated(np.array([[10.0, 2.0]]))
+
+    Y = np.random.default_rng(0).normal(size=(10, 2))
+    R = np.zeros((10, 2))
+
+    expected = np.array([ctl.c(y, r) for y, r in zip(Y, R)])
+
+    np.testing.assert_allclose(ctl.c_batch(Y, R), expected)
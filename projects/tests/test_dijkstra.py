@@ -0,0 +1,71 @@
+import numpy as np
+
+import pytest
+
+from pyro.planning import discretizer
+from pyro.planning import valueiteration
+from pyro.planning import dijkstra
+
+
+def test_dijkstra_matches_value_iteration(min_time_problem):
+    grid_sys, cf = min_time_problem
+
+    # Causal stencils need about one cell per time step
+    grid_sys = discretizer.GridDynamicSystem(grid_sys.sys, (41, 41), (3, 1),
+                                             0.1, transition_matrix=True)
+
+    vi = valueiteration.ValueIteration_ND(grid_sys, cf)
+    vi.initialize()
+    vi.compute_steps(1000, threshold=1e-6)
+
+    dj = dijkstra.DijkstraMinimumTime(grid_sys, cf)
+    dj.initialize()
+    dj.compute()
+
+    # Each node finalized once
+    assert np.unique(dj.order).size == dj.order.size
+    assert dj.J.shape == vi.J.shape
+
+    # Approximate where interpolation stencils are not causal
+    near = vi.J < 10
+    error = np.abs(dj.J - vi.J)[near]
+
+    assert np.median(error) < 0.05
+    assert (dj.action_policy == vi.action_policy)[near].mean() > 0.95
+
+    # Value iteration from the label-setting solution
+    dj.compute_steps(1000, threshold=1e-6)
+
+    feasible = vi.J < cf.INF - 1
+    assert np.allclose(dj.J[feasible], vi.J[feasible], atol=1e-4)
+
+
+@pytest.mark.parametrize('dt, deadlocks, error', [
+    (0.1, 0.05, 0.05),   # about one cell per time step
+    (0.05, 0.5, 2.0)])   # stencils mostly on the node itself
+def test_dijkstra_deadlocks(min_time_problem, dt, deadlocks, error):
+    grid_sys, cf = min_time_problem
+
+    grid_sys = discretizer.GridDynamicSystem(grid_sys.sys, (41, 41), (3, 1),
+                                             dt, transition_matrix=True)
+
+    vi = valueiteration.ValueIteration_ND(grid_sys, cf)
+    vi.initialize()
+    vi.compute_steps(2000, threshold=1e-6)
+
+    dj = dijkstra.DijkstraMinimumTime(grid_sys, cf)
+    dj.initialize()
+    solved = dj.compute()
+
+    feasible = vi.J < cf.INF - 1
+
+    # Deadlocks use one partial estimate each: at most one per node
+    assert 0 < dj.deadlocks <= deadlocks * solved
+    assert solved == dj.order.size
+
+    assert np.median(np.abs(dj.J - vi.J)[feasible]) < error
+
+    # Same fixed point from the label-setting solution
+    dj.compute_steps(2000, threshold=1e-6)
+
+    assert np.allclose(dj.J[feasible], vi.J[feasible], atol=1e-3)
@@ -0,0 +1,94 @@
+import pickle
+
+import numpy as np
+
+import pytest
+
+from scipy.interpolate import RegularGridInterpolator as rgi
+
+from pyro.planning import valueiteration
+
+
+def test_grid_policy_lookup(pendulum_vi_problem, tmp_path):
+    grid_sys, cf = pendulum_vi_problem
+
+    vi = valueiteration.ValueIteration_ND(grid_sys, cf)
+    vi.initialize()
+    vi.compute_steps(20)
+    vi.assign_interpol_controller()
+
+    sys = grid_sys.sys
+    X = np.random.default_rng(0).uniform(1.2 * sys.x_lb, 1.2 * sys.x_ub,
+                                         (200, 2))
+
+    # Multilinear interpolation of the inputs, clamped to the grid bounds
+    u_ref = rgi(grid_sys.xd, vi.u_policy_grid[0])(np.clip(X, sys.x_lb,
+                                                          sys.x_ub))
+    U = vi.grid_policy.batch(X)
+    assert U.shape == (200, 1)
+    assert np.allclose(U[:, 0], u_ref)
+
+    # Single queries do not modify the state
+    x = X[0].copy()
+    assert np.allclose(vi.ctl.c(x, np.zeros(2)), U[0])
+    assert np.array_equal(x, X[0])
+
+    # Nearest action lookup only returns actions of the grid
+    vi.policy_interpolation = 'nearest'
+    vi.assign_interpol_controller()
+    assert np.all(np.isin(vi.grid_policy.batch(X), grid_sys.ud[0]))
+
+    # Saved alongside the solution, or pickled
+    vi.save_data('pendulum', prefix=str(tmp_path) + '/')
+    loaded = valueiteration.GridPolicy.load(str(tmp_path / 'pendulum_policy'))
+    assert np.array_equal(loaded.batch(X), vi.grid_policy.batch(X))
+    assert loaded.method == 'nearest'
+
+    unpickled = pickle.loads(pickle.dumps(vi.grid_policy))
+    assert np.array_equal(unpickled.batch(X), vi.grid_policy.batch(X))
+
+
+def test_grid_policy_on_3d_grid():
+    xd = [np.linspace(-1, 1, 5), np.linspace(0, 2, 3), np.linspace(-3, 3, 7)]
+
+    grid = np.stack(np.meshgrid(*xd, indexing='ij'), axis=-1)
+
+    # Two affine inputs, interpolated exactly
+    u_grid = np.stack([grid.sum(axis=-1), grid[..., 0] - 2 * grid[..., 2]],
+                      axis=-1)
+
+    policy = valueiteration.GridPolicy(xd, u_grid)
+
+    X = np.random.default_rng(0).uniform([-1, 0, -3], [1, 2, 3], (100, 3))
+
+    assert np.allclose(policy.batch(X),
+                       np.column_stack([X.sum(axis=1), X[:, 0] - 2 * X[:, 2]]))
+
+    # Nearest node
+    nearest = valueiteration.GridPolicy(xd, u_grid, 'nearest')
+    node    = [np.abs(xd[i][:, None] - X[:, i]).argmin(axis=0)
+               for i in range(3)]
+
+    assert np.allclose(nearest.batch(X), u_grid[tuple(node)])
+
+    with pytest.raises(ValueError):
+        valueiteration.GridPolicy(xd, u_grid, 'cubic')
+
+
+@pytest.mark.parametrize('method', ['linear', 'nearest'])
+def test_grid_policy_single_node_axis(method):
+    xd = [np.linspace(0, 1, 4), np.array([0.5]), np.linspace(-1, 1, 3)]
+
+    x0, x2 = np.meshgrid(xd[0], xd[2], indexing='ij')
+    u_grid = (x0 + 10 * x2)[:, None, :, None]
+
+    policy = valueiteration.GridPolicy(xd, u_grid, method)
+
+    X = np.random.default_rng(0).uniform([0, -1, -1], [1, 2, 1], (50, 3))
+
+    U = policy.batch(X)
+
+    if method == 'linear':
+        np.testing.assert_allclose(U[:, 0], X[:, 0] + 10 * X[:, 2])
+
+    np.testing.assert_allclose([policy(x) for x in X], U)
@@ -0,0 +1,71 @@
+import numpy as np
+
+from pyro.dynamic import vehicle
+from pyro.planning import discretizer
+
+
+def test_cached_lookuptable(pendulum_vi_problem, tmp_path):
+    grid_sys, cf = pendulum_vi_problem
+
+    sys   = grid_sys.sys
+    cache = str(tmp_path / 'cache')
+
+    computed = discretizer.GridDynamicSystem(sys, (21, 21), (5, 1), 0.05,
+                                             transition_matrix=True,
+                                             cache_dir=cache)
+    loaded   = discretizer.GridDynamicSystem(sys, (21, 21), (5, 1), 0.05,
+                                             transition_matrix=True,
+                                             cache_dir=cache)
+
+    assert isinstance(loaded.x_next, np.memmap)
+    assert np.array_equal(loaded.x_next, grid_sys.x_next)
+    assert np.array_equal(loaded.action_isok, grid_sys.action_isok)
+    assert abs(loaded.P - computed.P).max() == 0
+
+    # Other parameters, other tables
+    assert len(list((tmp_path / 'cache').iterdir())) == 3
+
+    sys.m1 = 2.0
+    discretizer.GridDynamicSystem(sys, (21, 21), (5, 1), 0.1, cache_dir=cache)
+
+    assert len(list((tmp_path / 'cache').iterdir())) == 5
+
+
+def test_cache_misses_on_parameter_change(tmp_path):
+    sys = vehicle.HolonomicMobileRobotwithObstacles()
+
+    cache = tmp_path / 'cache'
+
+    def grid():
+        return discretizer.GridDynamicSystem(sys, (21, 21), (3, 3), 0.5,
+                                             cache_dir=str(cache))
+
+    # Obstacle maps of the same shape, other margins
+    sys.build_obstacle_map(margin=0.0)
+    thin = grid()
+    thin_hash = thin.grid_hash()
+
+    sys.build_obstacle_map(margin=1.0)
+    thick = grid()
+
+    assert thick.grid_hash() != thin_hash
+    assert thick.action_isok.sum() < thin.action_isok.sum()
+    assert len(list(cache.iterdir())) == 2 * 2
+
+    # Other obstacles
+    sys.obstacles = sys.obstacles[:1]
+    sys.build_obstacle_map(margin=1.0)
+
+    fewer = grid()
+
+    assert fewer.action_isok.sum() > thick.action_isok.sum()
+    assert len(list(cache.iterdir())) == 3 * 2
+
+    # Hit with the same parameters
+    sys.build_obstacle_map(margin=1.0)
+
+    hit = grid()
+
+    assert hit.grid_hash() == fewer.grid_hash()
+    assert isinstance(hit.x_next, np.memmap)
+    assert len(list(cache.iterdir())) == 3 * 2
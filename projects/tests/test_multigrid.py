@@ -0,0 +1,56 @@
+import numpy as np
+
+from pyro.planning import discretizer
+from pyro.planning import valueiteration
+from pyro.planning import multigrid
+
+
+def test_multigrid_matches_value_iteration(min_time_problem):
+    grid_sys, cf = min_time_problem
+
+    vi = valueiteration.ValueIteration_ND(grid_sys, cf)
+    vi.initialize()
+    history_vi = vi.compute_steps(1000, threshold=1e-6)
+
+    mg = multigrid.MultiGridValueIteration(grid_sys.sys, cf,
+                                           [(5, 5), (11, 11), (21, 21)],
+                                           (3, 1), [0.4, 0.2, 0.1],
+                                           sweeps=[50, 100, 1000],
+                                           threshold=[1e-2, 1e-2, 1e-6])
+    mg.grid_options = {'transition_matrix': True}
+    mg.compute()
+
+    assert len(mg.solvers) == 3
+    assert mg.J.shape == (21, 21)
+    assert len(mg.histories[0]) <= 50
+    assert len(mg.histories[-1]) < len(history_vi)
+
+    feasible = vi.J < cf.INF - 1
+
+    assert np.allclose(mg.J[feasible], vi.J[feasible], atol=1e-4)
+    assert np.array_equal(mg.action_policy[feasible],
+                          vi.action_policy[feasible])
+
+
+def test_prolongation_is_multilinear(min_time_problem):
+    grid_sys, cf = min_time_problem
+
+    coarse = discretizer.GridDynamicSystem(grid_sys.sys, (5, 5), (3, 1), 0.1)
+
+    mg = multigrid.MultiGridValueIteration(grid_sys.sys, cf,
+                                           [(5, 5), (21, 21)], (3, 1), 0.1)
+
+    vi = valueiteration.ValueIteration_ND(coarse, cf)
+    vi.initialize()
+
+    # Affine cost-to-go, above INF on a corner of the grid
+    x    = coarse.nodes_state
+    vi.J = (50 * x[:, 0] + 20 * x[:, 1] + 40).reshape(coarse.xgriddim)
+
+    J = mg.prolongate(vi, grid_sys)
+
+    x_fine = grid_sys.nodes_state
+    J_ref  = 50 * x_fine[:, 0] + 20 * x_fine[:, 1] + 40
+
+    assert J.shape == grid_sys.xgriddim
+    assert np.allclose(J.ravel(), np.minimum(J_ref, cf.INF))
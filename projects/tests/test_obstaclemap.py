@@ -0,0 +1,72 @@
+import numpy as np
+
+import pytest
+
+from pyro.dynamic import vehicle
+from pyro.dynamic import manipulator
+from pyro.dynamic import obstaclemap
+
+
+def test_signed_distance_of_a_box():
+    obstacle_map = obstaclemap.ObstacleMap.from_boxes([[(-1, -1), (1, 1)]],
+                                                      (-4, -4), (4, 4), 0.01)
+
+    P = np.array([[0., 0.], [2., 0.], [0., -3.], [3., 3.], [0.5, 0.]])
+    d = np.array([-1., 1., 2., np.sqrt(8.), -0.5])
+
+    assert np.allclose(obstacle_map.distance(P), d, atol=0.02)
+    assert obstacle_map.distance(P[1]) == pytest.approx(1., abs=0.02)
+
+    assert np.array_equal(obstacle_map.isfree(P), d > 0)
+    assert np.array_equal(obstacle_map.isfree(P, margin=1.5), d > 1.5)
+
+    A = np.array([[-2., 0.], [-2., 2.]])
+    B = np.array([[+2., 0.], [+2., 2.]])
+
+    assert np.array_equal(obstacle_map.segments_isfree(A, B), [False, True])
+    assert np.array_equal(obstacle_map.segments_isfree(A, B, margin=1.5),
+                          [False, False])
+
+
+@pytest.mark.parametrize('sys_class', [
+    vehicle.HolonomicMobileRobotwithObstacles,
+    vehicle.Holonomic3DMobileRobotwithObstacles,
+    vehicle.KinematicCarModelwithObstacles,
+    ])
+def test_vehicle_obstacle_map_matches_list(sys_class):
+    sys = sys_class()
+
+    X = np.random.default_rng(0).uniform(sys.x_lb, sys.x_ub, (2000, sys.n))
+
+    x_ok = sys.isavalidstate_batch(X)
+
+    sys.build_obstacle_map()
+
+    # Only states within a cell of an obstacle boundary can differ
+    assert (sys.isavalidstate_batch(X) == x_ok).mean() > 0.98
+    assert np.array_equal(sys.isavalidstate_batch(X[:100]),
+                          [sys.isavalidstate(x) for x in X[:100]])
+
+    sys.obstacle_map = None
+    assert np.array_equal(sys.isavalidstate_batch(X), x_ok)
+
+
+@pytest.mark.parametrize('sys_class', [
+    manipulator.TwoLinkManipulatorwithObstacles,
+    manipulator.FiveLinkPlanarManipulatorwithObstacles,
+    ])
+def test_manipulator_links_collisions(sys_class):
+    sys = sys_class()
+
+    X = np.random.default_rng(0).uniform(sys.x_lb, sys.x_ub, (500, sys.n))
+
+    effector_ok = sys.isavalidstate_batch(X)
+
+    sys.build_obstacle_map(margin=0.05)
+
+    links_ok = sys.isavalidstate_batch(X)
+
+    # Links checks are stricter than the effector check
+    assert links_ok.sum() < effector_ok.sum()
+    assert not np.any(links_ok & ~effector_ok)
+    assert np.array_equal(links_ok, [sys.isavalidstate(x) for x in X])
@@ -0,0 +1,74 @@
+import numpy as np
+
+import pytest
+
+from pyro.planning import valueiteration
+from pyro.planning import policyiteration
+
+
+@pytest.mark.parametrize('evaluation_sweeps', [None, 10])
+def test_policy_iteration_matches_value_iteration(min_time_problem,
+                                                  evaluation_sweeps):
+    grid_sys, cf = min_time_problem
+
+    vi = valueiteration.ValueIteration_ND(grid_sys, cf)
+    vi.initialize()
+    history_vi = vi.compute_steps(1000, threshold=1e-9)
+
+    pi = policyiteration.PolicyIteration_ND(grid_sys, cf)
+    pi.evaluation_sweeps = evaluation_sweeps
+    pi.initialize()
+    history_pi = pi.compute_steps(1000, threshold=1e-9, rtol=1e-6)
+
+    feasible = vi.J < cf.INF - 1
+
+    assert len(history_pi) < len(history_vi)
+    assert np.array_equal(pi.action_policy[feasible],
+                          vi.action_policy[feasible])
+
+    # Truncated evaluations only relax overestimates on recurrent nodes
+    # at the rate of the discount factor
+    if evaluation_sweeps is None:
+        assert pi.policy_changes == 0
+        assert np.allclose(pi.J[feasible], vi.J[feasible], rtol=1e-3, atol=1e-2)
+
+
+def test_improvement_is_consistent_with_evaluation(min_time_problem):
+    grid_sys, cf = min_time_problem
+
+    pi = policyiteration.PolicyIteration_ND(grid_sys, cf)
+    pi.initialize()
+    pi.compute_steps(1000, threshold=1e-9, rtol=1e-6)
+
+    # The converged policy is greedy for its own discounted cost-to-go
+    J_pi     = pi.evaluate_policy(pi.policy)
+    feasible = J_pi < cf.INF - 1
+
+    assert np.allclose(pi.J.ravel()[feasible], J_pi[feasible], rtol=1e-10,
+                       atol=1e-9)
+
+    pi.compute_step()
+
+    assert pi.policy_changes == 0
+
+
+def test_greedy_policy_keeps_incumbent_on_ties(min_time_problem):
+    grid_sys, cf = min_time_problem
+
+    pi = policyiteration.PolicyIteration_ND(grid_sys, cf)
+    pi.initialize()
+
+    isok  = grid_sys.action_isok
+    valid = isok.all(axis=1)
+
+    incumbent = np.where(valid, 2, -1)
+
+    # All actions equal: nothing changes
+    Q = np.ones(isok.shape)
+
+    assert np.array_equal(pi.greedy_policy(Q, incumbent)[valid], incumbent[valid])
+
+    # A strictly better action replaces the incumbent
+    Q[:, 0] = 0.5
+
+    assert (pi.greedy_policy(Q, incumbent)[valid] == 0).all()
@@ -0,0 +1,230 @@
+import numpy as np
+
+import pytest
+
+from scipy.integrate import odeint
+
+from pyro.dynamic import integrator
+from pyro.dynamic import pendulum
+from pyro.dynamic import vehicle
+from pyro.control import linear
+from pyro.analysis import simulation
+
+
+# Fixtures
+
+@pytest.fixture
+def double_integ():
+    sys = integrator.DoubleIntegrator()
+    sys.ubar = np.array([4.83])
+    sys.x0   = np.array([4.37, -3.74])
+    return sys
+
+
+@pytest.fixture
+def pendulum_sys():
+    sys = pendulum.SinglePendulum()
+    sys.x0 = np.array([2.0, 0.0])
+    return sys
+
+
+def pendulum_reference(sys, tf, n):
+    t = np.linspace(0, tf, n)
+    return odeint(sys.fsim, sys.x0, t, rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('solver', ['rk2', 'rk4', 'rk45'])
+def test_exact_on_constant_input(double_integ, solver):
+
+    traj = simulation.Simulator(double_integ, 10, 11, solver).compute()
+
+    t  = traj.t
+    x0 = double_integ.x0
+    u  = double_integ.ubar[0]
+
+    np.testing.assert_allclose(traj.x[:, 0], x0[0] + x0[1] * t + 0.5 * u * t**2)
+    np.testing.assert_allclose(traj.x[:, 1], x0[1] + u * t)
+    np.testing.assert_allclose(traj.dx[:, 1], u)
+
+
+def test_solver_accuracy_order(pendulum_sys):
+
+    x_ref = pendulum_reference(pendulum_sys, 10, 101)
+
+    errors = {}
+
+    for solver in ['euler', 'rk2', 'rk4', 'rk45']:
+        traj = simulation.Simulator(pendulum_sys, 10, 101, solver).compute()
+        errors[solver] = np.abs(traj.x - x_ref).max()
+
+    assert errors['rk4'] < 1e-2 * errors['rk2'] < 1e-2 * errors['euler']
+    assert errors['rk45'] < 1e-4
+
+
+def test_rk45_fails_on_diverging_dynamics(double_integ):
+
+    class Diverging(integrator.DoubleIntegrator):
+
+        def f(self, x, u, t=0):
+            if t > 1:
+                return np.full(self.n, np.nan)
+            return integrator.DoubleIntegrator.f(self, x, u, t)
+
+    sys = Diverging()
+    sys.x0 = double_integ.x0
+
+    with pytest.raises(RuntimeError):
+        simulation.Simulator(sys, 10, 11, 'rk45').compute()
+
+
+def test_unknown_solver(pendulum_sys):
+
+    with pytest.raises(ValueError):
+        simulation.Simulator(pendulum_sys, 10, 101, 'rk3')
+
+
+class CountingController(linear.ProportionalController):
+
+    def __init__(self, K):
+        linear.ProportionalController.__init__(self, K)
+        self.calls = 0
+
+    def c(self, y, r, t=0):
+        self.calls += 1
+        # Time varying gain, to check the time of each sample
+        return (1 + t) * linear.ProportionalController.c(self, y, r, t)
+
+
+@pytest.mark.parametrize('solver', ['ode', 'euler', 'rk4'])
+def test_closed_loop_single_pass(pendulum_sys, solver):
+
+    ctl = CountingController(np.array([[10.0, 2.0]]))
+    cl_sys = ctl + pendulum_sys
+
+    traj = simulation.CLosedLoopSimulator(cl_sys, 5, 101, solver).compute()
+
+    # One controller evaluation per sample and per solver stage
+    stages = {'euler': 1, 'rk4': 4}
+    if solver in stages:
+        assert ctl.calls == stages[solver] * 100 + 1
+
+    u = np.array([ctl.c(y, r, t) for y, r, t in zip(traj.y, traj.r, traj.t)])
+    dx = np.array([pendulum_sys.f(x, ui, t)
+                   for x, ui, t in zip(traj.x, u, traj.t)])
+
+    np.testing.assert_allclose(traj.u, u)
+    np.testing.assert_allclose(traj.dx, dx)
+
+
+@pytest.mark.parametrize('solver', ['ode', 'euler', 'rk4'])
+def test_overloaded_terms_are_simulated(solver):
+
+    class NoGravity(pendulum.SinglePendulum):
+
+        def g(self, q):
+            return np.zeros(self.dof)
+
+    sys = NoGravity()
+    sys.x0 = np.array([2.0, 1.0])
+
+    traj = simulation.Simulator(sys, 5, 101, solver).compute()
+
+    dx = np.array([sys.f(x, u, t) for x, u, t in zip(traj.x, traj.u, traj.t)])
+
+    np.testing.assert_allclose(traj.dx, dx)
+    # Free rotation at constant speed
+    np.testing.assert_allclose(traj.dx[:, 0], 1.0, atol=1e-6)
+
+
+def test_ode_post_processing_with_time_varying_input(double_integ):
+
+    double_integ.t2u = lambda t: np.array([np.sin(t)])
+
+    traj = simulation.Simulator(double_integ, 5, 51, 'ode').compute()
+
+    np.testing.assert_allclose(traj.u[:, 0], np.sin(traj.t))
+    np.testing.assert_allclose(traj.dx[:, 1], np.sin(traj.t))
+    np.testing.assert_allclose(traj.y[:, 0], traj.x[:, 0])
+
+
+def test_ivp_stops_at_goal_and_resamples(pendulum_sys):
+
+    pendulum_sys.d1 = 3.0
+
+    sim = simulation.Simulator(pendulum_sys, 20, 101, 'ivp')
+    sim.events = [simulation.goal_event([0, 0], 0.05)]
+
+    traj = sim.compute()
+
+    assert traj.t[-1] < 10
+    assert sim.t_events[0].size == 1
+    np.testing.assert_allclose(np.linalg.norm(traj.x[-1]), 0.05)
+
+    # Dense output, compared with odeint on the same times
+    resampled = traj.resample(101)
+
+    x_ref = odeint(pendulum_sys.fsim, pendulum_sys.x0, resampled.t,
+                   rtol=1e-12, atol=1e-12)
+
+    assert resampled.x.shape == (101, 2)
+    np.testing.assert_allclose(resampled.x, x_ref, atol=1e-4)
+
+
+@pytest.mark.parametrize('method', ['Radau', 'BDF', 'LSODA'])
+def test_ivp_stiff_methods(pendulum_sys, method):
+
+    sim = simulation.Simulator(pendulum_sys, 5, 101, 'ivp')
+    sim.ivp_method = method
+
+    traj = sim.compute()
+
+    x_ref = odeint(pendulum_sys.fsim, pendulum_sys.x0, traj.t,
+                   rtol=1e-12, atol=1e-12)
+
+    np.testing.assert_allclose(traj.x, x_ref, atol=1e-3)
+
+
+def test_ivp_collision_event():
+
+    sys = vehicle.HolonomicMobileRobotwithObstacles()
+    sys.x0   = np.array([3.0, -9.0])
+    sys.ubar = np.array([0.0, 1.0])
+
+    sim = simulation.Simulator(sys, 20, 101, 'ivp')
+    sim.events = [simulation.collision_event(sys)]
+
+    traj = sim.compute()
+
+    # First obstacle box starts at y = 2
+    np.testing.assert_allclose(traj.x[-1], [3.0, 2.0], atol=1e-3)
+
+
+@pytest.mark.parametrize('solver', ['euler', 'rk4', 'ode'])
+def test_streaming_matches_in_memory(pendulum_sys, tmp_path, solver):
+
+    ctl = linear.ProportionalController(np.array([[10.0, 2.0]]))
+    cl_sys = ctl + pendulum_sys
+
+    full = simulation.CLosedLoopSimulator(cl_sys, 10, 1001, solver).compute()
+
+    sim = simulation.CLosedLoopSimulator(cl_sys, 10, 1001, solver)
+    sim.store_path = str(tmp_path / 'run')
+    sim.chunk_size = 300
+
+    traj = sim.compute()
+
+    assert isinstance(traj.x, np.memmap)
+
+    # odeint is restarted at each chunk
+    atol = 1e-5 if solver == 'ode' else 1e-10
+
+    for k in ['x', 'u', 'dx', 'y', 'r', 'J', 'dJ']:
+        np.testing.assert_allclose(getattr(traj, k), getattr(full, k),
+                                   atol=atol)
+
+    # Reopened lazily and sliced by time
+    part = simulation.Trajectory.open(sim.store_path).time_slice(2.0, 3.0)
+
+    assert part.t[0] == pytest.approx(2.0)
+    assert part.t[-1] == pytest.approx(3.0)
+    np.testing.assert_allclose(part.x, full.x[200:301], atol=atol)
@@ -0,0 +1,72 @@
+import numpy as np
+
+import pytest
+
+from scipy.integrate import solve_ivp
+
+from pyro.dynamic import pendulum
+from pyro.planning import discretizer
+
+
+@pytest.mark.parametrize('integrator, substeps, atol', [
+    ('euler', 1, 1.0),
+    ('euler', 4, 0.2),
+    ('rk2', 1, 0.1),
+    ('rk4', 1, 0.005)])
+def test_transition_integrator(integrator, substeps, atol):
+    sys = pendulum.SinglePendulum()
+
+    grid_sys = discretizer.GridDynamicSystem(sys, (5, 5), (3, 1), 0.2,
+                                             integrator=integrator,
+                                             substeps=substeps)
+
+    x_next = grid_sys.get_x_next()
+
+    for node in range(0, grid_sys.nodes_n, 3):
+        for action in range(grid_sys.actions_n):
+
+            x = grid_sys.nodes_state[node]
+            u = grid_sys.actions_input[action]
+
+            sol = solve_ivp(lambda t, x: sys.f(x, u), (0, 0.2), x,
+                            rtol=1e-10, atol=1e-10)
+
+            assert np.allclose(x_next[node, action], sol.y[:, -1], atol=atol)
+
+    # Part of the cache key
+    euler = discretizer.GridDynamicSystem(sys, (5, 5), (3, 1), 0.2)
+    assert (euler.grid_hash() == grid_sys.grid_hash()) == (
+        integrator == 'euler' and substeps == 1)
+
+
+@pytest.mark.parametrize('integrator, order', [
+    ('euler', 1),
+    ('rk2', 2),
+    ('rk4', 4)])
+def test_transition_integrator_order(integrator, order):
+    sys = pendulum.SinglePendulum()
+
+    grid_sys = discretizer.GridDynamicSystem(sys, (5, 5), (3, 1), 0.2,
+                                             integrator=integrator)
+
+    X = grid_sys.nodes_state
+    U = np.full((X.shape[0], 1), 0.5)
+
+    x_ref = np.array([solve_ivp(lambda t, x: sys.f(x, u), (0, 0.2), x,
+                                rtol=1e-12, atol=1e-12).y[:, -1]
+                      for x, u in zip(X, U)])
+
+    errors = []
+
+    for substeps in [4, 8]:
+        grid_sys.substeps = substeps
+        errors.append(np.abs(grid_sys.next_states(X, U, 0.2) - x_ref).max())
+
+    # Halving the substep divides the error by about 2^order
+    assert errors[0] / errors[1] == pytest.approx(2 ** order, rel=0.25)
+
+
+def test_unknown_transition_integrator():
+    with pytest.raises(ValueError):
+        discretizer.GridDynamicSystem(pendulum.SinglePendulum(), (5, 5),
+                                      (3, 1), 0.2, integrator='rk3')
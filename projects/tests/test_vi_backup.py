@@ -0,0 +1,178 @@
+import gc
+
+import numpy as np
+
+import pytest
+
+from multiprocessing import shared_memory
+
+from pyro.planning import discretizer
+from pyro.planning import valueiteration
+
+
+def solve(grid_sys, cf, steps=5, **options):
+    vi = valueiteration.ValueIteration_ND(grid_sys, cf)
+
+    for key, value in options.items():
+        setattr(vi, key, value)
+
+    vi.initialize()
+
+    for i in range(steps):
+        vi.compute_step()
+
+    return vi
+
+# Tests
+
+def test_batch_backup_matches_loop(pendulum_vi_problem):
+    grid_sys, cf = pendulum_vi_problem
+
+    vi_loop  = solve(grid_sys, cf, usebatchbackup=False)
+    vi_batch = solve(grid_sys, cf, usebatchbackup=True)
+
+    assert np.allclose(vi_loop.J, vi_batch.J)
+    assert np.array_equal(vi_loop.action_policy, vi_batch.action_policy)
+
+
+def test_transition_matrix_matches_interpolation(pendulum_vi_problem, tmp_path):
+    grid_sys, cf = pendulum_vi_problem
+
+    vi_interp = solve(grid_sys, cf)
+
+    grid_sys.compute_transition_matrix()
+    vi_sparse = solve(grid_sys, cf)
+
+    assert np.allclose(vi_interp.J, vi_sparse.J)
+    assert np.array_equal(vi_interp.action_policy, vi_sparse.action_policy)
+
+    # Rows of valid actions are convex combinations of grid nodes
+    row_sums = np.asarray(grid_sys.P.sum(axis=1)).ravel()
+    assert np.allclose(row_sums, grid_sys.action_isok.ravel())
+
+    # Cache to disk
+    name = str(tmp_path / 'P')
+    grid_sys.save_transition_matrix(name)
+    P = grid_sys.P
+    grid_sys.load_transition_matrix(name)
+    assert (P != grid_sys.P).nnz == 0
+
+
+@pytest.mark.parametrize('options, atol', [
+    ({'lookup_memory': 0.01}, 1e-12),
+    ({'lookup_dtype': np.float32}, 1e-5),
+    ({'lookup_quantized': True, 'lookup_memory': 0.01}, 1e-3),
+    ])
+def test_chunked_lookuptable(pendulum_vi_problem, options, atol):
+    grid_sys, cf = pendulum_vi_problem
+
+    chunked = discretizer.GridDynamicSystem(grid_sys.sys, (21, 21), (5, 1),
+                                            0.05, **options)
+
+    isok = grid_sys.action_isok
+
+    assert np.array_equal(chunked.action_isok, isok)
+    assert np.allclose(chunked.get_x_next()[isok], grid_sys.x_next[isok],
+                       atol=atol)
+
+
+def test_memmap_lookuptable(pendulum_vi_problem, tmp_path):
+    grid_sys, cf = pendulum_vi_problem
+
+    name = str(tmp_path / 'x_next.dat')
+
+    memmap_sys = discretizer.GridDynamicSystem(
+        grid_sys.sys, (21, 21), (5, 1), 0.05, lookup_memory=0.01,
+        lookup_dtype=np.float32, lookup_file=name)
+
+    assert isinstance(memmap_sys.x_next, np.memmap)
+
+    vi_ram  = solve(grid_sys, cf)
+    vi_disk = solve(memmap_sys, cf)
+
+    # float32 next states, J of order INF
+    assert np.allclose(vi_ram.J, vi_disk.J, atol=1e-2)
+    assert np.mean(vi_ram.action_policy != vi_disk.action_policy) < 0.01
+
+
+@pytest.mark.parametrize('transition_matrix', [False, True])
+def test_parallel_sweeps_match_batch(pendulum_vi_problem, transition_matrix):
+    grid_sys, cf = pendulum_vi_problem
+
+    if transition_matrix:
+        grid_sys.compute_transition_matrix()
+
+    vi_batch    = solve(grid_sys, cf)
+    vi_parallel = solve(grid_sys, cf, workers=2)
+    vi_parallel.close_pool()
+
+    assert np.allclose(vi_batch.J, vi_parallel.J)
+    assert np.array_equal(vi_batch.action_policy, vi_parallel.action_policy)
+    assert vi_parallel.shared_memory == []
+
+
+def assert_unlinked(names):
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+def test_parallel_resources_are_released(pendulum_vi_problem):
+    grid_sys, cf = pendulum_vi_problem
+
+    with valueiteration.ValueIteration_ND(grid_sys, cf) as vi:
+        vi.workers = 2
+        vi.initialize()
+        vi.compute_parallel_step()
+        names = [shm.name for shm in vi.shared_memory]
+
+    assert names
+    assert vi.pool is None
+    assert_unlinked(names)
+
+    # Error during a sweep
+    def failing_map(*args):
+        raise RuntimeError('worker failure')
+
+    vi.start_pool()
+    names = [shm.name for shm in vi.shared_memory]
+    vi.pool.map = failing_map
+
+    with pytest.raises(RuntimeError):
+        vi.compute_parallel_step()
+
+    assert vi.pool is None
+    assert_unlinked(names)
+
+    # Solver dropped without close_pool
+    vi.start_pool()
+    names = [shm.name for shm in vi.shared_memory]
+
+    del vi
+    gc.collect()
+
+    assert_unlinked(names)
+
+
+def test_compute_steps_stops_on_residual(pendulum_vi_problem):
+    grid_sys, cf = pendulum_vi_problem
+
+    vi = valueiteration.ValueIteration_ND(grid_sys, cf)
+    vi.initialize()
+
+    history = vi.compute_steps(500, threshold=100.0)
+
+    # Stopped at the first step with a small enough residual
+    assert len(history) < 501
+    assert history['residual'][-1] <= 100.0
+    assert np.all(history['residual'][:-1] > 100.0)
+    assert np.array_equal(history['step'], np.arange(len(history)))
+    assert np.all((history['infeasible'] >= 0) & (history['infeasible'] <= 1))
+    assert np.array_equal(vi.history, history)
+
+    # Relative tolerance on max J
+    vi.initialize()
+    history_rel = vi.compute_steps(500, threshold=0.0, rtol=0.05)
+
+    last = history_rel[-1]
+    assert last['residual'] <= 0.05 * last['J_max']
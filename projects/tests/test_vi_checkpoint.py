@@ -0,0 +1,87 @@
+import numpy as np
+
+import pytest
+
+from pyro.planning import discretizer
+from pyro.planning import valueiteration
+
+
+def test_solution_checkpoint_and_resume(pendulum_vi_problem, tmp_path):
+    grid_sys, cf = pendulum_vi_problem
+
+    name = str(tmp_path / 'pendulum_solution')
+
+    vi_ref = valueiteration.ValueIteration_ND(grid_sys, cf)
+    vi_ref.initialize()
+    vi_ref.compute_steps(9)
+
+    # Interrupted run: 6 steps with a checkpoint every 3 steps
+    vi = valueiteration.ValueIteration_ND(grid_sys, cf)
+    vi.checkpoint_file     = name
+    vi.checkpoint_interval = 3
+    vi.initialize()
+    vi.compute_steps(5)
+
+    # Resume in a new solver
+    vi_resumed = valueiteration.ValueIteration_ND(grid_sys, cf)
+    assert vi_resumed.resume(name)
+    assert vi_resumed.steps_done == 6
+
+    history = vi_resumed.compute_steps(3)
+
+    assert np.array_equal(history['step'], [6, 7, 8, 9])
+
+    # Log of the saved steps continued
+    assert np.array_equal(vi_resumed.history['step'], np.arange(10))
+    assert np.array_equal(vi_resumed.history['residual'],
+                          vi_ref.history['residual'])
+    assert np.allclose(vi_resumed.J, vi_ref.J)
+    assert np.array_equal(vi_resumed.action_policy, vi_ref.action_policy)
+
+    # Stale files are detected
+    vi_resumed.save_solution(name)
+
+    cf.INF = cf.INF + 1
+    with pytest.raises(ValueError):
+        vi_resumed.load_solution(name)
+    cf.INF = cf.INF - 1
+
+    grid_sys.sys.gravity = 3.7
+    with pytest.raises(ValueError):
+        vi_resumed.load_solution(name)
+
+    vi_resumed.load_solution(name, check=False)
+
+
+def test_solution_file_checks(pendulum_vi_problem, tmp_path):
+    grid_sys, cf = pendulum_vi_problem
+
+    vi = valueiteration.ValueIteration_ND(grid_sys, cf)
+    vi.initialize()
+    vi.compute_steps(2)
+    vi.save_solution('solution', prefix=str(tmp_path) + '/')
+
+    # Written in a single file, through a temporary one
+    assert [f.name for f in tmp_path.iterdir()] == ['solution.npz']
+
+    # Another grid
+    coarse = discretizer.GridDynamicSystem(grid_sys.sys, (11, 11), (5, 1), 0.05)
+
+    vi_coarse = valueiteration.ValueIteration_ND(coarse, cf)
+
+    with pytest.raises(ValueError):
+        vi_coarse.load_solution('solution', prefix=str(tmp_path) + '/',
+                                check=False)
+
+    # Same grid, other dt
+    other_dt = discretizer.GridDynamicSystem(grid_sys.sys, (21, 21), (5, 1), 0.1)
+
+    vi_dt = valueiteration.ValueIteration_ND(other_dt, cf)
+
+    with pytest.raises(ValueError):
+        vi_dt.load_solution('solution', prefix=str(tmp_path) + '/')
+
+    vi_dt.load_solution('solution', prefix=str(tmp_path) + '/', check=False)
+
+    assert np.array_equal(vi_dt.J, vi.J)
+    assert np.array_equal(vi_dt.history, vi.history)
@@ -0,0 +1,117 @@
+import numpy as np
+
+import pytest
+
+from pyro.analysis import costfunction
+from pyro.planning import discretizer
+from pyro.planning import valueiteration
+
+
+@pytest.mark.parametrize('sweep_order', ['natural', 'alternating', 'distance'])
+@pytest.mark.parametrize('transition_matrix', [True, False])
+def test_gauss_seidel_converges_faster(min_time_problem, sweep_order,
+                                       transition_matrix):
+    grid_sys, cf = min_time_problem
+
+    if not transition_matrix:
+        grid_sys.P = None
+
+    vi_jacobi = valueiteration.ValueIteration_ND(grid_sys, cf)
+    vi_jacobi.initialize()
+    history_jacobi = vi_jacobi.compute_steps(1000, threshold=1e-6)
+
+    vi_gs = valueiteration.ValueIteration_ND(grid_sys, cf)
+    vi_gs.gaussseidel = True
+    vi_gs.sweep_order = sweep_order
+    vi_gs.initialize()
+    history_gs = vi_gs.compute_steps(1000, threshold=1e-6)
+
+    # Same fixed point in fewer sweeps
+    assert len(history_gs) < len(history_jacobi) < 1001
+    assert np.allclose(vi_gs.J, vi_jacobi.J, atol=1e-4)
+    assert np.array_equal(vi_gs.action_policy == -1,
+                          vi_jacobi.action_policy == -1)
+
+
+def test_gauss_seidel_solves_self_transitions(min_time_problem):
+    grid_sys, cf = min_time_problem
+
+    # Short time steps: most of the weight of a pair is on its own node
+    grid_sys = discretizer.GridDynamicSystem(grid_sys.sys, (21, 21), (3, 1),
+                                             0.02, transition_matrix=True)
+
+    vi = valueiteration.ValueIteration_ND(grid_sys, cf)
+    vi.gaussseidel = True
+    vi.initialize()
+
+    vi.split_transition_matrix()
+    P, P_self, P_other = vi.P_split
+
+    pairs = np.arange(P.shape[0])
+    own   = (pairs, pairs // grid_sys.actions_n)
+
+    assert np.allclose(P_self, P[own])
+    assert (P_other[own] == 0).all()
+    assert abs(P - P_other).sum() == pytest.approx(P_self.sum())
+    assert np.median(P_self[grid_sys.action_isok.ravel()]) > 0.5
+
+    # Each backup is the fixed point of its node given the other nodes
+    J = np.random.default_rng(0).uniform(0, 10, grid_sys.xgriddim)
+
+    nodes = np.arange(grid_sys.nodes_n)
+    Q     = vi.compute_Q_nodes(J, nodes, split=True)
+
+    for i in range(0, grid_sys.nodes_n, 7):
+        J_i = J.copy()
+        J_i.ravel()[i] = Q[i].min()
+
+        Q_i = vi.compute_Q_nodes(J_i, nodes[i:i + 1])
+
+        assert Q_i.min() == pytest.approx(Q[i].min())
+
+    # Much fewer sweeps than Jacobi backups to the same fixed point
+    history_gs = vi.compute_steps(1000, threshold=1e-6)
+
+    vi_jacobi = valueiteration.ValueIteration_ND(grid_sys, cf)
+    vi_jacobi.initialize()
+    history_jacobi = vi_jacobi.compute_steps(1000, threshold=1e-6)
+
+    assert 2 * len(history_gs) < len(history_jacobi) < 1001
+    assert np.allclose(vi.J, vi_jacobi.J, atol=1e-3)
+
+
+def test_gauss_seidel_is_sequential(min_time_problem):
+    grid_sys, cf = min_time_problem
+
+    vi = valueiteration.ValueIteration_ND(grid_sys, cf)
+    vi.gaussseidel = True
+    vi.workers = 2
+    vi.initialize()
+
+    with pytest.raises(ValueError):
+        vi.compute_step()
+
+
+class CostWithoutTarget(costfunction.CostFunction):
+
+    def h(self, x, t=0):
+        return 0.0
+
+    def g(self, x, u, y, t):
+        return 1.0
+
+
+def test_distance_order_target(min_time_problem):
+    grid_sys, cf = min_time_problem
+
+    vi = valueiteration.ValueIteration_ND(grid_sys, CostWithoutTarget())
+    vi.sweep_order = 'distance'
+
+    # Grid center without cf.xbar, the origin of the min time grid
+    order = vi.sweep_ordering()
+    assert np.allclose(grid_sys.nodes_state[order[0]], 0.0)
+
+    vi.sweep_target = [2.0, -2.0]
+    order = vi.sweep_ordering()
+    assert np.allclose(grid_sys.nodes_state[order[0]], [2.0, -2.0])
+    assert np.array_equal(np.sort(order), np.arange(grid_sys.nodes_n))
@@ -0,0 +1,154 @@
+import numpy as np
+
+import pytest
+
+from pyro.dynamic import pendulum
+from pyro.analysis import costfunction
+from pyro.planning import discretizer
+from pyro.planning import valueiteration
+
+
+class FinalDistanceCost(costfunction.CostFunction):
+    """ Only h, batch versions are the default loops """
+
+    def h(self, x, t=0):
+        return np.dot(x, x)
+
+    def g(self, x, u, y, t):
+        return 1.0
+
+
+def test_vectorized_setup():
+    sys = pendulum.DoublePendulum()
+
+    grid_sys = discretizer.GridDynamicSystem(sys, (5, 4, 3, 3), (3, 3), 0.05)
+
+    vi = valueiteration.ValueIteration_ND(grid_sys, FinalDistanceCost())
+    vi.initialize()
+
+    assert vi.J.shape == (5, 4, 3, 3)
+
+    for node in range(grid_sys.nodes_n):
+        index = tuple(grid_sys.nodes_index[node])
+        x     = grid_sys.nodes_state[node]
+        assert vi.J[index] == pytest.approx(np.dot(x, x))
+
+    # Policy grids by fancy indexing, 0 where no action is good
+    policy = np.random.default_rng(0).integers(-1, grid_sys.actions_n,
+                                               grid_sys.xgriddim)
+    vi.action_policy = policy
+    vi.assign_interpol_controller()
+
+    for node in range(grid_sys.nodes_n):
+        index = tuple(grid_sys.nodes_index[node])
+        for k in range(sys.m):
+            if policy[index] == -1:
+                assert vi.u_policy_grid[k][index] == 0
+            else:
+                assert (vi.u_policy_grid[k][index]
+                        == grid_sys.actions_input[policy[index], k])
+
+    vi.plot_max_J = 10
+    vi.create_Jplot()
+    assert np.array_equal(vi.Jplot, np.minimum(vi.J, 10))
+
+
+class MeasuredSpeed(pendulum.SinglePendulum):
+    """ Output is the speed only """
+
+    def __init__(self):
+        pendulum.SinglePendulum.__init__(self)
+        self.p = 1
+
+    def h(self, x, u, t):
+        return x[1:] * 2
+
+
+class OutputCost(costfunction.CostFunction):
+
+    def h(self, x, t=0):
+        return 0.0
+
+    def g(self, x, u, y, t):
+        return y[0] ** 2 + u[0]
+
+
+def test_stage_cost_uses_outputs():
+    sys = MeasuredSpeed()
+
+    grid_sys = discretizer.GridDynamicSystem(sys, (5, 5), (3, 1), 0.05)
+
+    vi = valueiteration.ValueIteration_ND(grid_sys, OutputCost())
+    vi.initialize()
+    vi.compute_stage_cost()
+
+    for node in range(grid_sys.nodes_n):
+        for action in range(grid_sys.actions_n):
+            x = grid_sys.nodes_state[node]
+            u = grid_sys.actions_input[action]
+
+            assert vi.G[node, action] == pytest.approx(
+                ((2 * x[1]) ** 2 + u[0]) * 0.05)
+
+
+class CappedQuadraticCost(costfunction.QuadraticCostFunction):
+    """ Overloads g only, the vectorized g_batch must not be used """
+
+    def g(self, x, u, y, t):
+        return min(costfunction.QuadraticCostFunction.g(self, x, u, y, t), 1.0)
+
+
+class TimeToStop(costfunction.TimeCostFunction):
+
+    def g(self, x, u, y, t=0):
+        return abs(x[1])
+
+
+def test_g_batch_follows_overloaded_g():
+    sys = pendulum.SinglePendulum()
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(50, 2))
+    U = rng.normal(size=(50, 1))
+
+    for cf in [CappedQuadraticCost.from_sys(sys), TimeToStop(np.zeros(2))]:
+        dJ = np.array([cf.g(x, u, x, 0) for x, u in zip(X, U)])
+
+        np.testing.assert_allclose(cf.g_batch(X, U, X), dJ)
+
+    grid_sys = discretizer.GridDynamicSystem(sys, (5, 5), (3, 1), 0.05)
+
+    vi = valueiteration.ValueIteration_ND(grid_sys, TimeToStop(np.zeros(2)))
+    vi.initialize()
+    vi.compute_stage_cost()
+
+    x = grid_sys.nodes_state
+    expected = np.abs(x[:, 1])[:, None] * 0.05
+
+    np.testing.assert_allclose(vi.G, np.broadcast_to(expected, vi.G.shape))
+
+
+class FinalPenalty(costfunction.QuadraticCostFunction):
+
+    def h(self, x, t=0):
+        return 5.0
+
+
+class TimeWithFinalDistance(costfunction.TimeCostFunction):
+
+    def h(self, x, t=0):
+        return np.abs(x).sum()
+
+
+def test_initial_cost_follows_overloaded_h():
+    sys = pendulum.SinglePendulum()
+
+    grid_sys = discretizer.GridDynamicSystem(sys, (5, 5), (3, 1), 0.05)
+
+    for cf in [FinalPenalty.from_sys(sys), TimeWithFinalDistance(np.zeros(2))]:
+        vi = valueiteration.ValueIteration_ND(grid_sys, cf)
+        vi.initialize()
+
+        J0 = np.array([cf.h(x) for x in grid_sys.nodes_state])
+
+        np.testing.assert_allclose(vi.J.ravel(), J0)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Value iteration on a grid refined around the switching curves of the policy
+
+"""
+
+import numpy as np
+
+from pyro.dynamic  import pendulum
+from pyro.planning import adaptivegrid
+from pyro.control  import controller
+
+sys  = pendulum.SinglePendulum()
+
+# Discrete world, 21 x 21 root cells refined up to 3 times
+grid_sys = adaptivegrid.AdaptiveGridDynamicSystem( sys , ( 21 , 21 ) , ( 3 , 1 ) , 
+                                                   0.2 , max_depth = 3 )
+
+# Cost Function
+qcf = sys.cost_function
+
+qcf.xbar = np.array([ -3.14 , 0 ]) # target
+qcf.INF  = 10000
+
+# VI algo
+vi = adaptivegrid.AdaptiveValueIteration( grid_sys , qcf )
+
+vi.initialize()
+vi.compute( levels = 3 , l = 100 )
+vi.assign_interpol_controller()
+
+print('Number of nodes:', grid_sys.nodes_n )
+
+#asign controller
+cl_sys = controller.ClosedLoopSystem( sys , vi.ctl )
+cl_sys.cost_function = None
+
+# Simulation and animation
+cl_sys.x0   = np.array([0,0])
+tf   = 10
+cl_sys.compute_trajectory(tf)
+cl_sys.plot_trajectory('xu')
+cl_sys.animate_simulation()
@@ -1,3 +1,6 @@
+import inspect
+import functools
+
 import numpy as np
 
 """
@@ -16,4 +19,88 @@ def to_2D_arr(arr):
     else:
         raise ValueError(
             "Cannot expand array with %d dimensions to 2-D" % (arr.ndim)
-        )
\ No newline at end of file
+        )
+
+
+###############################################################################
+# Batch versions of the methods
+###############################################################################
+
+#############################
+def overloads( obj , name , batch_name ):
+    """
+    True if method name of obj is redefined below the class that defines
+    batch_name, such that the batch version would not match it
+
+    """
+
+    # Methods assigned on the instance
+    if name in obj.__dict__:
+        return not( batch_name in obj.__dict__ )
+
+    if batch_name in obj.__dict__:
+        return False
+
+    for cls in type( obj ).__mro__:
+        if batch_name in cls.__dict__:
+            return False
+        if name in cls.__dict__:
+            return True
+
+    return False
+
+
+#############################
+def batch_loop( method , *args , **kwargs ):
+    """
+    Evaluate method on each row of the batch, the arguments with one row per
+    sample ( as the first one ) are indexed, the others ( as a scalar time )
+    are passed as is. Outputs are stacked along a first axis of size N.
+
+    """
+
+    args = ( np.asarray( args[0] ) , ) + args[1:]
+
+    N = args[0].shape[0]
+
+    def row( a , i ):
+        if isinstance( a , np.ndarray ) and a.ndim > 0 and a.shape[0] == N:
+            return a[i]
+        return a
+
+    return np.array([ method( *[ row( a , i ) for a in args ] ,
+                              **{ k : row( v , i ) for k , v in kwargs.items() } )
+                      for i in range( N ) ])
+
+
+#############################
+def vectorized( name ):
+    """
+    Decorator of a vectorized batch version of method name: when a child 
+    class overloads name without overloading the batch method, the batch
+    method is replaced by a loop over name so both always give the same
+    values.
+
+    """
+
+    def decorator( batch ):
+
+        signature = inspect.signature( batch )
+
+        @functools.wraps( batch )
+        def wrapper( self , *args , **kwargs ):
+
+            if len( args[0] ) > 0 and overloads( self , name , batch.__name__ ):
+
+                # Default arguments of the batch method ( as t ) are passed
+                bound = signature.bind( self , *args , **kwargs )
+                bound.apply_defaults()
+
+                return batch_loop( getattr( self , name ) , *bound.args[1:] ,
+                                   **bound.kwargs )
+
+            return batch( self , *args , **kwargs )
+
+        return wrapper
+
+    return decorator
@@ -9,6 +9,8 @@ Created on Fri Aug 07 11:51:55 2015
 import numpy as np
 from copy import copy
 from scipy.integrate import cumtrapz
+
+from pyro._utils import vectorized
 ###############################################################################
 
 
@@ -49,6 +51,63 @@ class CostFunction():
 
         raise NotImplementedError
         
+    ###########################################################################
+    # The following functions can be overloaded for faster evaluation
+    ###########################################################################
+    
+    #############################
+    def h_batch(self, X, t = 0):
+        """ 
+        final cost function evaluated on a batch of states
+        
+        INPUTS
+        X  : states array             N x n
+        t  : time                     1 x 1
+        
+        OUTPUTS
+        J  : final costs              N x 1
+        
+        Default is a loop over h, overload with a vectorized version for 
+        speed decorated with @vectorized('h'), such that child classes 
+        overloading h only get the loop again.
+        
+        """
+        
+        J = np.zeros( X.shape[0] )
+        
+        for i in range( X.shape[0] ):
+            J[i] = self.h( X[i] , t )
+        
+        return J
+    
+    #############################
+    def g_batch(self, X, U, Y, t = 0):
+        """ 
+        step cost function evaluated on a batch of states
+        
+        INPUTS
+        X  : states array             N x n
+        U  : inputs array             N x m
+        Y  : outputs array            N x p
+        t  : time                     1 x 1 ( or N x 1, one per row )
+        
+        OUTPUTS
+        dJ : step costs               N x 1
+        
+        Default is a loop over g, overload with a vectorized version for 
+        speed decorated with @vectorized('g'), such that child classes 
+        overloading g only get the loop again.
+        
+        """
+        
+        dJ = np.zeros( X.shape[0] )
+        T  = np.broadcast_to( t , X.shape[0] )
+        
+        for i in range( X.shape[0] ):
+            dJ[i] = self.g( X[i] , U[i] , Y[i] , T[i] )
+        
+        return dJ
+        
     ###########################################################################
     # Method using h and g
     ###########################################################################
@@ -197,6 +256,35 @@ class QuadraticCostFunction( CostFunction ):
         
         return dJ
     
+    
+    #############################
+    @vectorized('h')
+    def h_batch(self, X, t = 0):
+        """ Vectorized final cost with zero value """
+        
+        return np.zeros( X.shape[0] )
+    
+    
+    #############################
+    @vectorized('g')
+    def g_batch(self, X, U, Y, t = 0):
+        """ Vectorized quadratic additive cost """
+        
+        # Delta values with respect to bar values
+        dX = X - self.xbar
+        dU = U - self.ubar
+        dY = Y - self.ybar
+        
+        dJ = ( np.sum( np.dot( dX , self.Q ) * dX , axis = 1 ) +
+               np.sum( np.dot( dU , self.R ) * dU , axis = 1 ) +
+               np.sum( np.dot( dY , self.V ) * dY , axis = 1 ) )
+        
+        # Set cost to zero if on target
+        if self.ontarget_check:
+            dJ[ np.linalg.norm( dX , axis = 1 ) < self.EPS ] = 0
+        
+        return dJ
+    
 
 ##############################################################################
 
@@ -247,6 +335,28 @@ class TimeCostFunction( CostFunction ):
                 dJ = 0
                 
         return dJ
+    
+    
+    #############################
+    @vectorized('h')
+    def h_batch(self, X , t = 0 ):
+        """ Vectorized final cost with zero value """
+        
+        return np.zeros( X.shape[0] )
+    
+    
+    #############################
+    @vectorized('g')
+    def g_batch(self, X , U , Y, t = 0 ):
+        """ Vectorized unity cost """
+        
+        dJ = np.ones( X.shape[0] )
+        
+        if self.ontarget_check:
+            dX = X - self.xbar
+            dJ[ np.linalg.norm( dX , axis = 1 ) < self.EPS ] = 0
+                
+        return dJ
 
 '''
 #################################################################
@@ -5,9 +5,32 @@ Created on Fri Aug 07 11:51:55 2015
 @author: agirard
 """
 
+import os
+import json
+
 import numpy as np
 
 from scipy.integrate import odeint
+from scipy.integrate import cumtrapz
+from scipy.integrate import solve_ivp
+
+
+# Dormand-Prince 5(4) coefficients of the rk45 solver
+DP_C = np.array([ 0.0 , 1/5 , 3/10 , 4/5 , 8/9 , 1.0 , 1.0 ])
+
+DP_A = np.array([
+    [ 0.0 ,        0.0 ,         0.0 ,        0.0 ,      0.0 ,         0.0   ],
+    [ 1/5 ,        0.0 ,         0.0 ,        0.0 ,      0.0 ,         0.0   ],
+    [ 3/40 ,       9/40 ,        0.0 ,        0.0 ,      0.0 ,         0.0   ],
+    [ 44/45 ,     -56/15 ,       32/9 ,       0.0 ,      0.0 ,         0.0   ],
+    [ 19372/6561 , -25360/2187 , 64448/6561 , -212/729 , 0.0 ,         0.0   ],
+    [ 9017/3168 , -355/33 ,      46732/5247 , 49/176 ,  -5103/18656 ,  0.0   ],
+    [ 35/384 ,     0.0 ,         500/1113 ,   125/192 , -2187/6784 ,   11/84 ]])
+
+DP_B = DP_A[6]
+
+DP_E = np.array([ 71/57600 , 0.0 , -71/16695 , 71/1920 , -17253/339200 , 
+                  22/525 , -1/40 ])
 
 
 ##########################################################################
@@ -35,6 +58,9 @@ class Trajectory():
         self.r  = r
         self.J  = J
         self.dJ = dJ
+        
+        # Continuous solution x(t) of the solver, if available
+        self.dense = None
 
         self._compute_size()
         
@@ -82,6 +108,27 @@ class Trajectory():
             return cls(*data)
         
         
+    ############################
+    @classmethod
+    def open(cls, path):
+        """ Trajectory memory-mapped from a TrajectoryStore directory """
+        
+        return cls( **TrajectoryStore( path ).arrays() )
+    
+    
+    ############################
+    def time_slice(self, t_start , t_end ):
+        """ Trajectory of the samples with t_start <= t <= t_end (views) """
+        
+        i = np.searchsorted( self.t , t_start , side = 'left'  )
+        j = np.searchsorted( self.t , t_end   , side = 'right' )
+        
+        data = { k : None if v is None else v[i:j] 
+                 for k , v in self._asdict().items() }
+        
+        return Trajectory( **data )
+        
+        
     ############################
     def _compute_size(self):
         
@@ -127,8 +174,163 @@ class Trajectory():
         # Find associated state
         return self.x[i,:]
     
+    
+    ############################
+    def resample(self, t = 1001 ):
+        """ 
+        Trajectory at new times
+        
+        t : array of times, or number of evenly spaced times
+        
+        x is evaluated with the dense output of the solver when available,
+        other signals are interpolated linearly between samples.
+        """
+        
+        if np.isscalar( t ):
+            t = np.linspace( self.t[0] , self.t[-1] , int( t ) )
+            
+        t = np.asarray( t , dtype = float )
+        
+        def interp( arr ):
+            if arr is None:
+                return None
+            if arr.ndim == 1:
+                return np.interp( t , self.t , arr )
+            return np.column_stack([ np.interp( t , self.t , arr[:,j] ) 
+                                     for j in range( arr.shape[1] ) ])
+        
+        if self.dense is None:
+            x = interp( self.x )
+        else:
+            x = self.dense( t ).T
+            
+        traj = Trajectory(
+            x  = x,
+            u  = interp( self.u ),
+            t  = t,
+            dx = interp( self.dx ),
+            y  = interp( self.y ),
+            r  = interp( self.r ),
+            J  = interp( self.J ),
+            dJ = interp( self.dJ )
+            )
+        
+        traj.dense = self.dense
+        
+        return traj
+    
 
 
+##########################################################################
+# Trajectory Store
+##########################################################################
+
+class TrajectoryStore():
+    """ 
+    Append-only on-disk storage of a trajectory
+    --------------------------------------------------------
+    path : directory with one raw float64 file per signal, and a json header
+           with the dimensions and the number of samples written
+    --------------------------------------------------------
+    Chunks of samples are appended with write(), the header is updated 
+    after each chunk so the samples written are readable during the
+    simulation or after a crash. Trajectory.open( path ) maps the files in
+    memory without loading them.
+    """
+    
+    header_name = 'header.json'
+    
+    ############################
+    def __init__(self, path ):
+        
+        self.path  = path
+        self.dims  = {}     # signal name : dim ( None for 1D signals )
+        self.count = 0      # number of samples
+        
+        header = os.path.join( path , self.header_name )
+        
+        if os.path.exists( header ):
+            with open( header ) as f:
+                data = json.load( f )
+            self.dims  = data['dims']
+            self.count = data['count']
+            
+            
+    ############################
+    @classmethod
+    def create(cls, path , dims ):
+        """ New empty store, overwrite the signals of an existing one """
+        
+        os.makedirs( path , exist_ok = True )
+        
+        store      = cls( path )
+        store.dims = dict( dims )
+        store.count = 0
+        
+        for name in store.dims:
+            open( store._file( name ) , 'wb' ).close()
+            
+        store._write_header()
+        
+        return store
+    
+    
+    ############################
+    def _file(self, name ):
+        
+        return os.path.join( self.path , name + '.bin' )
+    
+    
+    ############################
+    def _write_header(self):
+        
+        with open( os.path.join( self.path , self.header_name ) , 'w' ) as f:
+            json.dump( { 'dims' : self.dims , 'count' : self.count } , f )
+            
+            
+    ############################
+    def write(self, **chunk ):
+        """ Append a chunk of samples, one array per signal """
+        
+        rows = None
+        
+        for name , dim in self.dims.items():
+            
+            arr = np.ascontiguousarray( chunk[ name ] , dtype = np.float64 )
+            
+            if rows is None:
+                rows = arr.shape[0]
+            elif arr.shape[0] != rows:
+                raise ValueError("Chunk arrays must have same length along axis 0")
+            
+            with open( self._file( name ) , 'ab' ) as f:
+                f.write( arr.tobytes() )
+                
+        self.count = self.count + rows
+        
+        self._write_header()
+        
+        
+    ############################
+    def arrays(self):
+        """ Read-only memory maps of all signals, None for missing ones """
+        
+        data = { k : None for k in Trajectory._dict_keys }
+        
+        for name , dim in self.dims.items():
+            
+            shape = ( self.count , ) if dim is None else ( self.count , dim )
+            
+            if self.count == 0:
+                data[ name ] = np.zeros( shape )
+            else:
+                data[ name ] = np.memmap( self._file( name ) , mode = 'r' ,
+                                          dtype = np.float64 , shape = shape )
+                
+        return data
+    
+    
+
 ##########################################################################
 # Simulator
 ##########################################################################
@@ -141,7 +343,23 @@ class Simulator:
     cds    : Instance of ContinuousDynamicSystem
     tf     : float : final time for simulation
     n      : int   : number of time steps
-    solver : {'ode', 'euler'}
+    solver : {'ode', 'euler', 'rk2', 'rk4', 'rk45', 'ivp'}
+    
+    'euler', 'rk2' and 'rk4' take one fixed step between samples, 'rk45' 
+    takes adaptive Dormand-Prince sub-steps between samples with tolerances
+    rtol and atol, and raises a RuntimeError when a rejected step is below 
+    h_min * ( tf - t0 ) ( e.g. with NaN derivatives ).
+    
+    'ivp' uses scipy solve_ivp with method ivp_method ( 'RK45', 'Radau', 
+    'BDF', 'LSODA', ... ) and the terminal or non-terminal functions of 
+    events ( see goal_event, bounds_event and collision_event ). The 
+    trajectory is stored at the solver steps only, n is not used, use 
+    traj.resample() to get evenly spaced samples from the dense output.
+    
+    When store_path is set, the samples are written by chunks of 
+    chunk_size to a TrajectoryStore instead of being kept in memory, with
+    the cost integrated chunk by chunk, and compute() returns the 
+    memory-mapped Trajectory. 'ode' is then restarted at each chunk.
     """
     
     ############################
@@ -157,77 +375,374 @@ class Simulator:
         self.x0     = self.cds.x0
         self.cf     = self.cds.cost_function 
         
+        # Dimension of the internal control inputs
+        self.m_internal = self.cds.m
+        
+        # Options of the rk45 and ivp solvers
+        self.rtol   = 1.0e-6
+        self.atol   = 1.0e-8
+        
+        # rk45 fails when a rejected step is below h_min * ( tf - t0 )
+        self.h_min  = 1.0e-12
+        
+        # Options of the ivp solver
+        self.ivp_method = 'RK45'
+        self.events     = []
+        self.max_step   = np.inf
+        
+        # Event times and states of the last ivp simulation
+        self.t_events = None
+        self.x_events = None
+        
+        # Options of the streaming mode
+        self.store_path = None     # directory of the TrajectoryStore
+        self.chunk_size = 10000    # samples per chunk
+        
         # Check Initial condition state-vector
         if self.x0.size != self.cds.n:
             raise ValueError(
                 "Number of elements in x0 must be equal to number of states"
             )
             
+        if solver not in ('ode', 'euler', 'rk2', 'rk4', 'rk45', 'ivp'):
+            raise ValueError("Unknown solver: %s" % solver)
+            
 
     ##############################
     def compute(self):
         """ Integrate trought time """
 
+        if self.store_path is not None:
+            
+            return self._compute_streaming()
+        
+        if self.solver == 'ivp':
+            
+            return self._compute_ivp()
+        
         t  = np.linspace( self.t0 , self.tf , self.n )
+        
+        u_sol = self._inputs( t )
 
         if self.solver == 'ode':
 
             x_sol = odeint( self.cds.fsim , self.x0 , t)
 
-            # Compute inputs-output values
-            y_sol  = np.zeros(( self.n , self.cds.p ))
-            u_sol  = np.zeros((self.n,self.cds.m))
-            dx_sol = np.zeros((self.n,self.cds.n))
-
-            for i in range(self.n):
-                ti = t[i]
-                xi = x_sol[i,:]
-                ui = self.cds.t2u( ti )
-
-                dx_sol[i,:] = self.cds.f( xi , ui , ti )
-                y_sol[i,:]  = self.cds.h( xi , ui , ti )
-                u_sol[i,:]  = ui
+            # Compute inputs-output values of all samples at once
+            dx_sol, y_sol, uc_sol = self._evaluate_batch( x_sol , u_sol , t )
 
-        elif self.solver == 'euler':
+        else:
+            
+            step = self._step_function()
 
             x_sol  = np.zeros((self.n,self.cds.n))
             dx_sol = np.zeros((self.n,self.cds.n))
-            u_sol  = np.zeros((self.n,self.cds.m))
             y_sol  = np.zeros((self.n,self.cds.p))
-
+            uc_sol = np.zeros((self.n,self.m_internal))
+            
+            # Stage buffers, reused at each step
+            self._k   = np.zeros(( 7 , self.cds.n ))
+            self._h   = self.dt
+            
             # Initial State
             x_sol[0,:] = self.x0
-            dt = ( self.tf + 0.0 - self.t0 ) / ( self.n - 1 )
+            dt = self.dt
+            
+            # Signals are recorded with the first stage of each step
             for i in range(self.n):
 
                 ti = t[i]
                 xi = x_sol[i,:]
-                ui = self.cds.t2u( ti )
+                ui = u_sol[i,:]
+                
+                dx_sol[i], y_sol[i], uc_sol[i] = self._evaluate( xi , ui , ti )
 
                 if i+1<self.n:
-                    dx_sol[i]    = self.cds.f( xi , ui , ti )
-                    x_sol[i+1,:] = dx_sol[i] * dt + xi
-
-                y_sol[i,:] = self.cds.h( xi , ui , ti )
-                u_sol[i,:] = ui
+                    x_sol[i+1] = step( xi , dx_sol[i] , ti , dt )
+                    
+        return self._trajectory( x_sol , u_sol , t , dx_sol , y_sol , uc_sol )
+    
+    
+    ##############################
+    def _compute_ivp(self):
+        """ Integrate with solve_ivp, stop at the first terminal event """
+        
+        sol = solve_ivp( lambda t , x : self.cds.fsim( x , t ) ,
+                         ( self.t0 , self.tf ) , 
+                         self.x0 ,
+                         method       = self.ivp_method ,
+                         events       = self.events or None ,
+                         dense_output = True ,
+                         rtol         = self.rtol ,
+                         atol         = self.atol ,
+                         max_step     = self.max_step )
+        
+        if sol.status < 0 :
+            raise RuntimeError( sol.message )
+        
+        self.t_events = sol.t_events
+        self.x_events = sol.y_events
+        
+        if sol.status == 1 :
+            print('Simulation stopped by an event at t = %.4f' % sol.t[-1])
+        
+        t     = sol.t
+        x_sol = sol.y.T
+        u_sol = self._inputs( t )
+        
+        dx_sol, y_sol, uc_sol = self._evaluate_batch( x_sol , u_sol , t )
+        
+        traj = self._trajectory( x_sol , u_sol , t , dx_sol , y_sol , uc_sol )
+        
+        traj.dense = sol.sol
+        
+        return traj
+    
+    
+    ##############################
+    def _inputs(self, t ):
+        """ Reference inputs of the sys at all times t """
+        
+        u = np.array([ self.cds.t2u( ti ) for ti in t ] , dtype = float )
+        
+        return u.reshape( t.size , self.cds.m )
+    
+    
+    ##############################
+    def _evaluate(self, x , u , t ):
+        """ dx , y and internal inputs at one sample """
+        
+        dx = self.cds.f( x , u , t )
+        y  = self.cds.h( x , u , t )
+        
+        return dx , y , u
+    
+    
+    ##############################
+    def _evaluate_batch(self, X , U , t ):
+        """ dx , y and internal inputs at all samples """
+        
+        # The batch methods loop over f and h when only those are overloaded
+        dX = self.cds.f_batch( X , U , t )
+        Y  = self.cds.h_batch( X , U , t )
+        
+        return dX , Y , U
+    
+    
+    ##############################
+    def _compute_streaming(self):
+        """ Integrate by chunks of samples appended to a TrajectoryStore """
+        
+        if self.solver == 'ivp':
+            raise ValueError("Streaming needs a solver with a fixed output grid")
+        
+        cf = self._cost_function()
+        
+        # Dimensions of the stored signals, from empty signals
+        empty = self._fields( np.zeros(( 0 , self.cds.n )) , 
+                              np.zeros(( 0 , self.cds.m )) ,
+                              np.zeros( 0 ) ,
+                              np.zeros(( 0 , self.cds.n )) ,
+                              np.zeros(( 0 , self.cds.p )) ,
+                              np.zeros(( 0 , self.m_internal )) )
+        
+        dims = { k : ( None if v.ndim == 1 else v.shape[1] ) 
+                 for k , v in empty.items() }
+        
+        if cf is not None:
+            dims['J']  = None
+            dims['dJ'] = None
+        
+        store = TrajectoryStore.create( self.store_path , dims )
+        
+        if self.solver != 'ode':
+            step    = self._step_function()
+            self._k = np.zeros(( 7 , self.cds.n ))
+            self._h = self.dt
+        
+        # Chunk buffers, reused
+        x_buf  = np.zeros(( self.chunk_size , self.cds.n ))
+        dx_buf = np.zeros(( self.chunk_size , self.cds.n ))
+        y_buf  = np.zeros(( self.chunk_size , self.cds.p ))
+        uc_buf = np.zeros(( self.chunk_size , self.m_internal ))
+        
+        x      = np.array( self.x0 , dtype = float )
+        t_last = None
+        
+        for start in range( 0 , self.n , self.chunk_size ):
+            
+            rows = min( self.chunk_size , self.n - start )
+            t    = self.t0 + np.arange( start , start + rows ) * self.dt
+            u    = self._inputs( t )
+            
+            if self.solver == 'ode':
                 
-        #########################
-        traj = Trajectory(
-          x = x_sol,
-          u = u_sol,
-          t = t,
-          dx= dx_sol,
-          y = y_sol
-        )
-        #########################
+                # Restart from the last sample of the previous chunk
+                if t_last is None:
+                    xs = odeint( self.cds.fsim , x , t )
+                else:
+                    xs = odeint( self.cds.fsim , x , np.append( t_last , t ) )[1:]
+                
+                dxs, ys, ucs = self._evaluate_batch( xs , u , t )
+                
+                x = xs[-1]
+                
+            else:
+                
+                for j in range( rows ):
+                    
+                    x_buf[j] = x
+                    dx_buf[j], y_buf[j], uc_buf[j] = self._evaluate( x , u[j] , t[j] )
+                    
+                    if start + j + 1 < self.n:
+                        x = step( x , dx_buf[j] , t[j] , self.dt )
+                    
+                xs, dxs, ys, ucs = x_buf[:rows], dx_buf[:rows], y_buf[:rows], uc_buf[:rows]
+                
+            chunk = self._fields( xs , u , t , dxs , ys , ucs )
+            
+            # Cost integral continued from the last sample of the last chunk
+            if cf is not None:
+                
+                dJ = cf.g_batch( chunk['x'] , chunk['u'] , chunk['y'] , t )
+                
+                if t_last is None:
+                    J = cumtrapz( y = dJ , x = t , initial = 0 )
+                else:
+                    J = J_last + cumtrapz( y = np.append( dJ_last , dJ ) , 
+                                           x = np.append( t_last , t ) )
+                
+                chunk['J']  = J
+                chunk['dJ'] = dJ
+                
+                J_last  = J[-1]
+                dJ_last = dJ[-1]
+                
+            store.write( **chunk )
+            
+            t_last = t[-1]
+            
+        return Trajectory.open( self.store_path )
+    
+    
+    ##############################
+    def _step_function(self):
+        """ Step method of the fixed output grid solver """
+        
+        return { 'euler' : self._euler_step ,
+                 'rk2'   : self._rk2_step ,
+                 'rk4'   : self._rk4_step ,
+                 'rk45'  : self._rk45_step }[ self.solver ]
+    
+    
+    ##############################
+    def _fields(self, x , u , t , dx , y , uc ):
+        """ Trajectory signals from the integration signals """
+        
+        return { 'x' : x , 'u' : u , 't' : t , 'dx' : dx , 'y' : y }
+    
+    
+    ##############################
+    def _cost_function(self):
+        
+        return self.cf
+    
+    
+    ##############################
+    def _trajectory(self, x , u , t , dx , y , uc ):
+        """ Trajectory object with cost evaluation """
+        
+        traj = Trajectory( **self._fields( x , u , t , dx , y , uc ) )
+        
+        cf = self._cost_function()
         
         # Compute Cost function
-        if self.cf is not None :
-            traj = self.cf.trajectory_evaluation( traj )
+        if cf is not None :
+            traj = cf.trajectory_evaluation( traj )
         
         return traj
 
 
+    ##############################
+    def _euler_step(self, x , dx , t , dt ):
+        """ Forward euler """
+        
+        return x + dx * dt
+    
+    
+    ##############################
+    def _rk2_step(self, x , dx , t , dt ):
+        """ Explicit midpoint """
+        
+        f  = self.cds.fsim
+        k  = self._k
+        
+        k[1] = f( x + 0.5 * dt * dx , t + 0.5 * dt )
+        
+        return x + dt * k[1]
+    
+    
+    ##############################
+    def _rk4_step(self, x , dx , t , dt ):
+        """ Classical 4th order runge-kutta """
+        
+        f  = self.cds.fsim
+        k  = self._k
+        
+        k[1] = f( x + 0.5 * dt * dx   , t + 0.5 * dt )
+        k[2] = f( x + 0.5 * dt * k[1] , t + 0.5 * dt )
+        k[3] = f( x +       dt * k[2] , t +       dt )
+        
+        return x + dt / 6.0 * ( dx + 2.0 * k[1] + 2.0 * k[2] + k[3] )
+    
+    
+    ##############################
+    def _rk45_step(self, x , dx , t , dt ):
+        """ Adaptive Dormand-Prince 5(4) sub-steps from t to t + dt """
+        
+        f  = self.cds.fsim
+        k  = self._k
+        
+        t_end = t + dt
+        h_try = self._h
+        
+        k[0] = dx
+        
+        while t_end - t > 1e-12 * dt:
+            
+            h = min( h_try , t_end - t )
+            
+            for s in range( 1 , 7 ):
+                k[s] = f( x + h * DP_A[s,:s].dot( k[:s] ) , t + DP_C[s] * h )
+                
+            x_new = x + h * DP_B.dot( k[:6] )
+            
+            # Difference between the 5th and embedded 4th order solutions
+            err   = h * DP_E.dot( k )
+            scale = self.atol + self.rtol * np.maximum( np.abs( x ) , 
+                                                        np.abs( x_new ) )
+            e     = np.sqrt( np.mean( ( err / scale )**2 ) )
+            
+            # NaN or inf derivatives: rejected with the largest reduction
+            if not np.isfinite( e ):
+                e = np.inf
+            
+            if e <= 1.0:
+                t    = t + h
+                x    = x_new
+                k[0] = k[6]   # first same as last
+                
+            elif h < self.h_min * ( self.tf - self.t0 ):
+                raise RuntimeError(
+                    "rk45 step size %g too small at t = %g" % ( h , t ) )
+                
+            h_try = h * min( 5.0 , max( 0.2 , 0.9 * ( e + 1e-16 ) ** -0.2 ) )
+            
+        self._h = h_try
+        
+        return x
+    
+    
 
 ###############################################################################
 # Closed Loop Simulator
@@ -240,10 +755,14 @@ class CLosedLoopSimulator(Simulator):
     CLSystem  : Instance of ClosedLoopSystem
     tf : final time
     n  : number of point
-    solver : 'ode' or 'euler'
+    solver : 'ode', 'euler', 'rk2', 'rk4' or 'rk45'
     --------------------------------------------------------
     Use this class instead of Simulation() in order to access
     internal control inputs
+    
+    The internal control inputs are recorded with dx during the integration
+    with fixed-step solvers, and computed with the batch methods of the 
+    controller and the plant after odeint.
     """
     
     ############################
@@ -257,50 +776,74 @@ class CLosedLoopSimulator(Simulator):
         # Use the plant cost function for closed-loop sys
         self.plant_cf = ClosedLoopSystem.plant.cost_function
         
-
-    ###########################################################################
-    def compute(self):
+        # Internal control inputs are the plant inputs
+        self.m_internal = ClosedLoopSystem.plant.m
         
-        traj = Simulator.compute(self)
         
-        u = self._compute_control_inputs( traj )
-
-        cl_traj = Trajectory(
-            x  = traj.x,
-            u  = u,
-            t  = traj.t,
-            dx = traj.dx,
-            y  = traj.y,
-            r  = traj.u.copy() # reference is input of global sys
-        )
+    ###########################################################################
+    def _evaluate(self, x , u , t ):
+        """ dx , y and internal inputs with one call to the controller """
         
-        # Compute Cost function
-        if self.plant_cf is not None :
+        y = self.cds.h( x , u , t )
+        
+        if self.cds.overloads( 'f' , 'f_with_input' ):
             
-            cl_traj = self.plant_cf.trajectory_evaluation( cl_traj )
-
-        return cl_traj
+            dx = self.cds.f( x , u , t )
+            uc = self._controller_input( x , y , u , t )
+            
+        else:
+            
+            dx , uc = self.cds.f_with_input( x , u , t )
         
-
+        return dx , y , uc
+    
+    
     ###########################################################################
-    def _compute_control_inputs(self, traj ):
-        """ Compute internal control inputs of the closed-loop system """
-
-        r = traj.u.copy() # reference is input of combined sys
-        u = np.zeros((self.n,self.cds.plant.m))
-
-        # Compute internal input signal_proc
-        for i in range(self.n):
-
-            ri = r[i,:]
-            yi = traj.y[i,:]
-            ti = traj.t[i]
-
-            ui = self.cds.controller.c( yi , ri , ti )
+    def _evaluate_batch(self, X , R , t ):
+        """ dx , y and internal inputs at all samples """
+        
+        cds = self.cds
+        
+        # Closed loop dynamics not built on the controller and plant only
+        if cds.overloads( 'f' , 'f_batch' ):
             
-            u[i,:] = ui
+            dX = np.zeros(( X.shape[0] , cds.n ))
+            Y  = np.zeros(( X.shape[0] , cds.p ))
+            Uc = np.zeros(( X.shape[0] , self.m_internal ))
+            
+            for i in range( X.shape[0] ):
+                dX[i], Y[i], Uc[i] = self._evaluate( X[i] , R[i] , t[i] )
+                
+            return dX , Y , Uc
+        
+        # Same as cds.f_batch, keeping the controller outputs
+        Y  = cds.h_batch( X , R , t )
+        Uc = cds.controller.c_batch( Y , R , t )
+        dX = cds.plant.f_batch( X , Uc , t )
+        
+        return dX , Y , Uc
+    
+    
+    ###########################################################################
+    def _controller_input(self, x , y , r , t ):
+        """ Internal control input of the closed-loop system at one sample """
+        
+        return self.cds.controller.c( y , r , t )
+        
 
-        return u
+    ###########################################################################
+    def _fields(self, x , u , t , dx , y , uc ):
+        """ Internal control inputs as u, reference is input of global sys """
+        
+        return { 'x' : x , 'u' : uc , 't' : t , 'dx' : dx , 'y' : y , 
+                 'r' : u.copy() }
+    
+    
+    ###########################################################################
+    def _cost_function(self):
+        
+        # Use the plant cost function for closed-loop sys
+        return self.plant_cf
     
     
 ###############################################################################
@@ -313,25 +856,388 @@ class DynamicCLosedLoopSimulator( CLosedLoopSimulator ):
     """
 
     ###########################################################################
-    def _compute_control_inputs(self, traj ):
-        """ Compute internal control inputs of the closed-loop system """
+    def _controller_input(self, x , y , r , t ):
+        """ Internal control input of the closed-loop system at one sample """
+        
+        # extract internal controller states
+        x , z = self.cds._split_states( x ) 
 
-        r = traj.u.copy() # reference is input of combined sys
-        u = np.zeros((self.n,self.cds.plant.m))
+        return self.cds.controller.c( z , y , r , t )
+    
+    
+##########################################################################
+# Events of the ivp solver
+##########################################################################
 
-        # Compute internal input signal_proc
-        for i in range(self.n):
+def goal_event( x_goal , radius = 0.1 , terminal = True ):
+    """ 
+    Event x within radius of x_goal ( euclidean norm )
+    
+    x_goal : array of dim = ( sys.n , ), use nan to ignore a state
+    """
+    
+    x_goal = np.asarray( x_goal , dtype = float )
+    mask   = ~ np.isnan( x_goal )
+    
+    def event( t , x ):
+        return np.linalg.norm( x[mask] - x_goal[mask] ) - radius
+    
+    event.terminal  = terminal
+    event.direction = -1
+    
+    return event
 
-            ri = r[i,:]
-            yi = traj.y[i,:]
-            xi = traj.x[i,:]
-            ti = traj.t[i]
-            
-            # extract internal controller states
-            xi,zi = self.cds._split_states( xi ) 
 
-            ui = self.cds.controller.c( zi, yi , ri , ti )
-            
-            u[i,:] = ui
+############################
+def bounds_event( sys , terminal = True ):
+    """ Event x leaving the box sys.x_lb , sys.x_ub """
+    
+    lb = np.asarray( sys.x_lb , dtype = float )
+    ub = np.asarray( sys.x_ub , dtype = float )
+    
+    # Only finite bounds
+    lb_i = np.isfinite( lb )
+    ub_i = np.isfinite( ub )
+    
+    def event( t , x ):
+        margins = np.concatenate(( x[lb_i] - lb[lb_i] , ub[ub_i] - x[ub_i] ))
+        return margins.min( initial = np.inf )
+    
+    event.terminal  = terminal
+    event.direction = -1
+    
+    return event
 
-        return u
+
+############################
+def collision_event( sys , terminal = True ):
+    """ 
+    Event x becoming invalid for sys.isavalidstate ( obstacle hit ) 
+    
+    The event function is a step +1 / -1, the hit time is located by the
+    root finding of solve_ivp within its tolerance.
+    """
+    
+    def event( t , x ):
+        return 1.0 if sys.isavalidstate( x ) else -1.0
+    
+    event.terminal  = terminal
+    event.direction = -1
+    
+    return event
+
+
+
+##########################################################################
+# Trajectory Bundle
+##########################################################################
+
+class TrajectoryBundle():
+    """ 
+    Simulation data of N runs sharing the same time vector
+    --------------------------------------------------------
+    x  : array of dim = ( N , time-steps , sys.n )
+    u  : array of dim = ( N , time-steps , sys.m )
+    t  : array of dim = ( time-steps , )
+    dx : array of dim = ( N , time-steps , sys.n )
+    y  : array of dim = ( N , time-steps , sys.p )
+    r  : array of dim = ( N , time-steps , sys.k ) or None
+    dJ : array of dim = ( N , time-steps ) or None
+    J  : array of dim = ( N , ) total cost of each run, or None
+    --------------------------------------------------------
+    bundle[i] returns the Trajectory of run i
+    """
+    
+    ############################
+    def __init__(self, x, u, t, dx, y, r=None, J=None, dJ=None):
+        
+        self.x  = x
+        self.u  = u
+        self.t  = t
+        self.dx = dx
+        self.y  = y
+        self.r  = r
+        self.J  = J
+        self.dJ = dJ
+        
+        self.runs       = x.shape[0]
+        self.time_steps = t.size
+        
+        
+    ############################
+    def __len__(self):
+        
+        return self.runs
+    
+    
+    ############################
+    def __getitem__(self, i ):
+        """ Trajectory of run i, with cumulative cost J """
+        
+        if self.dJ is None:
+            dJ = None
+            J  = None
+        else:
+            dJ = self.dJ[i]
+            J  = cumtrapz( y = dJ , x = self.t , initial = 0 )
+        
+        return Trajectory(
+            x  = self.x[i],
+            u  = self.u[i],
+            t  = self.t,
+            dx = self.dx[i],
+            y  = self.y[i],
+            r  = None if self.r is None else self.r[i],
+            J  = J,
+            dJ = dJ
+            )
+    
+    
+    ############################
+    def save(self, name = 'bundle' ):
+        
+        data = { k : getattr( self, k ) for k in Trajectory._dict_keys 
+                 if getattr( self, k ) is not None }
+        
+        np.savez( name , **data )
+        
+        
+    ############################
+    @classmethod
+    def load(cls, name):
+        
+        with np.load( name ) as data:
+            return cls( **data )
+        
+    
+    
+##########################################################################
+# Batch Simulator
+##########################################################################
+
+class BatchSimulator:
+    """
+    Fixed-step simulation of N initial conditions at once
+    --------------------------------------------------------
+    cds    : Instance of ContinuousDynamicSystem (or ClosedLoopSystem)
+    X0     : initial states, array of dim = ( N , sys.n )
+    tf     : float : final time for simulation
+    n      : int   : number of time steps
+    solver : {'rk4', 'rk2', 'euler'}
+    params : dict of { attribute name : array of dim = ( N , ) }
+    --------------------------------------------------------
+    All runs are stepped together with cds.f_batch, so the python overhead
+    is paid once per time step instead of once per sample of each run.
+    Parameter arrays are set as attributes of cds during compute(), which
+    works for systems whose batch terms are elementwise in the parameters
+    (ex.: l1, m1 or d1 of the pendulums), then the scalar values are 
+    restored.
+    
+    Memory: all runs are kept in memory, about 8 * N * n * (2n+m+p) bytes,
+    use decimation to store only one sample every k steps. The cost J of
+    each run is integrated at every step.
+    """
+    
+    ############################
+    def __init__(
+        self, ContinuousDynamicSystem, X0, tf=10, n=1001, solver='rk4', 
+        params=None):
+        
+        self.cds    = ContinuousDynamicSystem
+        self.t0     = 0
+        self.tf     = tf
+        self.n      = int(n)
+        self.dt     = ( tf + 0.0 - self.t0 ) / ( n - 1 )
+        self.solver = solver
+        self.X0     = np.atleast_2d( np.asarray( X0 , dtype = float ) )
+        self.params = params
+        
+        # Options
+        self.decimation = 1   # store one sample every decimation steps
+        
+        # Use the plant cost function and inputs for closed-loop sys
+        if hasattr( self.cds , 'plant' ):
+            self.cf = self.cds.plant.cost_function
+        else:
+            self.cf = self.cds.cost_function
+        
+        # Check Initial condition state-vector
+        if self.X0.shape[1] != self.cds.n:
+            raise ValueError(
+                "Number of columns in X0 must be equal to number of states"
+            )
+            
+        if solver not in ('rk4', 'rk2', 'euler'):
+            raise ValueError("Unknown batch solver: %s" % solver)
+            
+            
+    ##############################
+    def _inputs(self, t , N ):
+        """ Open-loop inputs (or references) of the N runs """
+        
+        return np.tile( self.cds.t2u( t ) , ( N , 1 ) )
+    
+    
+    ##############################
+    def _internal_inputs(self, X , Y , R , t ):
+        """ Plant inputs computed by the controller of a closed-loop sys """
+        
+        ctl = self.cds.controller
+        
+        if hasattr( self.cds , '_split_states' ):
+            
+            # Dynamic controller: loop with the controller internal states
+            U = np.zeros(( X.shape[0] , self.cds.plant.m ))
+            
+            for j in range( X.shape[0] ):
+                x , z = self.cds._split_states( X[j] )
+                U[j]  = ctl.c( z , Y[j] , R[j] , t )
+                
+            return U
+        
+        return ctl.c_batch( Y , R , t )
+    
+    
+    ##############################
+    def _step(self, X , dX , t ):
+        """ State of all runs after one time step """
+        
+        f  = self.cds.f_batch
+        dt = self.dt
+        N  = X.shape[0]
+        
+        if self.solver == 'euler':
+            
+            return X + dt * dX
+        
+        U_half = self._inputs( t + 0.5 * dt , N )
+        
+        if self.solver == 'rk2':
+            
+            k2 = f( X + 0.5 * dt * dX , U_half , t + 0.5 * dt )
+            
+            return X + dt * k2
+        
+        # rk4
+        k2 = f( X + 0.5 * dt * dX , U_half , t + 0.5 * dt )
+        k3 = f( X + 0.5 * dt * k2 , U_half , t + 0.5 * dt )
+        k4 = f( X + dt * k3 , self._inputs( t + dt , N ) , t + dt )
+        
+        return X + dt / 6.0 * ( dX + 2 * k2 + 2 * k3 + k4 )
+    
+    
+    ##############################
+    def compute(self):
+        """ Integrate all runs trought time, return a TrajectoryBundle """
+        
+        # Set per-run parameters
+        saved = {}
+        
+        if self.params is not None:
+            
+            for name, values in self.params.items():
+                saved[ name ] = getattr( self.cds , name )
+                setattr( self.cds , name , np.asarray( values , dtype = float ) )
+        
+        try:
+            bundle = self._compute()
+        
+        finally:
+            for name, value in saved.items():
+                setattr( self.cds , name , value )
+                
+        return bundle
+    
+    
+    ##############################
+    def _compute(self):
+        
+        closed_loop = hasattr( self.cds , 'plant' )
+        
+        # Static closed loop: the controller is evaluated once per step
+        direct = ( closed_loop and 
+                   not hasattr( self.cds , '_split_states' ) and
+                   not self.cds.overloads( 'f' , 'f_batch' ) )
+        
+        N   = self.X0.shape[0]
+        t   = np.linspace( self.t0 , self.tf , self.n )
+        idx = np.arange( 0 , self.n , self.decimation )
+        ns  = idx.size
+        
+        m = self.cds.plant.m if closed_loop else self.cds.m
+        
+        # Time-major buffers, each step writes a contiguous block
+        x_sol  = np.zeros(( ns , N , self.cds.n ))
+        dx_sol = np.zeros(( ns , N , self.cds.n ))
+        u_sol  = np.zeros(( ns , N , m ))
+        y_sol  = np.zeros(( ns , N , self.cds.p ))
+        r_sol  = np.zeros(( ns , N , self.cds.m )) if closed_loop else None
+        dJ_sol = np.zeros(( ns , N )) if self.cf is not None else None
+        J      = np.zeros( N )        if self.cf is not None else None
+        
+        X       = self.X0.copy()
+        dJ_last = None
+        s       = 0
+        
+        for i in range( self.n ):
+            
+            ti = t[i]
+            Ui = self._inputs( ti , N )
+            
+            Yi = self.cds.h_batch( X , Ui , ti )
+            
+            if not closed_loop:
+                
+                Uc  = Ui
+                dXi = self.cds.f_batch( X , Ui , ti )
+                
+            elif direct:
+                
+                # Same as cds.f_batch, keeping the controller outputs
+                Uc  = self._internal_inputs( X , Yi , Ui , ti )
+                dXi = self.cds.plant.f_batch( X , Uc , ti )
+                
+            else:
+                
+                Uc  = self._internal_inputs( X , Yi , Ui , ti )
+                dXi = self.cds.f_batch( X , Ui , ti )
+            
+            # Cost with the trapezoidal rule, like trajectory_evaluation
+            if self.cf is not None:
+                
+                dJi = self.cf.g_batch( X , Uc , Yi , ti )
+                
+                if dJ_last is not None:
+                    J += 0.5 * ( dJ_last + dJi ) * ( ti - t[i-1] )
+                    
+                dJ_last = dJi
+                
+            if i % self.decimation == 0:
+                
+                x_sol[s]  = X
+                dx_sol[s] = dXi
+                y_sol[s]  = Yi
+                u_sol[s]  = Uc
+                
+                if closed_loop:
+                    r_sol[s] = Ui
+                    
+                if self.cf is not None:
+                    dJ_sol[s] = dJi
+                    
+                s = s + 1
+            
+            if i + 1 < self.n:
+                X = self._step( X , dXi , ti )
+                
+        # Run-major views : N x time-steps x dim
+        return TrajectoryBundle(
+            x  = x_sol.swapaxes( 0 , 1 ),
+            u  = u_sol.swapaxes( 0 , 1 ),
+            t  = t[idx],
+            dx = dx_sol.swapaxes( 0 , 1 ),
+            y  = y_sol.swapaxes( 0 , 1 ),
+            r  = None if r_sol is None else r_sol.swapaxes( 0 , 1 ),
+            J  = J,
+            dJ = None if dJ_sol is None else dJ_sol.T
+            )
@@ -84,6 +84,33 @@ class StaticController():
         
         return u
     
+    #############################
+    def c_batch( self , Y , R , t = 0 ):
+        """ 
+        Feedback static computation for a batch of signals
+        
+        INPUTS
+        Y  : sensor signals array          N x p
+        R  : reference signals array       N x k
+        t  : time                          1 x 1 ( or N x 1, one per row )
+        
+        OUTPUTS
+        U  : control inputs array          N x m
+        
+        Default is a loop over c, overload with a vectorized version for 
+        speed decorated with @system.vectorized('c'), such that child 
+        classes overloading c only get the loop again.
+        
+        """
+        
+        U = np.zeros(( Y.shape[0] , self.m ))
+        T = np.broadcast_to( t , Y.shape[0] )
+        
+        for i in range( Y.shape[0] ):
+            U[i,:] = self.c( Y[i,:] , R[i,:] , T[i] )
+        
+        return U
+    
     #########################################################################
     # Default methods that can be overloaded in child classes
     #########################################################################
@@ -235,7 +262,27 @@ class ClosedLoopSystem( system.ContinuousDynamicSystem ):
         
         """
         
-        dx = np.zeros(self.n) # State derivative vector
+        dx, u_plant = self.f_with_input( x, u, t)
+        
+        return dx
+    
+    
+    ###########################################################################
+    def f_with_input( self , x , u , t ):
+        """ 
+        Closed-loop dynamics and internal control inputs, from a single 
+        evaluation of the controller
+        
+        INPUTS
+        x  : state vector             n x 1
+        u  : reference vector         k x 1
+        t  : time                     1 x 1
+        
+        OUTPUTS
+        dx : state derivative vector  n x 1
+        u  : plant inputs vector      plant.m x 1
+        
+        """
         
         r = u # input of closed-loop global sys is ref of the controller
         
@@ -248,7 +295,7 @@ class ClosedLoopSystem( system.ContinuousDynamicSystem ):
         # Compute state derivatives
         dx = self.plant.f( x, u, t)
         
-        return dx
+        return dx, u
     
 
     ###########################################################################
@@ -275,6 +322,41 @@ class ClosedLoopSystem( system.ContinuousDynamicSystem ):
         return y
     
     
+    ###########################################################################
+    @system.vectorized('f')
+    def f_batch( self , X , U , t = 0 ):
+        """ 
+        Vectorized closed-loop dynamics for N states, loop over f for 
+        child classes that overload f only
+        
+        INPUTS
+        X  : states array             N x n
+        U  : references array         N x k
+        t  : time                     1 x 1
+        
+        OUTPUTS
+        dX : state derivatives array  N x n
+        
+        """
+        
+        R = U # input of closed-loop global sys is ref of the controller
+        
+        Y  = self.h_batch( X , U , t )
+        Uc = self.controller.c_batch( Y , R , t )
+        
+        return self.plant.f_batch( X , Uc , t )
+    
+    
+    ###########################################################################
+    @system.vectorized('h')
+    def h_batch( self , X , U , t = 0 ):
+        """ Vectorized output, using u = ubar to avoid algeabric loops """
+        
+        U_bar = np.tile( self.plant.ubar , ( X.shape[0] , 1 ) )
+        
+        return self.plant.h_batch( X , U_bar , t )
+    
+    
     ###########################################################################
     def t2u( self , t ):
         """ 
@@ -611,6 +693,28 @@ class DynamicClosedLoopSystem( ClosedLoopSystem ):
         
         """
         
+        dx, u_plant = self.f_with_input( x, u, t)
+        
+        return dx
+    
+    
+    ######################################
+    def f_with_input(self, x, u, t):
+        """ 
+        Closed-loop dynamics and internal control inputs, from a single 
+        evaluation of the controller
+        
+        INPUTS
+        x  : state vector             n x 1
+        u  : reference vector         k x 1
+        t  : time                     1 x 1
+        
+        OUTPUTS
+        dx : state derivative vector  n x 1
+        u  : plant inputs vector      plant.m x 1
+        
+        """
+        
         x, z = self._split_states( x )
 
         # Input to global system interpreted as reference signal
@@ -630,7 +734,7 @@ class DynamicClosedLoopSystem( ClosedLoopSystem ):
         dx = np.concatenate([ dx, dz], axis=0)
         assert dx.shape == (self.n,)
         
-        return dx
+        return dx, u
     
     
     ######################################
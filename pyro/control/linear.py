@@ -7,6 +7,7 @@ Created on Mon Oct 22 11:37:48 2018
 ###############################################################################
 import numpy as np
 ###############################################################################
+from pyro.dynamic import system
 from pyro.control import controller
 
 from pyro._utils import to_2D_arr
@@ -75,6 +76,14 @@ class ProportionnalSingleVariableController( controller.StaticController ) :
         u = self.gain * e
         
         return u
+    
+    
+    #############################
+    @system.vectorized('c')
+    def c_batch( self , Y , R , t = 0 ):
+        """ Vectorized feedback law for N signals : N x p --> N x m """
+        
+        return self.gain * ( R - Y )
 
 
 ###############################################################################
@@ -110,6 +119,13 @@ class ProportionalController(controller.StaticController):
         
         return self.K.dot(r - y)
 
+    ##############################
+    @system.vectorized('c')
+    def c_batch(self, Y, R, t=0):
+        """ Vectorized feedback law for N signals : N x p --> N x m """
+        
+        return (R - Y).dot(self.K.T)
+
 
 
 ###############################################################################
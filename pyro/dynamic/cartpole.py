@@ -158,6 +158,75 @@ class RotatingCartPole( mechanical.MechanicalSystem ):
         return d
     
         
+    ###########################################################################
+    # Vectorized dynamics terms for N configurations
+    ###########################################################################
+    
+    ###########################################################################
+    @system.vectorized('H')
+    def H_batch(self, Q ):
+        """ Stacked inertia matrix : N x dof x dof """
+        
+        [c1,s1,c2,s2] = self.trig( Q.T )
+        
+        H = np.zeros( ( Q.shape[0] , 2 , 2 ) )
+        
+        H[:,0,0] = self.m2 * self.l1 ** 2 + self.I1
+        H[:,1,0] = self.m2 * self.l1 * self.l2 * c2
+        H[:,0,1] = H[:,1,0]
+        H[:,1,1] = self.m2 * self.l2 ** 2 + self.I2
+        
+        return H
+    
+    
+    ###########################################################################
+    @system.vectorized('C')
+    def C_batch(self, Q , dQ ):
+        """ Stacked corriolis matrix : N x dof x dof """
+        
+        [c1,s1,c2,s2] = self.trig( Q.T )
+        
+        C = np.zeros( ( Q.shape[0] , 2 , 2 ) )
+        
+        C[:,0,1] = - self.m2 * self.l1 * self.l2 * s2 * dQ[:,1]
+        
+        return C
+    
+    
+    ###########################################################################
+    @system.vectorized('B')
+    def B_batch(self, Q ):
+        """ Stacked actuator matrix : N x dof x m """
+        
+        B = np.tile( np.diag( np.ones( self.dof ) ) , ( Q.shape[0] , 1 , 1 ) )
+        
+        return B
+    
+    
+    ###########################################################################
+    @system.vectorized('g')
+    def g_batch(self, Q ):
+        """ Stacked gravitationnal forces : N x dof """
+        
+        [c1,s1,c2,s2] = self.trig( Q.T )
+        
+        G = np.zeros( ( Q.shape[0] , 2 ) )
+        
+        G[:,1] = - self.m2 * self.gravity * self.l2 * s2
+        
+        return G
+    
+    
+    ###########################################################################
+    @system.vectorized('d')
+    def d_batch(self, Q , dQ ):
+        """ Stacked dissipative forces : N x dof """
+        
+        d = dQ * np.array([ self.d1 , self.d2 ])
+        
+        return d
+    
+        
     ###########################################################################
     # Graphical output
     ###########################################################################
@@ -296,6 +365,18 @@ class UnderActuatedRotatingCartPole( RotatingCartPole ):
         B[1] = 0
         
         return B
+    
+    
+    ###########################################################################
+    @system.vectorized('B')
+    def B_batch(self, Q ):
+        """ Stacked actuator matrix : N x dof x m """
+        
+        B = np.zeros( ( Q.shape[0] , 2 , 1 ) )
+        
+        B[:,0,0] = 1
+        
+        return B
         
         
         
@@ -69,6 +69,18 @@ class SimpleIntegrator( system.ContinuousDynamicSystem ):
         dx[0] = u
         
         return dx
+    
+    
+    #############################
+    @system.vectorized('f')
+    def f_batch(self, X , U , t = 0 ):
+        """ Vectorized foward dynamics: dX = U """
+        
+        dX = np.zeros( X.shape ) # State derivatives array
+        
+        dX[:,0] = U[:,0]
+        
+        return dX
 
 
 #############################################################################
@@ -131,6 +143,19 @@ class DoubleIntegrator( system.ContinuousDynamicSystem ):
         return dx
     
     
+    #############################
+    @system.vectorized('f')
+    def f_batch(self, X , U , t = 0 ):
+        """ Vectorized foward dynamics """
+        
+        dX = np.zeros( X.shape ) # State derivatives array
+        
+        dX[:,0] = X[:,1]
+        dX[:,1] = U[:,0]
+        
+        return dX
+    
+    
     #############################
     def h( self , x , u , t ):
         """ 
@@ -216,6 +241,20 @@ class TripleIntegrator( system.ContinuousDynamicSystem ):
         return dx
     
     
+    #############################
+    @system.vectorized('f')
+    def f_batch(self, X , U , t = 0 ):
+        """ Vectorized foward dynamics """
+        
+        dX = np.zeros( X.shape ) # State derivatives array
+        
+        dX[:,0] = X[:,1]
+        dX[:,1] = X[:,2]
+        dX[:,2] = U[:,0]
+        
+        return dX
+    
+    
     #############################
     def h( self , x , u , t ):
         """ 
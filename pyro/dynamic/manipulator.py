@@ -10,6 +10,7 @@ import numpy as np
 ###############################################################################
 from pyro.dynamic import system
 from pyro.dynamic import mechanical
+from pyro.dynamic import obstaclemap
 ###############################################################################
 
 
@@ -102,6 +103,16 @@ class Manipulator( mechanical.MechanicalSystem ):
         
         return r
     
+    ##############################
+    def forward_kinematic_effector_batch(self, Q ):
+        """
+        Stacked end-effector positions for N configurations : N x e
+        """
+        
+        r = np.array([ self.forward_kinematic_effector( q ) for q in Q ])
+        
+        return r.reshape( -1 , self.e )
+    
     ##############################
     def J(self, q ):
         """
@@ -127,6 +138,28 @@ class Manipulator( mechanical.MechanicalSystem ):
         
         return f_ext
     
+    ##############################
+    def J_batch(self, Q ):
+        """
+        Stacked jacobians for N configurations : N x e x dof
+        """
+        
+        J = np.array([ self.J( q ) for q in Q ]).reshape( -1 , self.e , self.dof )
+        
+        return J
+    
+    ##############################
+    def f_ext_batch(self, Q , dQ , t = 0 ):
+        """ 
+        Stacked external forces for N states : N x e
+        """
+        
+        T     = np.broadcast_to( t , Q.shape[0] )
+        f_ext = np.array([ self.f_ext( q , dq , ti ) 
+                           for q , dq , ti in zip( Q , dQ , T ) ])
+        
+        return f_ext.reshape( -1 , self.e )
+    
     ###########################################################################
     # No need to overwrite the following functions for custom system
     ###########################################################################
@@ -206,6 +239,41 @@ class Manipulator( mechanical.MechanicalSystem ):
                                               - g 
                                               - d ) )
         return ddq
+    
+    
+    ##############################
+    @system.vectorized('ddq')
+    def ddq_batch(self, Q , dQ , U , t = 0 ):
+        """ 
+        Computed accelerations for N configurations (foward dynamic)
+        --------------------------------------------------------------
+        Q , dQ : N x dof
+        U      : N x m
+        ddQ    : N x dof
+        
+        """  
+        
+        H = self.H_batch( Q )
+        C = self.C_batch( Q , dQ )
+        g = self.g_batch( Q )
+        d = self.d_batch( Q , dQ )
+        B = self.B_batch( Q )
+        
+        f_ext = self.f_ext_batch( Q , dQ , t )
+        J     = self.J_batch( Q )
+        
+        forces = ( + np.einsum( 'nij,nj->ni' , B , U     )
+                   + np.einsum( 'nji,nj->ni' , J , f_ext )
+                   - np.einsum( 'nij,nj->ni' , C , dQ    )
+                   - g 
+                   - d )
+        
+        if self.dof == 1:
+            ddQ = forces / H[:,:,0]
+        else:
+            ddQ = np.linalg.solve( H , forces[:,:,None] )[:,:,0]
+        
+        return ddQ
         
 
 
@@ -678,6 +746,38 @@ class TwoLinkManipulator( Manipulator ):
         return r
     
     
+    ##############################
+    @system.vectorized('forward_kinematic_effector')
+    def forward_kinematic_effector_batch(self, Q ):
+        """ Stacked end-effector positions : N x e """
+        
+        [c1,s1,c2,s2,c12,s12] = self.trig( Q.T )
+        
+        x = self.l1 * s1 + self.l2 * s12 # x
+        y = self.l1 * c1 + self.l2 * c12 # y
+        
+        return np.column_stack([x,y])
+    
+    
+    ##############################
+    def forward_kinematic_joints_batch(self, Q ):
+        """ 
+        Stacked positions of the base, elbow and effector : N x 3 x 2
+        ( the robot line of forward_kinematic_lines )
+        """
+        
+        [c1,s1,c2,s2,c12,s12] = self.trig( Q.T )
+        
+        pts = np.zeros( ( Q.shape[0] , 3 , 2 ) )
+        
+        pts[:,1,0] = self.l1 * s1
+        pts[:,1,1] = self.l1 * c1
+        pts[:,2,0] = self.l1 * s1 + self.l2 * s12
+        pts[:,2,1] = self.l1 * c1 + self.l2 * c12
+        
+        return pts
+    
+    
     ##############################
     def J(self, q ):
         """ """
@@ -802,6 +902,112 @@ class TwoLinkManipulator( Manipulator ):
         return d
     
         
+    ###########################################################################
+    # Vectorized dynamics terms for N configurations
+    ###########################################################################
+    
+    ##############################
+    @system.vectorized('J')
+    def J_batch(self, Q ):
+        """ Stacked jacobians : N x e x dof """
+        
+        [c1,s1,c2,s2,c12,s12] = self.trig( Q.T )
+        
+        J = np.zeros( ( Q.shape[0] , self.e , self.dof ) )
+        
+        J[:,0,0] = + self.l1 * c1 + self.l2 * c12
+        J[:,0,1] =                  self.l2 * c12
+        J[:,1,0] = - self.l1 * s1 - self.l2 * s12
+        J[:,1,1] =                - self.l2 * s12
+        
+        return J
+    
+    
+    ##############################
+    @system.vectorized('f_ext')
+    def f_ext_batch(self, Q , dQ , t = 0 ):
+        """ Stacked external forces : N x e """
+        
+        f_ext = np.zeros( ( Q.shape[0] , self.e ) )
+        
+        return f_ext
+    
+    
+    ###########################################################################
+    @system.vectorized('H')
+    def H_batch(self, Q ):
+        """ Stacked inertia matrix : N x dof x dof """
+        
+        [c1,s1,c2,s2,c12,s12] = self.trig( Q.T )
+        
+        H = np.zeros( ( Q.shape[0] , 2 , 2 ) )
+        
+        H[:,0,0] = ( self.m1 * self.lc1**2 + self.I1 + self.m2 * ( self.l1**2 
+                   + self.lc2**2 + 2 * self.l1 * self.lc2 * c2 ) + self.I2 )
+        H[:,1,0] = ( self.m2 * self.lc2**2 + self.m2 * self.l1 * self.lc2 * c2 
+                     + self.I2 )
+        H[:,0,1] = H[:,1,0]
+        H[:,1,1] = self.m2 * self.lc2 ** 2 + self.I2
+        
+        return H
+    
+    
+    ###########################################################################
+    @system.vectorized('C')
+    def C_batch(self, Q , dQ ):
+        """ Stacked corriolis matrix : N x dof x dof """
+        
+        [c1,s1,c2,s2,c12,s12] = self.trig( Q.T )
+        
+        h = self.m2 * self.l1 * self.lc2 * s2
+        
+        C = np.zeros( ( Q.shape[0] , 2 , 2 ) )
+        
+        C[:,0,0] = - h * dQ[:,1]
+        C[:,1,0] =   h * dQ[:,0]
+        C[:,0,1] = - h * ( dQ[:,0] + dQ[:,1] )
+        
+        return C
+    
+    
+    ###########################################################################
+    @system.vectorized('B')
+    def B_batch(self, Q ):
+        """ Stacked actuator matrix : N x dof x m """
+        
+        B = np.tile( np.diag( np.ones( self.dof ) ) , ( Q.shape[0] , 1 , 1 ) )
+        
+        return B
+    
+    
+    ###########################################################################
+    @system.vectorized('g')
+    def g_batch(self, Q ):
+        """ Stacked gravitationnal forces : N x dof """
+        
+        [c1,s1,c2,s2,c12,s12] = self.trig( Q.T )
+        
+        g1 = (self.m1 * self.lc1 + self.m2 * self.l1 ) * self.gravity
+        g2 = self.m2 * self.lc2 * self.gravity
+        
+        G = np.zeros( ( Q.shape[0] , 2 ) )
+        
+        G[:,0] = - g1 * s1 - g2 * s12
+        G[:,1] = - g2 * s12
+        
+        return G
+    
+    
+    ###########################################################################
+    @system.vectorized('d')
+    def d_batch(self, Q , dQ ):
+        """ Stacked dissipative forces : N x dof """
+        
+        d = dQ * np.array([ self.d1 , self.d2 ])
+        
+        return d
+    
+        
     ###########################################################################
     # Graphical output
     ###########################################################################
@@ -1189,6 +1395,171 @@ class ThreeLinkManipulator3D( Manipulator ):
         return d
     
         
+    ###########################################################################
+    # Vectorized dynamics terms for N configurations
+    ###########################################################################
+    
+    ##############################
+    @system.vectorized('J')
+    def J_batch(self, Q ):
+        """ Stacked jacobians : N x e x dof """
+        
+        [c1,s1,c2,s2,c3,s3,c12,s12,c23,s23] = self.trig( Q.T )
+        
+        J = np.zeros( ( Q.shape[0] , 3 , 3 ) )
+        
+        J[:,0,0] =  -( self.l2 * c2 + self.l3 * c23 ) * s1
+        J[:,0,1] =  -( self.l2 * s2 + self.l3 * s23 ) * c1
+        J[:,0,2] =  - self.l3 * s23 * c1
+        J[:,1,0] =   ( self.l2 * c2 + self.l3 * c23 ) * c1
+        J[:,1,1] =  -( self.l2 * s2 + self.l3 * s23 ) * s1
+        J[:,1,2] =  - self.l3 * s23 * s1
+        J[:,2,1] =  -( self.l2 * c2 + self.l3 * c23 )
+        J[:,2,2] =  - self.l3 * c23
+        
+        return J
+    
+    
+    ##############################
+    @system.vectorized('f_ext')
+    def f_ext_batch(self, Q , dQ , t = 0 ):
+        """ Stacked external forces : N x e """
+        
+        f_ext = np.zeros( ( Q.shape[0] , self.e ) )
+        
+        return f_ext
+    
+    
+    ###########################################################################
+    @system.vectorized('H')
+    def H_batch(self, Q ):
+        """ Stacked inertia matrix : N x dof x dof """
+        
+        [c1,s1,c2,s2,c3,s3,c12,s12,c23,s23] = self.trig( Q.T )
+        
+        # variable to match the book notation
+        
+        m2 = self.m2
+        m3 = self.m3
+        
+        Iz1 = self.I1z
+        Ix2 = self.I2x
+        Iy2 = self.I2y
+        Iz2 = self.I2z
+        Ix3 = self.I3x
+        Iy3 = self.I3y
+        Iz3 = self.I3z
+        
+        l1 = self.l2
+        r1 = self.lc2
+        r2 = self.lc3
+        
+        H = np.zeros( ( Q.shape[0] , 3 , 3 ) )
+        
+        H[:,0,0] = (Iy2 * s2 **2 + Iy3 * s23 **2 + Iz1 
+                   + Iz2 * c2 **2 + Iz3 * c23 **2 + m2 * ( r1 * c2 ) **2 
+                   + m3 * ( l1 * c2 + r2 * c23 ) **2 )
+        H[:,1,1] = (Ix2 + Ix3 + m3 * l1 **2 + m2 * r1 **2 
+                   + m3 * r2 **2 + 2 * m3 *l1 * r2 * c3)
+        H[:,1,2] = Ix3 + m3 * r2 **2 + m3 * l1 * r2 * c3
+        H[:,2,1] = H[:,1,2]
+        H[:,2,2] = Ix3 + m3 * r2 ** 2
+        
+        return H
+    
+    
+    ###########################################################################
+    @system.vectorized('C')
+    def C_batch(self, Q , dQ ):
+        """ Stacked corriolis matrix : N x dof x dof """
+        
+        [c1,s1,c2,s2,c3,s3,c12,s12,c23,s23] = self.trig( Q.T )
+        
+        # variable to match the book notation
+        
+        m2 = self.m2
+        m3 = self.m3
+        
+        Iy2 = self.I2y
+        Iz2 = self.I2z
+        Iy3 = self.I3y
+        Iz3 = self.I3z
+        
+        l1 = self.l2
+        r1 = self.lc2
+        r2 = self.lc3
+        
+        T112 = (( Iy2 - Iz2 - m2 * r1 **2 ) * c2 * s2 
+                 + ( Iy3 - Iz3 ) * c23 * s23
+                 - m3 * ( l1 * c2 + r2 * c23 ) * ( l1 * s2 + r2 * s23 ) )
+        T113 = (( Iy3 - Iz3 ) * c23 * s23 
+               - m3 * r2 * s23 * ( l1 * c2 + r2 * c23 ))
+        T121 = T112
+        T131 = T113
+        T211 = (( Iz2 - Iy2 + m2 * r1 **2 ) * c2 * s2 
+               + ( Iz3 - Iy3 ) * c23 * s23 + m3 * 
+                ( l1 * c2 + r2 * c23 ) * ( l1 * s2 + r2 * s23 ))
+        T223 = - l1 * m3 * r2 * s3
+        T232 = T223
+        T233 = T223
+        T311 = (( Iz3 - Iy3 ) * c23 * s23 
+                + m3 * r2 * s23 * ( l1 * c2 + r2 * c23 ))
+        T322 = l1 * m3 * r2 * s3
+        
+        C = np.zeros( ( Q.shape[0] , 3 , 3 ) )
+        
+        C[:,0,0] = T112 * dQ[:,1] + T113 * dQ[:,2]
+        C[:,0,1] = T121 * dQ[:,0]
+        C[:,0,2] = T131 * dQ[:,0]
+        
+        C[:,1,0] = T211 * dQ[:,0]
+        C[:,1,1] = T223 * dQ[:,2]
+        C[:,1,2] = T232 * dQ[:,1] + T233 * dQ[:,2]
+        
+        C[:,2,0] = T311 * dQ[:,0]
+        C[:,2,1] = T322 * dQ[:,1]
+        
+        return C
+    
+    
+    ###########################################################################
+    @system.vectorized('B')
+    def B_batch(self, Q ):
+        """ Stacked actuator matrix : N x dof x m """
+        
+        B = np.tile( np.diag( np.ones( self.dof ) ) , ( Q.shape[0] , 1 , 1 ) )
+        
+        return B
+    
+    
+    ###########################################################################
+    @system.vectorized('g')
+    def g_batch(self, Q ):
+        """ Stacked gravitationnal forces : N x dof """
+        
+        [c1,s1,c2,s2,c3,s3,c12,s12,c23,s23] = self.trig( Q.T )
+        
+        G = np.zeros( ( Q.shape[0] , 3 ) )
+        
+        g = self.gravity
+        
+        G[:,1] = (-(self.m2 * g * self.lc2 + self.m3 * g * self.l2 ) * c2 
+                  - self.m3 * g * self.lc3 * c23 )
+        G[:,2] = - self.m3 * g * self.lc3 * c23
+        
+        return G
+    
+    
+    ###########################################################################
+    @system.vectorized('d')
+    def d_batch(self, Q , dQ ):
+        """ Stacked dissipative forces : N x dof """
+        
+        d = dQ * np.array([ self.d1 , self.d2 , self.d3 ])
+        
+        return d
+    
+        
     ###########################################################################
     # Graphical output
     ###########################################################################
@@ -1365,6 +1736,37 @@ class FiveLinkPlanarManipulator( Manipulator ):
         return r
     
     
+    ##############################
+    @system.vectorized('forward_kinematic_effector')
+    def forward_kinematic_effector_batch(self, Q ):
+        """ Stacked end-effector positions : N x e """
+        
+        # Absolute angles of the links
+        q_abs = np.cumsum( Q[:,:5] , axis = 1 )
+        
+        x = np.sin( q_abs ) @ self.l
+        y = np.cos( q_abs ) @ self.l
+        
+        return np.column_stack([x,y])
+    
+    
+    ##############################
+    def forward_kinematic_joints_batch(self, Q ):
+        """ 
+        Stacked positions of the base, joints and effector : N x 6 x 2
+        ( the robot line of forward_kinematic_lines )
+        """
+        
+        q_abs = np.cumsum( Q[:,:5] , axis = 1 )
+        
+        pts = np.zeros( ( Q.shape[0] , 6 , 2 ) )
+        
+        pts[:,1:,0] = np.cumsum( self.l * np.sin( q_abs ) , axis = 1 )
+        pts[:,1:,1] = np.cumsum( self.l * np.cos( q_abs ) , axis = 1 )
+        
+        return pts
+    
+    
     ##############################
     def J(self, q ):
         """ """
@@ -1457,9 +1859,11 @@ class FiveLinkPlanarManipulator( Manipulator ):
 # Two Planar Link Manipulator with obstacles
 ###############################################################################
         
-class TwoLinkManipulatorwithObstacles( TwoLinkManipulator ):
+class TwoLinkManipulatorwithObstacles( obstaclemap.ObstacleMapMixin ,
+                                       TwoLinkManipulator ):
     """
-    Maniplator with non-allowable states based on end-effector position only
+    Maniplator with non-allowable states based on end-effector position only,
+    or on all the link segments when an obstacle map is built
     """
     
     ############################
@@ -1479,33 +1883,27 @@ class TwoLinkManipulatorwithObstacles( TwoLinkManipulator ):
                 [ (0.5, 0.5),(2, 3)],
                 [ (-2, 0),(-0.2, 3)]
                 ]
+
+        # Signed distance field of the obstacles, see build_obstacle_map
+        self.obstacle_map = None
+        self.obstacle_resolution = 0.02
         
         
     #############################
-    def isavalidstate(self , x ):
-        """ check if x is in the state domain """
-        ans = False
-        for i in range( x.size ):
-            ans = ans or ( x[i] < self.x_lb[i] )
-            ans = ans or ( x[i] > self.x_ub[i] )
-        
-        # effector position
-        q = self.xut2q( x, self.ubar, 0)
-        r = self.forward_kinematic_effector( q )
+    def obstacle_points_batch(self, X ):
+        """ Base, joints and effector positions for all rows of X """
+
+        return self.forward_kinematic_joints_batch( X[:,:self.dof] )
+
+    #############################
+    def obstacle_bounds(self):
+        """ Workspace box of the robot reach """
+
+        reach = self.l1 + self.l2
+
+        return np.array([ - reach , - reach ]) , np.array([ + reach , + reach ])
+
 
-        buffer = 0.0
-        
-        for obs in self.obstacles:
-            on_obs = (( r[0] + buffer > obs[0][0]) and  
-                      ( r[1] + buffer > obs[0][1]) and 
-                      ( r[0] - buffer < obs[1][0]) and 
-                      ( r[1] - buffer < obs[1][1]) )
-                     
-            ans = ans or on_obs
-            
-        return not(ans)
-    
-        
     ###########################################################################
     def forward_kinematic_domain(self, q ):
         """ 
@@ -1567,9 +1965,11 @@ class TwoLinkManipulatorwithObstacles( TwoLinkManipulator ):
 # Five Planar Link Manipulator with obstacles
 ###############################################################################
         
-class FiveLinkPlanarManipulatorwithObstacles( FiveLinkPlanarManipulator ):
+class FiveLinkPlanarManipulatorwithObstacles( obstaclemap.ObstacleMapMixin ,
+                                              FiveLinkPlanarManipulator ):
     """
-    Maniplator with non-allowable states based on end-effector position only
+    Maniplator with non-allowable states based on end-effector position only,
+    or on all the link segments when an obstacle map is built
     """
     
     ############################
@@ -1586,33 +1986,27 @@ class FiveLinkPlanarManipulatorwithObstacles( FiveLinkPlanarManipulator ):
                 [ (0.5, 0.5),(2, 3)],
                 [ (-2, 0),(-0.2, 3)]
                 ]
+
+        # Signed distance field of the obstacles, see build_obstacle_map
+        self.obstacle_map = None
+        self.obstacle_resolution = 0.02
         
         
     #############################
-    def isavalidstate(self , x ):
-        """ check if x is in the state domain """
-        ans = False
-        for i in range( x.size ):
-            ans = ans or ( x[i] < self.x_lb[i] )
-            ans = ans or ( x[i] > self.x_ub[i] )
-        
-        # effector position
-        q = self.xut2q( x, self.ubar, 0)
-        r = self.forward_kinematic_effector( q )
+    def obstacle_points_batch(self, X ):
+        """ Base, joints and effector positions for all rows of X """
+
+        return self.forward_kinematic_joints_batch( X[:,:self.dof] )
+
+    #############################
+    def obstacle_bounds(self):
+        """ Workspace box of the robot reach """
+
+        reach = self.l.sum()
+
+        return np.array([ - reach , - reach ]) , np.array([ + reach , + reach ])
+
 
-        buffer = 0.0
-        
-        for obs in self.obstacles:
-            on_obs = (( r[0] + buffer > obs[0][0]) and  
-                      ( r[1] + buffer > obs[0][1]) and 
-                      ( r[0] - buffer < obs[1][0]) and 
-                      ( r[1] - buffer < obs[1][1]) )
-                     
-            ans = ans or on_obs
-            
-        return not(ans)
-        
-       
     ###########################################################################
     def forward_kinematic_lines(self, q ):
         """ 
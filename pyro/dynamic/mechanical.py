@@ -143,6 +143,76 @@ class MechanicalSystem( system.ContinuousDynamicSystem ):
         return d
     
     
+    ###########################################################################
+    # Vectorized versions of the functions above for N configurations at once
+    # (Q and dQ are N x dof). The default implementations loop over the 
+    # single configuration functions, child classes can overload them with 
+    # a vectorized implementation for faster batch evaluation, decorated 
+    # with @system.vectorized so that it is not used below a class that 
+    # overloads the single configuration function
+    ###########################################################################
+    
+    ###########################################################################
+    def H_batch(self, Q ):
+        """ 
+        Stacked inertia matrix 
+        ----------------------------------
+        dim( H ) = ( N , dof , dof )
+        
+        """  
+        
+        H = np.array([ self.H( q ) for q in Q ]).reshape( -1 , self.dof , self.dof )
+        
+        return H
+    
+    
+    ###########################################################################
+    def C_batch(self, Q , dQ ):
+        """ 
+        Stacked corriolis and centrifugal matrix 
+        ----------------------------------
+        dim( C ) = ( N , dof , dof )
+        
+        """  
+        
+        C = np.array([ self.C( q , dq ) for q , dq in zip( Q , dQ ) ])
+        
+        return C.reshape( -1 , self.dof , self.dof )
+    
+    
+    ###########################################################################
+    def B_batch(self, Q ):
+        """ 
+        Stacked actuator matrix : N x dof x m
+        """
+        
+        B = np.array([ self.B( q ) for q in Q ]).reshape( -1 , self.dof , self.m )
+        
+        return B
+    
+    
+    ###########################################################################
+    def g_batch(self, Q ):
+        """ 
+        Stacked gravitationnal forces vector : N x dof
+        """
+        
+        g = np.array([ self.g( q ) for q in Q ]).reshape( -1 , self.dof )
+        
+        return g
+    
+    
+    ###########################################################################
+    def d_batch(self, Q , dQ ):
+        """ 
+        Stacked state-dependent dissipative forces : N x dof
+        """
+        
+        d = np.array([ self.d( q , dq ) for q , dq in zip( Q , dQ ) ])
+        
+        return d.reshape( -1 , self.dof )
+    
+    
     ###########################################################################
     # No need to overwrite the following functions for custom system
     ###########################################################################
@@ -251,6 +321,64 @@ class MechanicalSystem( system.ContinuousDynamicSystem ):
         return dx
     
     
+    ##############################
+    @system.vectorized('ddq')
+    def ddq_batch(self, Q , dQ , U , t = 0 ):
+        """ 
+        Computed accelerations for N configurations (foward dynamic)
+        --------------------------------------------------------------
+        Q , dQ : N x dof
+        U      : N x m
+        ddQ    : N x dof
+        
+        Batched linear solve of H ddq = B u - C dq - g - d
+        
+        """  
+        
+        H = self.H_batch( Q )
+        C = self.C_batch( Q , dQ )
+        g = self.g_batch( Q )
+        d = self.d_batch( Q , dQ )
+        B = self.B_batch( Q )
+        
+        forces = ( np.einsum( 'nij,nj->ni' , B , U  ) 
+                 - np.einsum( 'nij,nj->ni' , C , dQ ) - g - d )
+        
+        if self.dof == 1:
+            # Scalar inertia: a division is much faster than N 1x1 solves
+            ddQ = forces / H[:,:,0]
+        else:
+            ddQ = np.linalg.solve( H , forces[:,:,None] )[:,:,0]
+        
+        return ddQ
+    
+    
+    ###########################################################################
+    @system.vectorized('f')
+    def f_batch(self, X , U , t = 0 ):
+        """ 
+        Vectorized foward dynamics for N states
+        
+        INPUTS
+        X  : state vectors            N x n
+        U  : control inputs vectors   N x m
+        t  : time                     1 x 1
+        
+        OUPUTS
+        dX : state derivative vectors N x n
+        
+        """
+        
+        Q  = X[ : , 0        : self.dof ]
+        dQ = X[ : , self.dof : self.n   ]
+        
+        ddQ = self.ddq_batch( Q , dQ , U , t )
+        
+        dX = np.hstack( ( dQ , ddQ ) )
+        
+        return dX
+    
+    
     ###########################################################################
     def kinetic_energy(self, q  , dq ):
         """ Compute kinetic energy of manipulator """  
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Signed distance field of obstacles for fast collision checks
+
+"""
+
+import numpy as np
+
+from scipy.ndimage import distance_transform_edt
+
+from pyro.dynamic import system
+
+
+###############################################################################
+# Obstacle Map
+###############################################################################
+
+class ObstacleMap:
+    """
+    Occupancy grid and signed distance field of a 2D or 3D workspace
+    ------------------------------------------------------------------------
+    lb , ub    : workspace bounds                       d x 1
+    resolution : grid spacing
+
+    Obstacles are rasterized on the grid nodes, then compute() builds the
+    signed distance to the closest obstacle boundary ( positive in free
+    space ). Queries round points to the closest node: O(1) per point
+    whatever the number of obstacles, with an error of the order of the
+    resolution. Points outside the bounds get the value of the closest node
+    on the border.
+
+    """
+
+    ############################
+    def __init__(self, lb , ub , resolution = 0.05 ):
+
+        self.lb         = np.asarray( lb , dtype = float )
+        self.ub         = np.asarray( ub , dtype = float )
+        self.resolution = resolution
+
+        self.dim   = self.lb.size
+        self.shape = tuple( np.ceil( ( self.ub - self.lb ) / resolution
+                                     ).astype( int ) + 1 )
+
+        # Default clearance of isfree queries
+        self.margin = 0.0
+
+        self.occupancy = np.zeros( self.shape , dtype = bool )
+        self.sdf       = None
+
+    ############################
+    @classmethod
+    def from_boxes(cls, boxes , lb , ub , resolution = 0.05 , inflation = 0.0 ):
+        """
+        Map of axis-aligned boxes [ ( lo ) , ( hi ) ], each box grown by
+        inflation ( scalar or one value per axis ) on all sides
+
+        """
+
+        obstacle_map = cls( lb , ub , resolution )
+
+        for lo , hi in boxes:
+            obstacle_map.add_box( np.asarray( lo ) - inflation ,
+                                  np.asarray( hi ) + inflation )
+
+        obstacle_map.compute()
+
+        return obstacle_map
+
+    ############################
+    def nodes(self, axis ):
+        """ Coordinates of the grid nodes along axis """
+
+        return self.lb[ axis ] + np.arange( self.shape[ axis ] ) * self.resolution
+
+    ############################
+    def add_box(self, lo , hi ):
+        """ Mark the nodes strictly inside the box lo < x < hi as occupied """
+
+        inside = [ ( self.nodes( i ) > lo[i] ) & ( self.nodes( i ) < hi[i] )
+                   for i in range( self.dim ) ]
+
+        self.occupancy[ np.ix_( *inside ) ] = True
+
+        self.sdf = None
+
+    ############################
+    def compute(self):
+        """ Signed distance field of the occupancy grid """
+
+        if not self.occupancy.any():
+            self.sdf = np.full( self.shape , np.inf )
+            return self.sdf
+
+        # Distances between nodes, the boundary is half a cell away
+        d_out = distance_transform_edt( ~ self.occupancy ) * self.resolution
+        d_in  = distance_transform_edt(   self.occupancy ) * self.resolution
+
+        half = 0.5 * self.resolution
+
+        self.sdf = np.where( self.occupancy , half - d_in , d_out - half )
+
+        return self.sdf
+
+    ############################
+    def index(self, P ):
+        """ Closest grid node of points P : N x d --> tuple of d index arrays """
+
+        i = np.rint( ( P - self.lb ) / self.resolution ).astype( int )
+        i = np.clip( i , 0 , np.array( self.shape ) - 1 )
+
+        return tuple( i.T )
+
+    ############################
+    def distance(self, P ):
+        """
+        Signed distance to the obstacles, positive in free space
+
+        INPUTS
+        P : points    N x d  ( or a single point d )
+
+        OUTPUTS
+        d : distances N      ( or a float )
+
+        """
+
+        if self.sdf is None:
+            self.compute()
+
+        P = np.asarray( P , dtype = float )
+
+        if P.ndim == 1:
+            return float( self.sdf[ self.index( P[None,:self.dim] ) ][0] )
+
+        return self.sdf[ self.index( P[:,:self.dim] ) ]
+
+    ############################
+    def isfree(self, P , margin = None ):
+        """ True for points farther than margin from all obstacles """
+
+        if margin is None:
+            margin = self.margin
+
+        return self.distance( P ) > margin
+
+    ############################
+    def segments_isfree(self, A , B , margin = None ):
+        """
+        True for segments from A to B farther than margin from all obstacles
+
+        INPUTS
+        A , B : end points of N segments     N x d
+
+        Each segment is sampled with a spacing of at most one resolution.
+
+        """
+
+        A = np.asarray( A , dtype = float )[:,:self.dim]
+        B = np.asarray( B , dtype = float )[:,:self.dim]
+
+        length = np.linalg.norm( B - A , axis = 1 ).max( initial = 0.0 )
+        n_pts  = int( np.ceil( length / self.resolution ) ) + 1
+
+        s = np.linspace( 0.0 , 1.0 , max( n_pts , 2 ) )
+
+        # N x n_pts x d samples
+        P = A[:,None,:] + s[None,:,None] * ( B - A )[:,None,:]
+
+        free = self.isfree( P.reshape( -1 , self.dim ) , margin )
+
+        return free.reshape( A.shape[0] , -1 ).all( axis = 1 )
+
+
+###############################################################################
+def workspace_bounds( boxes , lb = None , ub = None , pad = 0.0 ):
+    """
+    Bounds covering the finite values of lb and ub and all the boxes
+    [ ( lo ) , ( hi ) ], grown by pad on all sides
+
+    """
+
+    boxes = np.asarray( boxes , dtype = float )
+
+    lo = boxes[:,0].min( axis = 0 )
+    hi = boxes[:,1].max( axis = 0 )
+
+    if lb is not None:
+        lb = np.asarray( lb , dtype = float )
+        lo = np.where( np.isfinite( lb ) , np.minimum( lb , lo ) , lo )
+
+    if ub is not None:
+        ub = np.asarray( ub , dtype = float )
+        hi = np.where( np.isfinite( ub ) , np.maximum( ub , hi ) , hi )
+
+    return lo - pad , hi + pad
+
+
+###############################################################################
+# Obstacle Map Mixin
+###############################################################################
+
+class ObstacleMapMixin:
+    """
+    Validity checks of a dynamic system with box obstacles
+    ------------------------------------------------------------------------
+    To put before the dynamic system class in the bases, the child class
+    sets in __init__:
+
+    obstacles            : list of boxes [ ( lo ) , ( hi ) ]
+    obstacle_map         : None, see build_obstacle_map
+    obstacle_resolution  : default grid spacing of build_obstacle_map
+
+    and defines obstacle_points_batch( X ) and obstacle_bounds(). States
+    are checked against the obstacle list on their last point, grown by
+    obstacle_inflation(), or against the map on all the points ( and the
+    segments between them ) once build_obstacle_map is called.
+
+    """
+
+    ############################
+    def obstacle_points_batch(self, X ):
+        """
+        Workspace points of the body for all rows of X : N x k x d
+        ( a chain of k points, the last one is checked with the list )
+
+        """
+
+        raise NotImplementedError
+
+    ############################
+    def obstacle_bounds(self):
+        """ Workspace box ( lb , ub ) reachable by the points """
+
+        raise NotImplementedError
+
+    ############################
+    def obstacle_inflation(self):
+        """ Half size of the body around the last point, per axis """
+
+        return 0.0
+
+    ############################
+    def obstacles_isfree_batch(self, X ):
+        """ True for the rows of X where the body is free of obstacles """
+
+        pts = self.obstacle_points_batch( X )
+
+        N , k , d = pts.shape
+
+        if self.obstacle_map is not None:
+
+            if k == 1:
+                return self.obstacle_map.isfree( pts[:,0] )
+
+            free = self.obstacle_map.segments_isfree(
+                pts[:,:-1].reshape( -1 , d ) , pts[:,1:].reshape( -1 , d ) )
+
+            return free.reshape( N , k - 1 ).all( axis = 1 )
+
+        # N x obstacles x d overlap tests of the last point
+        obs  = np.array( self.obstacles , dtype = float )
+        half = self.obstacle_inflation()
+        p    = pts[:,None,-1]
+
+        on_obs = ( ( p + half > obs[:,0] ) & ( p - half < obs[:,1] ) ).all( axis = 2 )
+
+        return ~ on_obs.any( axis = 1 )
+
+    ############################
+    def isavalidstate(self , x ):
+        """ check if x is in the state domain """
+
+        x = np.asarray( x )
+
+        return ( super().isavalidstate( x ) and
+                 bool( self.obstacles_isfree_batch( x[None,:] )[0] ) )
+
+    ############################
+    @system.vectorized('isavalidstate')
+    def isavalidstate_batch(self , X ):
+        """ check if all rows of X are in the state domain """
+
+        X = np.asarray( X )
+
+        return super().isavalidstate_batch( X ) & self.obstacles_isfree_batch( X )
+
+    ############################
+    def build_obstacle_map(self, resolution = None , margin = 0.0 ):
+        """
+        Rasterize the obstacles in a signed distance field used by the
+        validity checks instead of the obstacle list, states closer than
+        margin to an obstacle are not valid. Call again after changing
+        the obstacles, or set obstacle_map to None to use the list.
+
+        """
+
+        if resolution is None:
+            resolution = self.obstacle_resolution
+
+        inflation = self.obstacle_inflation()
+
+        lb , ub = self.obstacle_bounds()
+
+        lb , ub = workspace_bounds( self.obstacles , lb , ub ,
+                                    margin + np.max( inflation ) + resolution )
+
+        self.obstacle_map = ObstacleMap.from_boxes(
+            self.obstacles , lb , ub , resolution , inflation )
+
+        self.obstacle_map.margin = margin
+
+        return self.obstacle_map
@@ -7,6 +7,7 @@ Created on Wed Oct 24 13:07:39 2018
 ###############################################################################
 import numpy as np
 ###############################################################################
+from pyro.dynamic import system
 from pyro.dynamic import mechanical
 ###############################################################################
 
@@ -147,6 +148,68 @@ class SinglePendulum( mechanical.MechanicalSystem ):
         return d
     
         
+    ###########################################################################
+    # Vectorized dynamics terms for N configurations
+    ###########################################################################
+    
+    ###########################################################################
+    @system.vectorized('H')
+    def H_batch(self, Q ):
+        """ Stacked inertia matrix : N x dof x dof """
+        
+        H = np.zeros( ( Q.shape[0] , self.dof , self.dof ) )
+        
+        H[:,0,0] = self.m1 * self.lc1**2 + self.I1
+        
+        return H
+    
+    
+    ###########################################################################
+    @system.vectorized('C')
+    def C_batch(self, Q , dQ ):
+        """ Stacked corriolis matrix : N x dof x dof """
+        
+        C = np.zeros( ( Q.shape[0] , self.dof , self.dof ) )
+        
+        return C
+    
+    
+    ###########################################################################
+    @system.vectorized('B')
+    def B_batch(self, Q ):
+        """ Stacked actuator matrix : N x dof x m """
+        
+        B = np.tile( np.diag( np.ones( self.dof ) ) , ( Q.shape[0] , 1 , 1 ) )
+        
+        return B
+    
+    
+    ###########################################################################
+    @system.vectorized('g')
+    def g_batch(self, Q ):
+        """ Stacked gravitationnal forces : N x dof """
+        
+        g = np.zeros( ( Q.shape[0] , self.dof ) )
+        
+        [c1,s1] = self.trig( Q[:,0] )
+        
+        g[:,0] = self.m1 * self.gravity * self.lc1 * s1
+        
+        return g
+    
+    
+    ###########################################################################
+    @system.vectorized('d')
+    def d_batch(self, Q , dQ ):
+        """ Stacked dissipative forces : N x dof """
+        
+        d = np.zeros( ( Q.shape[0] , self.dof ) )
+        
+        d[:,0] = self.d1 * dQ[:,0]
+        
+        return d
+    
+        
     ###########################################################################
     # Graphical output
     ###########################################################################
@@ -353,6 +416,85 @@ class DoublePendulum( mechanical.MechanicalSystem ):
         return d
     
         
+    ###########################################################################
+    # Vectorized dynamics terms for N configurations
+    ###########################################################################
+    
+    ###########################################################################
+    @system.vectorized('H')
+    def H_batch(self, Q ):
+        """ Stacked inertia matrix : N x dof x dof """
+        
+        [c1,s1,c2,s2,c12,s12] = self.trig( Q.T )
+        
+        H = np.zeros( ( Q.shape[0] , 2 , 2 ) )
+        
+        H[:,0,0] = ( self.m1 * self.lc1**2 + self.I1 + self.m2 * ( self.l1**2 
+                   + self.lc2**2 + 2 * self.l1 * self.lc2 * c2 ) + self.I2 )
+        H[:,1,0] = ( self.m2 * self.lc2**2 + self.m2 * self.l1 * self.lc2 * c2 
+                     + self.I2 )
+        H[:,0,1] = H[:,1,0]
+        H[:,1,1] = self.m2 * self.lc2 ** 2 + self.I2
+        
+        return H
+    
+    
+    ###########################################################################
+    @system.vectorized('C')
+    def C_batch(self, Q , dQ ):
+        """ Stacked corriolis matrix : N x dof x dof """
+        
+        [c1,s1,c2,s2,c12,s12] = self.trig( Q.T )
+        
+        h = self.m2 * self.l1 * self.lc2 * s2
+        
+        C = np.zeros( ( Q.shape[0] , 2 , 2 ) )
+        
+        C[:,0,0] = - h * dQ[:,1]
+        C[:,1,0] =   h * dQ[:,0]
+        C[:,0,1] = - h * ( dQ[:,0] + dQ[:,1] )
+        
+        return C
+    
+    
+    ###########################################################################
+    @system.vectorized('B')
+    def B_batch(self, Q ):
+        """ Stacked actuator matrix : N x dof x m """
+        
+        B = np.tile( np.diag( np.ones( self.dof ) ) , ( Q.shape[0] , 1 , 1 ) )
+        
+        return B
+    
+    
+    ###########################################################################
+    @system.vectorized('g')
+    def g_batch(self, Q ):
+        """ Stacked gravitationnal forces : N x dof """
+        
+        [c1,s1,c2,s2,c12,s12] = self.trig( Q.T )
+        
+        g1 = (self.m1 * self.lc1 + self.m2 * self.l1 ) * self.gravity
+        g2 = self.m2 * self.lc2 * self.gravity
+        
+        G = np.zeros( ( Q.shape[0] , 2 ) )
+        
+        G[:,0] = - g1 * s1 - g2 * s12
+        G[:,1] = - g2 * s12
+        
+        return G
+    
+    
+    ###########################################################################
+    @system.vectorized('d')
+    def d_batch(self, Q , dQ ):
+        """ Stacked dissipative forces : N x dof """
+        
+        d = dQ * np.array([ self.d1 , self.d2 ])
+        
+        return d
+    
+        
     ###########################################################################
     # Graphical output
     ###########################################################################
@@ -533,6 +675,68 @@ class TwoIndependentSinglePendulum( mechanical.MechanicalSystem ):
         return d
     
         
+    ###########################################################################
+    # Vectorized dynamics terms for N configurations
+    ###########################################################################
+    
+    ###########################################################################
+    @system.vectorized('H')
+    def H_batch(self, Q ):
+        """ Stacked inertia matrix : N x dof x dof """
+        
+        H = np.zeros( ( Q.shape[0] , self.dof , self.dof ) )
+        
+        H[:,0,0] = self.m1 * self.lc1**2 + self.I1
+        H[:,1,1] = self.m1 * self.lc1**2 + self.I1
+        
+        return H
+    
+    
+    ###########################################################################
+    @system.vectorized('C')
+    def C_batch(self, Q , dQ ):
+        """ Stacked corriolis matrix : N x dof x dof """
+        
+        C = np.zeros( ( Q.shape[0] , self.dof , self.dof ) )
+        
+        return C
+    
+    
+    ###########################################################################
+    @system.vectorized('B')
+    def B_batch(self, Q ):
+        """ Stacked actuator matrix : N x dof x m """
+        
+        B = np.tile( np.diag( np.ones( self.dof ) ) , ( Q.shape[0] , 1 , 1 ) )
+        
+        return B
+    
+    
+    ###########################################################################
+    @system.vectorized('g')
+    def g_batch(self, Q ):
+        """ Stacked gravitationnal forces : N x dof """
+        
+        [c1,s1,c2,s2] = self.trig( Q.T )
+        
+        g = np.zeros( ( Q.shape[0] , self.dof ) )
+        
+        g[:,0] = self.m1 * self.gravity * self.lc1 * s1
+        g[:,1] = self.m1 * self.gravity * self.lc1 * s2
+        
+        return g
+    
+    
+    ###########################################################################
+    @system.vectorized('d')
+    def d_batch(self, Q , dQ ):
+        """ Stacked dissipative forces : N x dof """
+        
+        d = self.d1 * dQ
+        
+        return d
+    
+        
     ###########################################################################
     # Graphical output
     ###########################################################################
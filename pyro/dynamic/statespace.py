@@ -1,5 +1,6 @@
 import numpy as np
 
+from pyro.dynamic import system
 from pyro.dynamic import ContinuousDynamicSystem
 
 
@@ -57,6 +58,14 @@ class StateSpaceSystem(ContinuousDynamicSystem):
 
         return dx
     
+    #############################################
+    @system.vectorized('f')
+    def f_batch(self, X, U, t = 0):
+
+        dX = np.dot(X, self.A.T) + np.dot(U, self.B.T)
+
+        return dX
+    
     #############################################
     def h(self, x, u, t):
         
@@ -7,6 +7,9 @@ Created on Fri Aug 07 11:51:55 2015
 
 import numpy as np
 
+# Batch helpers, kept in pyro._utils for the modules imported by this one
+from pyro._utils import overloads, batch_loop, vectorized
+
 from pyro.analysis import simulation
 from pyro.analysis import phaseanalysis
 from pyro.analysis import graphical
@@ -130,6 +133,33 @@ class ContinuousDynamicSystem:
     # The following functions can be overloaded when necessary by child classes
     ###########################################################################
     
+    #############################
+    def f_batch( self , X , U , t = 0 ):
+        """ 
+        Continuous time foward dynamics evaluation for a batch of states
+        
+        INPUTS
+        X  : states array             N x n
+        U  : control inputs array     N x m
+        t  : time                     1 x 1 ( or N x 1, one per row )
+        
+        OUPUTS
+        dX : state derivatives array  N x n
+        
+        Default is a loop over f, overload with a vectorized version for 
+        speed decorated with @vectorized('f'), such that child classes 
+        overloading f only get the loop again.
+        
+        """
+        
+        dX = np.zeros(( X.shape[0] , self.n )) # State derivatives array
+        T  = np.broadcast_to( t , X.shape[0] )
+        
+        for i in range( X.shape[0] ):
+            dX[i,:] = self.f( X[i,:] , U[i,:] , T[i] )
+        
+        return dX
+    
     #############################
     def h( self , x , u , t ):
         """ 
@@ -151,6 +181,27 @@ class ContinuousDynamicSystem:
         
         return y
     
+    #############################
+    @vectorized('h')
+    def h_batch( self , X , U , t = 0 ):
+        """ 
+        Output fonction evaluated for a batch of states
+        
+        INPUTS
+        X  : states array             N x n
+        U  : control inputs array     N x m
+        t  : time                     1 x 1 ( or N x 1, one per row )
+        
+        OUTPUTS
+        Y  : outputs array            N x p
+        
+        Default is all states, or a loop over h if a child class overloads 
+        h without overloading h_batch.
+        
+        """
+        
+        return np.array( X , dtype = float )
+    
     #############################
     def t2u( self , t ):
         """ 
@@ -194,9 +245,64 @@ class ContinuousDynamicSystem:
         for i in range(self.m):
             ans = ans or ( u[i] < self.u_lb[i] )
             ans = ans or ( u[i] > self.u_ub[i] )
-            
+
         return not(ans)
-    
+
+    #############################
+    @vectorized('isavalidstate')
+    def isavalidstate_batch(self , X ):
+        """
+        Check if all rows of X are in the state domain
+
+        INPUTS
+        X  : states array             N x n
+
+        OUTPUTS
+        ok : boolean array            N
+
+        Default checks the bounds with broadcasting, or loops over
+        isavalidstate if a child class overloads it without overloading
+        isavalidstate_batch.
+
+        """
+
+        X = np.asarray( X )[:,:self.n]
+
+        out = ( X < self.x_lb[:self.n] ) | ( X > self.x_ub[:self.n] )
+
+        return ~ out.any( axis = 1 )
+
+    #############################
+    @vectorized('isavalidinput')
+    def isavalidinput_batch(self , X , U ):
+        """
+        Check if all rows of U are in the control inputs domain given X
+
+        INPUTS
+        X  : states array             N x n
+        U  : control inputs array     N x m
+
+        OUTPUTS
+        ok : boolean array            N
+
+        """
+
+        U = np.asarray( U )[:,:self.m]
+
+        out = ( U < self.u_lb[:self.m] ) | ( U > self.u_ub[:self.m] )
+
+        return ~ out.any( axis = 1 )
+
+    #############################
+    def overloads(self, name , batch_name ):
+        """
+        True if method name is redefined below the class that defines
+        batch_name, such that the batch version would not match it
+
+        """
+
+        return overloads( self , name , batch_name )
+
     
     ###########################################################################
     # Place holder graphical output, overload with specific graph output
@@ -10,6 +10,7 @@ Created on Tue Oct 23 20:45:37 2018
 import numpy as np
 ##############################################################################
 from pyro.dynamic import system
+from pyro.dynamic import obstaclemap
 ###############################################################################
 
 
@@ -86,6 +87,20 @@ class KinematicBicyleModel( system.ContinuousDynamicSystem ):
         return dx
     
     
+    #############################
+    @system.vectorized('f')
+    def f_batch(self, X , U , t = 0 ):
+        """ Vectorized foward dynamics for N states: X is N x n """
+        
+        dX = np.zeros( X.shape ) # State derivatives array
+
+        dX[:,0] = U[:,0] * np.cos( X[:,2] )
+        dX[:,1] = U[:,0] * np.sin( X[:,2] )
+        dX[:,2] = U[:,0] * np.tan( U[:,1] ) * ( 1. / self.lenght) 
+        
+        return dX
+    
+    
     ###########################################################################
     # For graphical output
     ###########################################################################
@@ -251,6 +266,19 @@ class HolonomicMobileRobot( system.ContinuousDynamicSystem ):
         return dx
     
     
+    #############################
+    @system.vectorized('f')
+    def f_batch(self, X , U , t = 0 ):
+        """ Vectorized foward dynamics for N states: X is N x n """
+        
+        dX = np.zeros( X.shape ) # State derivatives array
+
+        dX[:,0] = U[:,0]
+        dX[:,1] = U[:,1]
+        
+        return dX
+    
+    
     ###########################################################################
     # For graphical output
     ###########################################################################
@@ -319,7 +347,8 @@ class HolonomicMobileRobot( system.ContinuousDynamicSystem ):
 #
 ##############################################################################
 
-class HolonomicMobileRobotwithObstacles( HolonomicMobileRobot ):
+class HolonomicMobileRobotwithObstacles( obstaclemap.ObstacleMapMixin ,
+                                         HolonomicMobileRobot ):
     """
     Holonomic 2D point robot with obstacles with allowable domain
     -------------------------------------------------------------
@@ -347,25 +376,21 @@ class HolonomicMobileRobotwithObstacles( HolonomicMobileRobot ):
                 [ (-8,-8),(-1,8)]
                 ]
 
-    #############################
-    def isavalidstate(self , x ):
-        """ check if x is in the state domain """
-
-        ans = False
+        # Signed distance field of the obstacles, see build_obstacle_map
+        self.obstacle_map = None
+        self.obstacle_resolution = 0.05
 
-        for i in range(self.n):
-            ans = ans or ( x[i] < self.x_lb[i] )
-            ans = ans or ( x[i] > self.x_ub[i] )
+    #############################
+    def obstacle_points_batch(self, X ):
+        """ Position of the robot for all rows of X : N x 1 x 2 """
 
-        for obs in self.obstacles:
-            on_obs = (( x[0] > obs[0][0]) and
-                      ( x[1] > obs[0][1]) and
-                      ( x[0] < obs[1][0]) and
-                      ( x[1] < obs[1][1]) )
+        return X[:,None,:2]
 
-            ans = ans or on_obs
+    #############################
+    def obstacle_bounds(self):
+        """ Workspace box of the position """
 
-        return not(ans)
+        return self.x_lb[:2] , self.x_ub[:2]
 
 
     ###########################################################################
@@ -495,6 +520,19 @@ class Holonomic3DMobileRobot(system.ContinuousDynamicSystem):
 
         return dx
 
+    #############################
+    @system.vectorized('f')
+    def f_batch(self, X, U, t=0):
+        """ Vectorized foward dynamics for N states: X is N x n """
+
+        dX = np.zeros(X.shape)  # State derivatives array
+
+        dX[:, 0] = U[:, 0]
+        dX[:, 1] = U[:, 1]
+        dX[:, 2] = U[:, 2]
+
+        return dX
+
     ###########################################################################
     # For graphical output
     ###########################################################################
@@ -562,7 +600,8 @@ class Holonomic3DMobileRobot(system.ContinuousDynamicSystem):
 #
 ##############################################################################
 
-class Holonomic3DMobileRobotwithObstacles(Holonomic3DMobileRobot):
+class Holonomic3DMobileRobotwithObstacles( obstaclemap.ObstacleMapMixin ,
+                                           Holonomic3DMobileRobot ):
     """
     Holonomic 3D point-robot with non-allowable states
     -----------------------------------
@@ -590,27 +629,21 @@ class Holonomic3DMobileRobotwithObstacles(Holonomic3DMobileRobot):
                 [ (-8,-8,-1),(-1,8,1)]
                 ]
 
-    #############################
-    def isavalidstate(self , x ):
-        """ check if x is in the state domain """
-
-        ans = False
+        # Signed distance field of the obstacles, see build_obstacle_map
+        self.obstacle_map = None
+        self.obstacle_resolution = 0.1
 
-        for i in range(self.n):
-            ans = ans or ( x[i] < self.x_lb[i] )
-            ans = ans or ( x[i] > self.x_ub[i] )
+    #############################
+    def obstacle_points_batch(self, X ):
+        """ Position of the robot for all rows of X : N x 1 x 3 """
 
-        for obs in self.obstacles:
-            on_obs = (( x[0] > obs[0][0]) and
-                      ( x[1] > obs[0][1]) and
-                      ( x[2] > obs[0][2]) and
-                      ( x[0] < obs[1][0]) and
-                      ( x[1] < obs[1][1]) and
-                      ( x[2] < obs[1][2]) )
+        return X[:,None,:3]
 
-            ans = ans or on_obs
+    #############################
+    def obstacle_bounds(self):
+        """ Workspace box of the position """
 
-        return not(ans)
+        return self.x_lb[:3] , self.x_ub[:3]
 
 
     ###########################################################################
@@ -903,7 +936,8 @@ class KinematicCarModel( KinematicBicyleModel ):
 
     
 ##############################################################################       
-class KinematicCarModelwithObstacles( KinematicCarModel ):
+class KinematicCarModelwithObstacles( obstaclemap.ObstacleMapMixin ,
+                                      KinematicCarModel ):
     """ 
     Bicycle model of real sized car with non-allowable states
     ------------------------------------------------------------------------
@@ -932,26 +966,30 @@ class KinematicCarModelwithObstacles( KinematicCarModel ):
                 [ (-4, 2),(1, 4)],
                 [ (12, -1),(17, 1)]
                 ]
+
+        # Signed distance field of the obstacles, see build_obstacle_map
+        self.obstacle_map = None
+        self.obstacle_resolution = 0.05
         
     #############################
-    def isavalidstate(self , x ):
-        """ check if x is in the state domain """
-        ans = False
-        for i in range(self.n):
-            ans = ans or ( x[i] < self.x_lb[i] )
-            ans = ans or ( x[i] > self.x_ub[i] )
-        
-        for obs in self.obstacles:
-            on_obs = (( x[0] + self.lenght * 0.5 > obs[0][0]) and  
-                      ( x[1] + self.width * 0.5  > obs[0][1]) and 
-                      ( x[0] - self.lenght * 0.5 < obs[1][0]) and 
-                      ( x[1] - self.width * 0.5 < obs[1][1]) )
-                     
-            ans = ans or on_obs
-            
-        return not(ans)
-        
-       
+    def obstacle_points_batch(self, X ):
+        """ Position of the robot for all rows of X : N x 1 x 2 """
+
+        return X[:,None,:2]
+
+    #############################
+    def obstacle_bounds(self):
+        """ Workspace box of the position """
+
+        return self.x_lb[:2] , self.x_ub[:2]
+
+    #############################
+    def obstacle_inflation(self):
+        """ Half size of the car bounding box """
+
+        return np.array([ self.lenght * 0.5 , self.width * 0.5 ])
+
+
     ###########################################################################
     def forward_kinematic_lines(self, q ):
         """ 
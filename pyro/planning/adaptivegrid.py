@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive resolution discretization and value iteration
+
+"""
+
+import copy
+import hashlib
+import itertools
+
+import numpy as np
+from scipy import sparse
+
+from pyro.planning import discretizer
+from pyro.planning import valueiteration
+
+
+##############################################################################
+# Adaptive grid
+##############################################################################
+
+class AdaptiveGridDynamicSystem(discretizer.GridDynamicSystem):
+    """
+    Discrete state-action space on a tree of cells ( quadtree, octree, ... )
+    -------------------------------------------------------------------------
+    xgriddim    : nodes of the initial uniform grid, one root cell per interval
+    max_depth   : max number of splits of a root cell
+    adaptive_dt : time step of a node proportional to the size of the
+                  smallest leaf around it, dt being the one of root cells
+
+    Nodes are the corners of the leaf cells, J( x ) is the multilinear
+    interpolation of the corners of the leaf containing x. The nodes form a
+    1-D list, i.e. xgriddim = ( nodes_n , ), and nodes_index holds their
+    integer coordinates on the lattice of the finest resolution.
+
+    The sparse transition matrix P is always computed.
+
+    """
+
+    ############################
+    def __init__(self, sys, xgriddim=(11, 11), ugriddim=(11, 1), dt=0.05,
+                 max_depth=4, adaptive_dt=True, **kwargs):
+
+        self.sys = sys
+
+        self.adaptive_dt = adaptive_dt
+
+        self.root_griddim = tuple(xgriddim)
+        self.max_depth    = max_depth
+
+        # Lattice of the finest resolution
+        root_cells      = np.array(self.root_griddim[:sys.n]) - 1
+        self.lattice_n  = root_cells * 2 ** max_depth
+        self.lattice_dx = (sys.x_ub[:sys.n] - sys.x_lb[:sys.n]) / self.lattice_n
+
+        self.initialize_cells()
+
+        discretizer.GridDynamicSystem.__init__(self, sys, xgriddim, ugriddim,
+                                               dt, True, **kwargs)
+
+    ##############################
+    def initialize_cells(self):
+        """ One root cell per interval of the initial grid """
+
+        n          = self.sys.n
+        root_cells = tuple(np.array(self.root_griddim[:n]) - 1)
+
+        index = np.indices(root_cells).reshape(n, -1).T
+
+        # Cells of the tree, children of a cell are contiguous
+        self.cell_lo       = index * 2 ** self.max_depth  # lattice coordinates
+        self.cell_depth    = np.zeros(index.shape[0], dtype=int)
+        self.cell_children = np.full(index.shape[0], -1, dtype=int)
+
+    ##############################
+    def cell_size(self, cells):
+        """ Size of cells in lattice units """
+
+        return 2 ** (self.max_depth - self.cell_depth[cells])
+
+    ##############################
+    def leaves(self):
+        """ Index of the cells without children """
+
+        return np.flatnonzero(self.cell_children < 0)
+
+    ##############################
+    def discretizespace(self):
+        """ Nodes at the corners of the leaf cells """
+
+        n      = self.sys.n
+        leaves = self.leaves()
+
+        lo   = self.cell_lo[leaves]
+        size = self.cell_size(leaves)
+
+        corners = np.array(list(itertools.product((0, 1), repeat=n)))
+
+        # Lattice coordinates of the 2^n corners of all leaves
+        coords = lo[:, None, :] + corners[None, :, :] * size[:, None, None]
+        keys   = np.ravel_multi_index(coords.reshape(-1, n).T,
+                                      tuple(self.lattice_n + 1))
+
+        keys, inverse = np.unique(keys, return_inverse=True)
+
+        self.nodes_n  = keys.size
+        self.xgriddim = (self.nodes_n,)
+
+        self.nodes_index = np.stack(np.unravel_index(keys,
+                                                     tuple(self.lattice_n + 1)),
+                                    axis=1)
+        self.nodes_state = (self.sys.x_lb[:n]
+                            + self.nodes_index * self.lattice_dx)
+
+        self.x_grid2node = np.arange(self.nodes_n)
+
+        # Corner nodes of each leaf, and leaf # of each cell
+        self.leaf_nodes = inverse.reshape(leaves.size, 2 ** n)
+        self.cell_leaf  = np.full(self.cell_lo.shape[0], -1, dtype=int)
+        self.cell_leaf[leaves] = np.arange(leaves.size)
+
+        # Size of the smallest leaf around each node, in root cell units
+        nodes_size = np.full(self.nodes_n, 2 ** self.max_depth)
+        np.minimum.at(nodes_size, self.leaf_nodes.ravel(),
+                      np.repeat(size, 2 ** n))
+
+        self.nodes_scale = nodes_size / 2 ** self.max_depth
+
+    ##############################
+    def generate_nodes(self):
+        """ Nodes are generated with the cells in discretizespace """
+
+        pass
+
+    ##############################
+    def grid_hash(self):
+        """ Hash of the system parameters, grids, dt and cells of the tree """
+
+        h = hashlib.sha1(discretizer.GridDynamicSystem.grid_hash(self).encode())
+
+        discretizer.hash_update(h, [self.max_depth, self.adaptive_dt,
+                                    self.cell_lo, self.cell_depth])
+
+        return h.hexdigest()
+
+    ##############################
+    def time_steps(self, start=0, stop=None):
+        """ Time step of the node-action pairs of nodes start to stop """
+
+        if not self.adaptive_dt:
+            return self.dt
+
+        dt = self.dt * self.nodes_scale[start:stop]
+
+        return np.repeat(dt, self.actions_n)[:, None]
+
+    ##############################
+    def locate(self, x):
+        """ Leaf cell containing each state of x : dim = ( N , n ) """
+
+        n = self.sys.n
+
+        s = (x[:, :n] - self.sys.x_lb[:n]) / self.lattice_dx
+        s = np.clip(s, 0, self.lattice_n)
+
+        # Root cell
+        root_cells = np.array(self.root_griddim[:n]) - 1
+        root = np.minimum(np.floor(s / 2 ** self.max_depth).astype(int),
+                          root_cells - 1)
+
+        cells = np.ravel_multi_index(root.T, tuple(root_cells))
+
+        # Descend the tree, child # is the C-order index of the half cells
+        for depth in range(self.max_depth):
+
+            split = np.flatnonzero(self.cell_children[cells] >= 0)
+
+            if split.size == 0:
+                break
+
+            c    = cells[split]
+            half = self.cell_size(c) // 2
+            bits = s[split] >= (self.cell_lo[c] + half[:, None])
+
+            child = bits.dot(2 ** np.arange(n - 1, -1, -1))
+
+            cells[split] = self.cell_children[c] + child
+
+        return cells
+
+    ##############################
+    def interpolation_weights(self, x):
+        """
+        Multilinear interpolation on the leaves
+        ----------------------------------------
+        nodes   : dim = ( N , 2^n ) corner nodes of the leaf containing x
+        weights : dim = ( N , 2^n )
+
+        """
+
+        n = self.sys.n
+
+        cells = self.locate(x)
+
+        s = (x[:, :n] - self.sys.x_lb[:n]) / self.lattice_dx
+        t = (s - self.cell_lo[cells]) / self.cell_size(cells)[:, None]
+        t = np.clip(t, 0, 1)
+
+        corners = np.array(list(itertools.product((0, 1), repeat=n)))
+
+        weights = np.prod(np.where(corners[None, :, :], t[:, None, :],
+                                   1 - t[:, None, :]), axis=2)
+
+        nodes = self.leaf_nodes[self.cell_leaf[cells]]
+
+        return nodes, weights
+
+    ##############################
+    def interpolate(self, values, x):
+        """ Interpolation of node values ( nodes_n , ... ) at states x """
+
+        nodes, weights = self.interpolation_weights(x)
+
+        values = np.asarray(values)
+        w      = weights.reshape(weights.shape + (1,) * (values.ndim - 1))
+
+        return np.sum(values[nodes] * w, axis=1)
+
+    ##############################
+    def compute_transition_matrix(self):
+        """
+        Sparse matrix of interpolation weights on the leaf cells
+        ---------------------------------------------------------
+        P : dim = ( nodes_n * actions_n , nodes_n ) in CSR format
+
+        """
+
+        pairs = self.nodes_n * self.actions_n
+
+        data = []
+        cols = []
+        rows = []
+
+        for start, stop in self.lookup_chunks():
+
+            isok   = self.action_isok[start:stop]
+            r      = np.flatnonzero(isok.ravel()) + start * self.actions_n
+            x_next = self.get_x_next(start, stop)[isok]
+
+            nodes, weights = self.interpolation_weights(x_next)
+
+            data.append(weights.ravel())
+            cols.append(nodes.ravel())
+            rows.append(np.repeat(r, nodes.shape[1]))
+
+        P = sparse.csr_matrix((np.concatenate(data),
+                               (np.concatenate(rows), np.concatenate(cols))),
+                              shape=(pairs, self.nodes_n))
+
+        P.eliminate_zeros()
+
+        self.P = P
+
+    ##############################
+    def refine_cells(self, J, policy, J_tol=None, margin=0):
+        """
+        Leaves to split
+        ----------------
+        cells where the corners do not share the same action ( or feasibility )
+        and, if J_tol is given, feasible cells where J varies by more than J_tol,
+        plus margin layers of leaves sharing a corner with them
+
+        """
+
+        leaves  = self.leaves()
+        corners = self.leaf_nodes
+
+        p = np.asarray(policy).ravel()[corners]
+
+        split = np.any(p != p[:, :1], axis=1)
+
+        if J_tol is not None:
+
+            j = np.asarray(J).ravel()[corners]
+
+            feasible = np.all(p >= 0, axis=1)
+            J_range  = j.max(axis=1) - j.min(axis=1)
+
+            split = split | (feasible & (J_range > J_tol))
+
+        for layer in range(margin):
+
+            nodes = np.zeros(self.nodes_n, dtype=bool)
+            nodes[corners[split]] = True
+
+            split = np.any(nodes[corners], axis=1)
+
+        split = split & (self.cell_depth[leaves] < self.max_depth)
+
+        return leaves[split]
+
+    ##############################
+    def split_cells(self, cells):
+        """ Add the 2^n children of each cell to the tree """
+
+        n = self.sys.n
+
+        cells = np.asarray(cells, dtype=int)
+
+        corners = np.array(list(itertools.product((0, 1), repeat=n)))
+
+        half = self.cell_size(cells) // 2
+
+        lo    = self.cell_lo[cells][:, None, :] + corners * half[:, None, None]
+        depth = np.repeat(self.cell_depth[cells] + 1, 2 ** n)
+
+        children = self.cell_children.copy()
+        children[cells] = (self.cell_lo.shape[0]
+                           + np.arange(cells.size) * 2 ** n)
+
+        self.cell_lo       = np.vstack((self.cell_lo, lo.reshape(-1, n)))
+        self.cell_depth    = np.concatenate((self.cell_depth, depth))
+        self.cell_children = np.concatenate((children,
+                                             np.full(depth.size, -1, dtype=int)))
+
+    ##############################
+    def refine(self, cells, values=None):
+        """
+        Split cells and recompute nodes, lookup table and transition matrix
+        --------------------------------------------------------------------
+        values : optional node values interpolated on the new nodes
+
+        """
+
+        old_grid = copy.copy(self)
+
+        self.split_cells(cells)
+
+        self.compute()
+
+        if values is None:
+            return None
+
+        return old_grid.interpolate(values, self.nodes_state)
+
+
+##############################################################################
+# Value Iteration on an adaptive grid
+##############################################################################
+
+class AdaptiveValueIteration(valueiteration.ValueIteration_ND):
+    """
+    Value iteration alternating with refinement of the grid cells
+    -------------------------------------------------------------------------
+    grid_sys : AdaptiveGridDynamicSystem
+
+    Cells are split where the policy switches between the corners, and where
+    the range of J over a feasible cell is above J_tol if given, plus margin
+    layers of cells around them.
+
+    """
+
+    ############################
+    def __init__(self, grid_sys, cost_function):
+
+        valueiteration.ValueIteration_ND.__init__(self, grid_sys, cost_function)
+
+        # Options
+        self.J_tol  = None  # refinement on the variation of J over cells
+        self.margin = 1     # layers of leaves refined around the others
+
+        # Log of the refinements, one history of compute_steps per level
+        self.histories = []
+
+    ##############################
+    def initialize(self):
+        """ initialize cost-to-go and policy """
+
+        nodes_n = self.grid_sys.nodes_n
+
+        self.J = np.asarray(self.cf.h_batch(self.grid_sys.nodes_state),
+                            dtype=float)
+        self.action_policy = np.zeros(nodes_n, dtype=int)
+
+        self.reset_grid()
+
+        self.Jnew  = self.J.copy()
+        self.Jplot = self.J.copy()
+
+        print('J shape:', self.J.shape)
+
+    ##############################
+    def reset_grid(self):
+        """ Forget the data computed for the last grid """
+
+        self.G = None
+        self.close_pool()
+
+        self.sweep_count = 0
+
+    ##############################
+    def refine(self):
+        """ Split cells and interpolate J on the new nodes, return # of cells """
+
+        cells = self.grid_sys.refine_cells(self.J, self.action_policy,
+                                           self.J_tol, self.margin)
+
+        if cells.size == 0:
+            return 0
+
+        J = self.grid_sys.refine(cells, self.J)
+
+        self.reset_grid()
+
+        self.J             = J
+        self.Jnew          = J.copy()
+        self.action_policy = np.zeros(self.grid_sys.nodes_n, dtype=int)
+
+        print('Refined', cells.size, 'cells, number of nodes:',
+              self.grid_sys.nodes_n)
+
+        return cells.size
+
+    ##############################
+    def compute(self, levels=3, l=200, threshold=1.0e-6, rtol=0.0):
+        """
+        Value iteration on the grid and on up to levels refinements of it
+        ------------------------------------------------------------------
+        l : maximum number of steps after the first one, for each grid
+
+        """
+
+        self.histories = []
+
+        for level in range(levels + 1):
+
+            self.histories.append(self.compute_steps(l, False, threshold,
+                                                     rtol=rtol))
+
+            if level == levels or self.refine() == 0:
+                break
+
+        return self.histories
+
+    ################################
+    def assign_interpol_controller(self):
+        """ controller from optimal actions """
+
+        policy = self.action_policy.ravel()
+
+        u = self.grid_sys.actions_input[np.maximum(policy, 0)]
+        u[policy == -1] = 0
+
+        self.u_policy_nodes = u
+
+        # Asign Controller
+        self.ctl.vi_law = self.vi_law
+
+    ################################
+    def vi_law(self, x, t=0):
+        """ controller from optimal actions """
+
+        x = np.clip(x, self.sys.x_lb, self.sys.x_ub)
+
+        return self.grid_sys.interpolate(self.u_policy_nodes, x[None, :])[0]
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Label-setting ( Dijkstra / fast marching like ) solver on the grid of a
+GridDynamicSystem
+
+"""
+
+import heapq
+
+import numpy as np
+
+from pyro.planning import valueiteration
+
+
+##############################################################################
+# Dijkstra Minimum Time
+##############################################################################
+
+class DijkstraMinimumTime(valueiteration.ValueIteration_ND):
+    """
+    Cost-to-go of minimum time ( or any non-negative stage cost ) problems
+    in one pass over the transition graph
+    -------------------------------------------------------------------------
+    Nodes are finalized once, in increasing order of cost-to-go, starting
+    from the target set ( nodes with a zero cost action ) and going
+    backwards along the sparse transition matrix P of grid_sys.
+
+    The cost of a node-action pair is computed from the finalized nodes of
+    its interpolation stencil:
+
+        Q = ( G + sum w_k J_k ) / sum w_k      k finalized
+
+    which is exact when the pair node itself is the only unknown of the
+    stencil. Interpolation stencils are not causal in general, so a pair
+    is used once a fraction causality of its weight ( pair node excluded )
+    is finalized. Pairs not ready yet are kept in a second heap by partial
+    estimate, when no pair is ready the best one is used to keep going.
+    Partial estimates are lower bounds: J is accurate when one time step
+    moves the state about one cell, and too low when dt is much smaller.
+
+    Each finalized node pushes at most one entry per pair of its stencil,
+    deadlocks included: cost is O( nnz(P) log nnz(P) ), instead of one
+    sweep of all node-action pairs per step of value iteration. Outputs J and
+    action_policy like ValueIteration_ND, compute_steps from this solution
+    converges to the value iteration fixed point.
+
+    """
+
+    ############################
+    def __init__(self, grid_sys, cost_function):
+
+        valueiteration.ValueIteration_ND.__init__(self, grid_sys, cost_function)
+
+        # Options
+        self.causality = 0.9  # finalized stencil weight needed to use a pair
+        self.verbose   = False # print the number of nodes and deadlocks
+
+        # Nodes in the order they were finalized
+        self.order = None
+
+        # Number of times no pair was ready
+        self.deadlocks = 0
+
+    ##############################
+    def initialize(self):
+        """ initialize cost-to-go, stage cost and transition matrix """
+
+        valueiteration.ValueIteration_ND.initialize(self)
+
+        if self.grid_sys.P is None:
+            self.grid_sys.compute_transition_matrix()
+
+        self.compute_stage_cost()
+
+    ##############################
+    def target_nodes(self):
+        """ Nodes with a valid action of zero stage cost """
+
+        isok = self.grid_sys.action_isok
+
+        return np.flatnonzero((isok & (self.G <= 0)).any(axis=1))
+
+    ##############################
+    def compute(self):
+        """ Finalize all reachable nodes, return the number of nodes solved """
+
+        if self.grid_sys.P is None or self.G is None:
+            self.initialize()
+
+        action_isok = self.grid_sys.action_isok
+
+        if np.any(self.G[action_isok] < 0):
+            raise ValueError("Label-setting needs non-negative stage costs")
+
+        INF       = float(self.cf.INF)
+        nodes_n   = self.grid_sys.nodes_n
+        actions_n = self.grid_sys.actions_n
+        pairs_n   = nodes_n * actions_n
+
+        G     = self.G.ravel()
+        P     = self.grid_sys.P.tocoo()
+        P_T   = self.grid_sys.P.tocsc()  # predecessor pairs of each node
+        owner = np.arange(pairs_n) // actions_n
+
+        # Weight needed before using a pair, its own node excluded
+        w_self = np.zeros(pairs_n)
+        loop   = owner[P.row] == P.col
+        w_self[P.row[loop]] = P.data[loop]
+
+        w_ready = self.causality * (1.0 - w_self) - 1.0e-9
+
+        # Finalized part of the stencil of each pair
+        w_sum = np.zeros(pairs_n)
+        J_sum = np.zeros(pairs_n)
+
+        J      = np.full(nodes_n, INF)
+        policy = np.full(nodes_n, -1, dtype=int)
+        done   = np.zeros(nodes_n, dtype=bool)
+
+        # Nodes without valid action are known to cost INF
+        dead = ~action_isok.any(axis=1)
+        done[dead] = True
+
+        w_dead = np.asarray(P_T[:, dead].sum(axis=1)).ravel()
+        w_sum += w_dead
+        J_sum += w_dead * INF
+
+        # Target set keeps its final cost, like the cycles of value iteration
+        target = self.target_nodes()
+
+        J[target]      = self.J.ravel()[target]
+        policy[target] = np.where(action_isok[target] & (self.G[target] <= 0),
+                                  self.G[target], np.inf).argmin(axis=1)
+
+        heap = [(J[node], node) for node in target]
+        heapq.heapify(heap)
+
+        # Pairs not ready yet: ( partial Q , pair , w_sum of this estimate )
+        partial = []
+
+        def push(rows):
+            """ Lower J of the nodes of pairs rows """
+
+            Q = (G[rows] + J_sum[rows]) / w_sum[rows]
+
+            for row, q in zip(rows, Q):
+                m = owner[row]
+                if q < J[m]:
+                    J[m]      = q
+                    policy[m] = row - m * actions_n
+                    heapq.heappush(heap, (q, m))
+
+        def push_partial(rows):
+            """ Partial estimates of the pairs rows, used on deadlocks """
+
+            Q = (G[rows] + J_sum[rows]) / w_sum[rows]
+
+            for row, q, w in zip(rows, Q, w_sum[rows]):
+                heapq.heappush(partial, (q, row, w))
+
+        push_partial(np.flatnonzero(w_sum > 0))
+
+        order = []
+
+        self.deadlocks = 0
+
+        while True:
+
+            if not heap:
+
+                # No pair ready: use the best current partial estimate,
+                # entries of finalized nodes or older estimates are skipped
+                while partial and not heap:
+
+                    q, row, w = heapq.heappop(partial)
+
+                    if w == w_sum[row] and not done[owner[row]]:
+                        push(np.array([row]))
+
+                if not heap:
+                    break
+
+                self.deadlocks += 1
+
+            J_node, node = heapq.heappop(heap)
+
+            if done[node] or J_node > J[node]:
+                continue
+
+            done[node] = True
+            order.append(node)
+
+            # Update the pairs with this node in their stencil
+            start, stop = P_T.indptr[node], P_T.indptr[node + 1]
+
+            rows = P_T.indices[start:stop]
+
+            w_sum[rows] += P_T.data[start:stop]
+            J_sum[rows] += P_T.data[start:stop] * J_node
+
+            pending = ~done[owner[rows]]
+            ready   = w_sum[rows] >= w_ready[rows]
+
+            push(rows[pending & ready])
+            push_partial(rows[pending & ~ready])
+
+        self.order = np.array(order, dtype=int)
+
+        if self.verbose:
+            print('Finalized nodes:', len(order), '/', nodes_n,
+                  ' Deadlocks:', self.deadlocks)
+
+        # Outputs like value iteration
+        policy[J > (INF - 1)] = -1
+
+        self.J             = J.reshape(self.grid_sys.xgriddim)
+        self.Jnew          = self.J.copy()
+        self.action_policy = policy.reshape(self.grid_sys.xgriddim)
+
+        return len(order)
@@ -5,18 +5,113 @@ Created on Wed Jul 12 10:02:12 2017
 @author: alxgr
 """
 
+import os
+import types
+import itertools
+import hashlib
+
 import numpy as np
+from scipy import sparse
+
+
+
+
+
+def hash_update( h , value , seen = None ):
+    """ Add a parameter value to the hashlib object h """
+    
+    # Objects already hashed, against reference cycles
+    if seen is None:
+        seen = set()
+    
+    if isinstance( value , np.ndarray ):
+        h.update( ( str( value.dtype ) + str( value.shape ) ).encode() )
+        h.update( np.ascontiguousarray( value ).tobytes() )
+        
+    elif isinstance( value , ( list , tuple ) ):
+        h.update( b'[' )
+        for v in value:
+            hash_update( h , v , seen )
+        h.update( b']' )
+        
+    elif isinstance( value , dict ):
+        for key in sorted( value , key = str ):
+            h.update( str( key ).encode() )
+            hash_update( h , value[ key ] , seen )
+        
+    elif isinstance( value , ( bool , int , float , complex , str , np.generic ) ) or value is None:
+        h.update( repr( value ).encode() )
+        
+    elif isinstance( value , ( types.FunctionType , types.MethodType , 
+                               types.BuiltinFunctionType , types.ModuleType , 
+                               type ) ):
+        # Methods and functions are ignored
+        pass
+        
+    elif id( value ) in seen:
+        h.update( b'<cycle>' )
+        
+    elif hasattr( value , '__dict__' ):
+        # Other objects ( obstacle maps, controllers, ... ) by their attributes
+        seen.add( id( value ) )
+        h.update( type( value ).__qualname__.encode() )
+        hash_update( h , vars( value ) , seen )
+        
+    elif not callable( value ):
+        h.update( type( value ).__qualname__.encode() )
+        
+        
+def save_array( filename , a ):
+    """ np.save to a temporary file renamed at the end, never partially written """
+    
+    with open( filename + '.tmp' , 'wb' ) as f:
+        np.save( f , a )
+        
+    os.replace( filename + '.tmp' , filename )
+    
+    
+def parameters_hash( obj , exclude = () ):
+    """ 
+    Hash of the class and of the attributes of an object
+    -----------------------------------------------------
+    numbers, strings and arrays ( also in lists and dicts ) are hashed by 
+    value, other objects by their type and attributes, recursively, and 
+    methods are ignored
+    
+    """
+    
+    h = hashlib.sha1()
+    
+    h.update( ( type( obj ).__module__ + '.' + type( obj ).__qualname__ ).encode() )
+    
+    seen = { id( obj ) }
+    
+    for key in sorted( vars( obj ) ):
+        
+        if key in exclude:
+            continue
+        
+        h.update( key.encode() )
+        hash_update( h , vars( obj )[ key ] , seen )
+        
+    return h.hexdigest()
+
+
 
-'''
-################################################################################
-'''
 
 
 class GridDynamicSystem:
     """ Create a discrete gird state-action space for a 2D continous dynamic system, one continuous input u """
     
+    # System attributes without effect on the dynamic, ignored by grid_hash
+    hash_excluded = ( 'x0' , 'traj' , 'cost_function' )
+    
     ############################
-    def __init__(self, sys , xgriddim = ( 101 , 101 ), ugriddim = ( 11 , 1 ) , dt = 0.05 ):
+    def __init__(self, sys , xgriddim = ( 101 , 101 ), ugriddim = ( 11 , 1 ) , dt = 0.05 ,
+                 transition_matrix = False , lookup_memory = None , 
+                 lookup_dtype = np.float64 , lookup_quantized = False , 
+                 lookup_file = None , cache_dir = None , integrator = 'euler' ,
+                 substeps = 1 ):
         
         self.sys = sys # Dynamic system class
         
@@ -25,12 +120,27 @@ class GridDynamicSystem:
         # Simple 1-DoF
         self.dt    = dt        # time discretization
         
+        # Transition model: 'euler', 'rk2' or 'rk4' with substeps per dt
+        self.integrator = integrator
+        self.substeps   = substeps
+        
         # Grid size
         self.xgriddim = xgriddim
         self.ugriddim = ugriddim
         
         # Options
-        self.uselookuptable = True
+        self.uselookuptable      = True
+        self.usetransitionmatrix = transition_matrix # sparse interpolation weights
+        
+        # Lookup table storage options
+        self.lookup_memory    = lookup_memory    # working memory budget [MB]
+        self.lookup_dtype     = lookup_dtype     # np.float64 or np.float32
+        self.lookup_quantized = lookup_quantized # uint16 coordinates in grid
+        self.lookup_file      = lookup_file      # np.memmap file of x_next
+        self.cache_dir        = cache_dir        # lookup tables saved by hash
+        
+        # Sparse transition matrix ( node-action pairs x nodes )
+        self.P = None
         
         self.compute()  
         
@@ -50,7 +160,17 @@ class GridDynamicSystem:
         self.generate_actions()
         
         if self.uselookuptable:
-            self.compute_lookuptable()
+            
+            if self.cache_dir is None:
+                
+                self.compute_lookuptable()
+                
+                if self.usetransitionmatrix:
+                    self.compute_transition_matrix()
+                    
+            else:
+                
+                self.load_cached_lookuptable()
             
         
     #############################
@@ -94,145 +214,410 @@ class GridDynamicSystem:
     def generate_nodes(self):
         """ Compute 1-D list of nodes """
         
-        # For all state nodes
-        node = 0
+        # Grid index of all nodes, last state axis varying the fastest
+        index = np.indices( self.xgriddim ).reshape( self.sys.n , -1 ).T
         
-        if self.sys.n == 2 :
-            
-            for i in range(self.xgriddim[0]):
-                for j in range(self.xgriddim[1]):
-                    
-                    # State
-                    x = np.array([ self.xd[0][i]  ,  self.xd[1][j] ])
-                    
-                    # State and grid index based on node #
-                    self.nodes_state[node,:] = x
-                    self.nodes_index[node,:] = np.array([i,j])
-                    
-                    # Node # based on index ij
-                    self.x_grid2node[i,j]    = node
-    
-                    # Increment node number
-                    node = node + 1
-                    
-                    
-        elif self.sys.n == 3:
+        # State and grid index based on node #
+        self.nodes_index[:,:] = index
+        
+        for i in range( self.sys.n ):
+            self.nodes_state[:,i] = self.xd[i][ index[:,i] ]
+        
+        # Node # based on grid index
+        self.x_grid2node[...] = np.arange( self.nodes_n ).reshape( self.xgriddim )
             
-            for i in range(self.xgriddim[0]):
-                for j in range(self.xgriddim[1]):
-                    for k in range(self.xgriddim[2]):
-                    
-                        # State
-                        x = np.array([ self.xd[0][i]  ,  self.xd[1][j]  , self.xd[2][k] ])
-                        
-                        # State and grid index based on node #
-                        self.nodes_state[node,:] = x
-                        self.nodes_index[node,:] = np.array([i,j,k])
-                        
-                        # Node # based on index ijk
-                        self.x_grid2node[i,j,k]    = node
+                
+    ##############################
+    def generate_actions(self):
+        """ Compute 1-D list of actions """
         
-                        # Increment node number
-                        node = node + 1
-                        
-                        
-                        
-        elif self.sys.n == 4:
+        # Grid index of all actions, last input axis varying the fastest
+        index = np.indices( self.ugriddim[ : self.sys.m ] ).reshape( self.sys.m , -1 ).T
+        
+        # Input and grid index based on action #
+        self.actions_index[:,:] = index
+        
+        for i in range( self.sys.m ):
+            self.actions_input[:,i] = self.ud[i][ index[:,i] ]
             
-            # NOT yet validated!!!
             
-            for i in range(self.xgriddim[0]):
-                for j in range(self.xgriddim[1]):
-                    for k in range(self.xgriddim[2]):
-                        for l in range(self.xgriddim[3]):
-                    
-                            # State
-                            x = np.array([ self.xd[0][i]  ,  self.xd[1][j]  , self.xd[2][k] , self.xd[3][l]])
-                            
-                            # State and grid index based on node #
-                            self.nodes_state[node,:] = x
-                            self.nodes_index[node,:] = np.array([i,j,k,l])
-                            
-                            # Node # based on index ijkl
-                            self.x_grid2node[i,j,k,l]    = node
+    ##############################
+    def lookup_chunk_size(self):
+        """ 
+        Number of nodes evaluated at once given the memory budget
+        ----------------------------------------------------------
+        Working arrays are X, U and x_next of all the actions of a node in 
+        float64, i.e. about actions_n * ( 2 n + m ) * 8 bytes per node
+        
+        """
+        
+        if self.lookup_memory is None:
+            return self.nodes_n
+        
+        node_bytes = self.actions_n * ( 2 * self.sys.n + self.sys.m ) * 8
+        
+        chunk = int( self.lookup_memory * 1e6 // node_bytes )
+        
+        return min( max( chunk , 1 ) , self.nodes_n )
+    
+    
+    ##############################
+    def lookup_chunks(self):
+        """ Iterate over ( start , stop ) node ranges of the lookup table """
+        
+        chunk = self.lookup_chunk_size()
+        
+        for start in range( 0 , self.nodes_n , chunk ):
             
-                            # Increment node number
-                            node = node + 1
-                    
-        else:
+            yield start , min( start + chunk , self.nodes_n )
             
-            raise NotImplementedError
             
-                
     ##############################
-    def generate_actions(self):
-        """ Compute 1-D list of actions """
+    def encode_states(self, x ):
+        """ 
+        Convert states to the lookup table storage type
+        ------------------------------------------------
+        quantized: 16 bits coordinate along each axis of the grid domain, 
+        states outside of the grid bounds are clipped
         
-        # For all state nodes
-        action = 0
+        """
         
-        # Single input
+        if not self.lookup_quantized:
+            return x.astype( self.lookup_dtype , copy = False )
         
-        if self.sys.m == 1 :
+        n    = self.sys.n
+        lb   = self.sys.x_lb[:n]
+        span = self.sys.x_ub[:n] - lb
+        span = np.where( span > 0 , span , 1.0 )
         
-            for k in range(self.ugriddim[0]):
-                    
-                u = np.array([ self.ud[0][k] ])
-                
-                # State and grid index based on node #
-                self.actions_input[action,:] = u
-                self.actions_index[action,:] = k
+        q = np.rint( ( x - lb ) / span * 65535 )
+        
+        return np.clip( q , 0 , 65535 ).astype( np.uint16 )
     
-                # Increment node number
-                action = action + 1
-                
-        elif self.sys.m == 2 :
+    
+    ##############################
+    def lookup_decoding(self):
+        """ Offset and scale such that x = offset + scale * stored value """
+        
+        n = self.sys.n
+        
+        if not self.lookup_quantized:
+            return np.zeros( n ) , np.ones( n )
+        
+        lb   = self.sys.x_lb[:n]
+        span = self.sys.x_ub[:n] - lb
+        span = np.where( span > 0 , span , 1.0 )
+        
+        return lb , span / 65535
+    
+    
+    ##############################
+    def decode_states(self, q ):
+        """ Convert lookup table values back to float64 states """
+        
+        if not self.lookup_quantized:
+            return np.asarray( q , dtype = np.float64 )
+        
+        offset , scale = self.lookup_decoding()
+        
+        return offset + q * scale
+    
+    
+    ##############################
+    def get_x_next(self, start = 0 , stop = None ):
+        """ 
+        Next states of nodes start to stop from the lookup table
+        ---------------------------------------------------------
+        x_next : dim = ( stop - start , actions_n , n ) in float64
+        
+        """
+        
+        if stop is None:
+            stop = self.nodes_n
             
-            for k in range(self.ugriddim[0]):
-                for l in range(self.ugriddim[1]):
-                    
-                    u = np.array([ self.ud[0][k] , self.ud[1][l] ])
-                    
-                    # State and grid index based on node #
-                    self.actions_input[action,:] = u
-                    self.actions_index[action,:] = np.array([k,l])
+        return self.decode_states( self.x_next[ start : stop ] )
+    
+    
+    ##############################
+    def get_x_next_nodes(self, nodes ):
+        """ Next states of a list of nodes : dim = ( len(nodes) , actions_n , n ) """
+        
+        return self.decode_states( self.x_next[ nodes ] )
+    
+    
+    ##############################
+    def grid_hash(self):
+        """ 
+        Hash of the system parameters, grids and time step
+        ---------------------------------------------------
+        x_next and action_isok only depend on the parameters hashed here
+        
+        """
+        
+        h = hashlib.sha1()
         
-                    # Increment node number
-                    action = action + 1
+        h.update( type( self ).__qualname__.encode() )
+        h.update( parameters_hash( self.sys , self.hash_excluded ).encode() )
         
+        hash_update( h , [ tuple( self.xgriddim ) , tuple( self.ugriddim ) , 
+                           float( self.dt ) , self.integrator , self.substeps ] )
+        
+        return h.hexdigest()
+    
+    
+    ##############################
+    def cache_name(self):
+        """ Path prefix of the cached tables of this grid in cache_dir """
+        
+        h = hashlib.sha1( self.grid_hash().encode() )
+        
+        # Storage options change the content of x_next
+        hash_update( h , [ np.dtype( self.lookup_dtype ).str , 
+                           bool( self.lookup_quantized ) ] )
+        
+        return os.path.join( self.cache_dir , 'lookup_' + h.hexdigest()[:20] )
+    
+    
+    ##############################
+    def load_cached_lookuptable(self):
+        """ 
+        Load x_next and action_isok from cache_dir, or compute and save them
+        ---------------------------------------------------------------------
+        x_next is memory-mapped from the .npy file ( read only ), the
+        transition matrix is also cached if used
+        
+        """
+        
+        name = self.cache_name()
+        
+        x_file = name + '_x_next.npy'
+        a_file = name + '_isok.npy'
+        p_file = name + '_P.npz'
+        
+        if os.path.exists( x_file ) and os.path.exists( a_file ):
+            
+            self.x_next      = np.load( x_file , mmap_mode = 'r' )
+            self.action_isok = np.load( a_file )
+            
+            print('Lookup table loaded from cache:', x_file )
+            
         else:
             
-            raise NotImplementedError
+            self.compute_lookuptable()
+            
+            os.makedirs( self.cache_dir , exist_ok = True )
             
+            save_array( x_file , self.x_next )
+            save_array( a_file , self.action_isok )
             
+            # Read only memory map of the saved table
+            self.x_next = np.load( x_file , mmap_mode = 'r' )
+            
+        if self.usetransitionmatrix:
+            
+            if os.path.exists( p_file ):
+                
+                self.load_transition_matrix( p_file )
+                
+            else:
+                
+                self.compute_transition_matrix()
+                
+                self.save_transition_matrix( p_file + '.tmp.npz' )
+                os.replace( p_file + '.tmp.npz' , p_file )
+                
+                
+    ##############################
+    def time_steps(self, start = 0 , stop = None ):
+        """ Time step of the node-action pairs of nodes start to stop """
+        
+        return self.dt
+    
+    
+    ##############################
+    def next_states(self, X , U , dt ):
+        """ 
+        Integration of the dynamic over dt for all rows of X and U
+        -----------------------------------------------------------
+        X  : dim = ( N , n )
+        U  : dim = ( N , m )
+        dt : float or dim = ( N , 1 )
+        
+        integrator 'euler', 'rk2' ( midpoint ) or 'rk4', applied substeps 
+        times with a time step of dt / substeps
+        
+        """
+        
+        if self.integrator not in ( 'euler' , 'rk2' , 'rk4' ):
+            raise ValueError("Unknown integrator: %s" % self.integrator )
+        
+        f = self.sys.f_batch
+        h = dt / self.substeps
+        
+        for step in range( self.substeps ):
+            
+            if self.integrator == 'euler':
+                
+                X = X + f( X , U ) * h
+                
+            elif self.integrator == 'rk2':
+                
+                k1 = f( X , U )
+                k2 = f( X + 0.5 * h * k1 , U )
+                
+                X = X + k2 * h
+                
+            else:
+                
+                k1 = f( X , U )
+                k2 = f( X + 0.5 * h * k1 , U )
+                k3 = f( X + 0.5 * h * k2 , U )
+                k4 = f( X + h * k3 , U )
+                
+                X = X + ( k1 + 2 * k2 + 2 * k3 + k4 ) * h / 6
+                
+        return X
+    
+    
     ##############################
     def compute_lookuptable(self):
-        """ Compute lookup table for faster evaluation """
+        """ 
+        Compute lookup table for faster evaluation
+        -------------------------------------------
+        x_next is computed by chunks of nodes to bound the working memory and
+        stored as lookup_dtype ( or uint16 if quantized ), in a np.memmap on 
+        disk if a lookup_file is given
+        
+        """
 
         if self.uselookuptable:
+            
+            shape = ( self.nodes_n , self.actions_n , self.sys.n )
+            
+            if self.lookup_quantized:
+                dtype = np.uint16
+            else:
+                dtype = self.lookup_dtype
+            
             # Evaluation lookup tables      
             self.action_isok   = np.zeros( ( self.nodes_n , self.actions_n ) , dtype = bool )
-            self.x_next        = np.zeros( ( self.nodes_n , self.actions_n , self.sys.n ) , dtype = float ) # lookup table for dynamic
             
-            # For all state nodes        
-            for node in range( self.nodes_n ):  
+            if self.lookup_file is None:
+                self.x_next = np.zeros( shape , dtype = dtype ) # lookup table for dynamic
+            else:
+                self.x_next = np.memmap( self.lookup_file , dtype = dtype , 
+                                         mode = 'w+' , shape = shape )
                 
-                    x = self.nodes_state[ node , : ]
+            print('Lookup table size: %.1f MB' % ( self.x_next.nbytes / 1e6 ) )
+            
+            for start, stop in self.lookup_chunks():
                 
-                    # For all control actions
-                    for action in range( self.actions_n ):
-                        
-                        u = self.actions_input[ action , : ]
-                        
-                        # Compute next state for all inputs
-                        x_next = self.sys.f( x , u ) * self.dt + x
+                nodes = stop - start
+                
+                # All (node,action) pairs of the chunk, row = node * actions_n + action
+                X = np.repeat( self.nodes_state[ start : stop ] , self.actions_n , axis = 0 )
+                U = np.tile(   self.actions_input , ( nodes , 1 ) )
+                
+                # Compute next state for all pairs in one vectorized evaluation
+                X_next = self.next_states( X , U , self.time_steps( start , stop ) )
+                
+                self.x_next[ start : stop ] = self.encode_states( 
+                    X_next.reshape( nodes , self.actions_n , self.sys.n ) )
+                
+                # validity of the options
+                x_ok = self.sys.isavalidstate_batch( X_next )
+                u_ok = self.sys.isavalidinput_batch( X , U )
+                
+                isok = u_ok & x_ok
+                    
+                self.action_isok[ start : stop ] = isok.reshape( nodes , self.actions_n )
+                
+            if self.lookup_file is not None:
+                self.x_next.flush()
                         
-                        # validity of the options
-                        x_ok = self.sys.isavalidstate(x_next)
-                        u_ok = self.sys.isavalidinput(x,u)
                         
-                        self.x_next[ node,  action, : ] = x_next
-                        self.action_isok[ node, action]        = ( u_ok & x_ok )
+    ##############################
+    def compute_transition_matrix(self):
+        """ 
+        Compute sparse matrix of multilinear interpolation weights
+        -----------------------------------------------------------
+        P : dim = ( nodes_n * actions_n , nodes_n ) in CSR format
+        
+        row node * actions_n + action hold the weights of the grid nodes 
+        surrounding x_next[ node , action ], rows of invalid actions are empty
+        such that J( x_next ) = P * J.ravel()
+        
+        """
+        
+        n     = self.sys.n
+        pairs = self.nodes_n * self.actions_n
+        dims  = np.array( self.xgriddim )
+        
+        # Continuous grid coordinates of next states
+        step   = np.ones( n )
+        for i in range( n ):
+            if dims[i] > 1:
+                step[i] = ( self.xd[i][-1] - self.xd[i][0] ) / ( dims[i] - 1 )
+        
+        data = []
+        cols = []
+        rows = []
+        
+        for start, stop in self.lookup_chunks():
+            
+            # Only valid node-action pairs
+            isok   = self.action_isok[ start : stop ]
+            r      = np.flatnonzero( isok.ravel() ) + start * self.actions_n
+            x_next = self.get_x_next( start , stop )[ isok ]
+            
+            s  = ( x_next - self.sys.x_lb[:n] ) / step
+            s  = np.clip( s , 0 , dims - 1 )
+            i0 = np.minimum( np.floor( s ).astype( int ) , np.maximum( dims - 2 , 0 ) )
+            t  = s - i0
+            
+            # Weights of the 2^n corners of the cell
+            for corner in itertools.product( ( 0 , 1 ) , repeat = n ):
+                
+                corner = np.array( corner )
+                
+                idx = np.minimum( i0 + corner , dims - 1 )
+                w   = np.prod( np.where( corner , t , 1 - t ) , axis = 1 )
+                
+                data.append( w )
+                cols.append( np.ravel_multi_index( idx.T , self.xgriddim ) )
+                rows.append( r )
+        
+        P = sparse.csr_matrix( ( np.concatenate( data ) ,
+                               ( np.concatenate( rows ) , np.concatenate( cols ) ) ),
+                               shape = ( pairs , self.nodes_n ) )
+        
+        P.eliminate_zeros()
+        
+        self.P = P
+        
+        
+    ##############################
+    def save_transition_matrix(self, name = 'transition_matrix' ):
+        """ Save the sparse transition matrix to disk """
+        
+        sparse.save_npz( name , self.P )
+        
+        
+    ##############################
+    def load_transition_matrix(self, name = 'transition_matrix' ):
+        """ Load a sparse transition matrix computed for this grid """
+        
+        if not name.endswith('.npz'):
+            name = name + '.npz'
+            
+        P = sparse.load_npz( name ).tocsr()
+        
+        if not P.shape == ( self.nodes_n * self.actions_n , self.nodes_n ):
+            raise ValueError(
+                "Transition matrix of shape %s does not match the grid" 
+                % ( P.shape , ) )
+            
+        self.P = P
                 
                 
                 
@@ -245,7 +630,10 @@ class GridDynamicSystem3D(GridDynamicSystem):
     """ Create a discrete gird state-action space for 3D continous dynamic system, two continuous input u """
     
     ############################
-    def __init__(self, sys , dt = 0.05 , x_n = 21 ,  u_n = 11 ):
+    def __init__(self, sys , dt = 0.05 , x_n = 21 ,  u_n = 11 , 
+                 lookup_memory = None , lookup_dtype = np.float32 , 
+                 lookup_quantized = False , lookup_file = None , 
+                 cache_dir = None , integrator = 'euler' , substeps = 1 ):
         
         self.sys = sys # Dynamic system class
         
@@ -253,6 +641,9 @@ class GridDynamicSystem3D(GridDynamicSystem):
         
         # Simple 1-DoF
         self.dt    = dt        # time discretization
+        
+        self.integrator = integrator
+        self.substeps   = substeps
         self.x0_n  = x_n       # x discretizatio
         self.x1_n  = x_n       # dx discretization
         self.x2_n  = x_n       # dx discretization
@@ -260,7 +651,18 @@ class GridDynamicSystem3D(GridDynamicSystem):
         self.u1_n  = u_n
         
         # Options
-        self.uselookuptable = False # Too Big
+        # Too Big for a dense table, only used if memory bounded or on disk
+        self.uselookuptable      = not( lookup_memory is None and lookup_file is None 
+                                        and cache_dir is None )
+        self.usetransitionmatrix = False
+        
+        self.lookup_memory    = lookup_memory
+        self.lookup_dtype     = lookup_dtype
+        self.lookup_quantized = lookup_quantized
+        self.lookup_file      = lookup_file
+        self.cache_dir        = cache_dir
+        
+        self.P = None
         
         self.compute()  
             
@@ -300,53 +702,7 @@ class GridDynamicSystem3D(GridDynamicSystem):
         self.actions_n         =   self.u0_n * self.u1_n
         self.actions_input     =   np.zeros(( self.actions_n , self.sys.m ), dtype = float )  # Number of actions x inputs dimensions
         self.actions_index     =   np.zeros(( self.actions_n , self.sys.m ), dtype = int   )  # Number of actions x inputs dimensions
-        
-        
-    ##############################
-    def generate_nodes(self):
-        """ Compute 1-D list of nodes """
-        
-        # For all state nodes
-        node = 0
-        
-        for i in range(self.x0_n):
-            for j in range(self.x1_n):
-                for k in range(self.x2_n):
-                
-                    # State
-                    x = np.array([ self.xd[0][i]  ,  self.xd[1][j]  , self.xd[2][k] ])
-                    
-                    # State and grid index based on node #
-                    self.nodes_state[node,:] = x
-                    self.nodes_index[node,:] = np.array([i,j,k])
-                    
-                    # Node # based on index ijk
-                    self.x_grid2node[i,j,k]    = node
-    
-                    # Increment node number
-                    node = node + 1
-                
-                
-    ##############################
-    def generate_actions(self):
-        """ Compute 1-D list of actions """
-        
-        # For all state nodes
-        action = 0
-        
-        for l in range(self.u0_n):
-            for m in range(self.u1_n):
-                
-                u = np.array([ self.ud[0][l] , self.ud[1][m] ])
                 
-                # State and grid index based on node #
-                self.actions_input[action,:] = u
-                self.actions_index[action,:] = np.array([l,m])
-    
-                # Increment node number
-                action = action + 1
-                
-
 
 
 '''
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Coarse-to-fine value iteration on a sequence of GridDynamicSystem
+
+"""
+
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator as rgi
+
+from pyro.planning import discretizer
+from pyro.planning import valueiteration
+
+
+##############################################################################
+# Multigrid Value Iteration
+##############################################################################
+
+class MultiGridValueIteration:
+    """
+    Value iteration from a coarse grid to the target resolution
+    -------------------------------------------------------------------------
+    xgriddims : list of grid sizes, from coarse to fine, last one is the target
+    sweeps    : max number of sweeps per level ( int or one per level )
+    dt        : time step ( float or one per level )
+    threshold : residual stopping rule ( float or one per level )
+
+    The cost-to-go converged on a level is interpolated on the nodes of the
+    next finer grid and used as the initial J of its value iteration.
+    Loose thresholds on the coarse levels are usually enough, most of the
+    work should be left to the cheap levels.
+
+    Every level must resolve the target set: zero cost cycles ( ex: target
+    nodes of a TimeCostFunction ) keep the warm start value of their J.
+
+    """
+
+    ############################
+    def __init__(self, sys, cost_function, xgriddims, ugriddim=(11, 1),
+                 dt=0.05, sweeps=200, threshold=1.0e-6):
+
+        self.sys = sys
+        self.cf  = cost_function
+
+        self.xgriddims = [tuple(xgriddim) for xgriddim in xgriddims]
+        self.ugriddim  = ugriddim
+
+        levels_n = len(self.xgriddims)
+
+        self.dts        = np.broadcast_to(dt, levels_n)
+        self.sweeps     = np.broadcast_to(sweeps, levels_n)
+        self.thresholds = np.broadcast_to(threshold, levels_n)
+
+        # Options
+        self.rtol         = 0.0     # relative tolerance of compute_steps
+        self.grid_options = {}      # kwargs of GridDynamicSystem
+        self.vi_options   = {}      # attributes set on each ValueIteration_ND
+
+        # Solution of each level
+        self.grid_systems = []
+        self.solvers      = []
+        self.histories    = []
+
+    ##############################
+    def prolongate(self, vi, grid_sys):
+        """ Interpolate the cost-to-go of solver vi on the nodes of grid_sys """
+
+        J_interpol = rgi(vi.grid_sys.xd, vi.J, bounds_error=False,
+                         fill_value=None)
+
+        J = J_interpol(grid_sys.nodes_state)
+
+        # Nodes next to infeasible ones are not known better than INF
+        J = np.minimum(J, self.cf.INF)
+
+        return J.reshape(grid_sys.xgriddim)
+
+    ##############################
+    def compute_level(self, level):
+        """ Discretize and solve one level, warm started from the last one """
+
+        grid_sys = discretizer.GridDynamicSystem(self.sys,
+                                                 self.xgriddims[level],
+                                                 self.ugriddim,
+                                                 self.dts[level],
+                                                 **self.grid_options)
+
+        vi = valueiteration.ValueIteration_ND(grid_sys, self.cf)
+
+        for key, value in self.vi_options.items():
+            setattr(vi, key, value)
+
+        vi.initialize()
+
+        if level > 0:
+            vi.J = self.prolongate(self.solvers[-1], grid_sys)
+
+        history = vi.compute_steps(int(self.sweeps[level]) - 1, False,
+                                   self.thresholds[level], rtol=self.rtol)
+
+        print('Level', level, self.xgriddims[level], ':', len(history),
+              'sweeps')
+
+        self.grid_systems.append(grid_sys)
+        self.solvers.append(vi)
+        self.histories.append(history)
+
+        return vi
+
+    ##############################
+    def compute(self):
+        """ Solve all levels, return the solver of the target grid """
+
+        self.grid_systems = []
+        self.solvers      = []
+        self.histories    = []
+
+        for level in range(len(self.xgriddims)):
+            vi = self.compute_level(level)
+
+        # Target resolution solution
+        self.grid_sys      = vi.grid_sys
+        self.vi            = vi
+        self.J             = vi.J
+        self.action_policy = vi.action_policy
+
+        return vi
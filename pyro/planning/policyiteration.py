@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Policy iteration on the grid of a GridDynamicSystem
+
+"""
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+from pyro.planning import valueiteration
+
+
+##############################################################################
+# Policy Iteration generic algo
+##############################################################################
+
+class PolicyIteration_ND(valueiteration.ValueIteration_ND):
+    """
+    Dynamic programming for continuous dynamic system with policy iteration
+    -------------------------------------------------------------------------
+    Each step evaluates the cost-to-go of the current policy with a sparse
+    linear solve ( or k value sweeps with a fixed policy for modified policy
+    iteration ) and then improves the policy greedily, with the same discount
+    factor. A node keeps its action unless another one is strictly better,
+    such that the iterations stop on ties.
+
+    With k sweeps, over-estimated costs on nodes that loop on themselves
+    only decrease at the rate of the discount factor: the policy converges
+    but J can stay above the value iteration solution.
+
+    Uses the sparse transition matrix of grid_sys, computed if missing.
+    Outputs J and action_policy like ValueIteration_ND.
+
+    """
+
+    ############################
+    def __init__(self, grid_sys, cost_function):
+
+        valueiteration.ValueIteration_ND.__init__(self, grid_sys, cost_function)
+
+        # Options
+        self.evaluation_sweeps = None  # None: exact solve, k: modified PI
+
+        # Close to 1 such that the evaluation system is never singular,
+        # policies that never reach the target get a cost above INF
+        self.discount = 1.0 - 1.0e-6
+
+        # Policy being evaluated, node major, -1 where no action is valid
+        self.policy = None
+
+        # Number of nodes with a new action at the last improvement
+        self.policy_changes = 0
+
+    ##############################
+    def initialize(self):
+        """ initialize cost-to-go and greedy policy """
+
+        valueiteration.ValueIteration_ND.initialize(self)
+
+        if self.grid_sys.P is None:
+            self.grid_sys.compute_transition_matrix()
+
+        # Greedy policy with respect to the final cost
+        self.policy = self.greedy_policy(self.compute_Q_discounted(self.J))
+
+    ###############################
+    def compute_Q_discounted(self, J):
+        """ Q values G + discount * P J of all node-action pairs """
+
+        return self.compute_Q(self.discount * J)
+
+    ###############################
+    def greedy_policy(self, Q, incumbent=None):
+        """ 
+        Best valid action of all nodes, -1 if no action is valid
+        ----------------------------------------------------------
+        incumbent : current policy, its action is kept on the nodes where
+                    no other action is strictly better
+        
+        """
+
+        action_isok = self.grid_sys.action_isok
+
+        Q = np.where(action_isok, Q, np.inf)
+
+        policy = Q.argmin(axis=1)
+
+        if incumbent is not None:
+
+            nodes = np.arange(policy.size)
+            keep  = (incumbent >= 0) & (
+                Q[nodes, np.maximum(incumbent, 0)] <= Q[nodes, policy])
+
+            policy[keep] = incumbent[keep]
+
+        policy[~action_isok.any(axis=1)] = -1
+
+        return policy
+
+    ###############################
+    def policy_matrices(self, policy):
+        """
+        Transition matrix and stage cost of a fixed policy
+        ---------------------------------------------------
+        P_pi : dim = ( nodes_n , nodes_n ) sparse
+        G_pi : dim = ( nodes_n )
+
+        """
+
+        if self.G is None:
+            self.compute_stage_cost()
+
+        nodes_n   = self.grid_sys.nodes_n
+        actions_n = self.grid_sys.actions_n
+
+        rows = np.arange(nodes_n) * actions_n + np.maximum(policy, 0)
+
+        P_pi = self.grid_sys.P[rows]
+        G_pi = self.G.ravel()[rows]
+
+        return P_pi, G_pi
+
+    ###############################
+    def evaluate_policy(self, policy):
+        """
+        Cost-to-go of a fixed policy ( 1-D array of actions, -1: no action )
+        ---------------------------------------------------------------------
+        exact : solve ( I - discount P_pi ) J = G_pi , J = INF without action
+        k     : k sweeps of J = G_pi + discount P_pi J from the current J
+
+        """
+
+        INF = float(self.cf.INF)
+
+        P_pi, G_pi = self.policy_matrices(policy)
+
+        feasible = policy >= 0
+
+        if self.evaluation_sweeps is None:
+
+            J = np.full(policy.size, INF)
+
+            f = np.flatnonzero(feasible)
+            i = np.flatnonzero(~feasible)
+
+            if f.size > 0:
+
+                P_f = P_pi[f]
+
+                A = (sparse.identity(f.size, format='csc')
+                     - self.discount * P_f[:, f].tocsc())
+                b = G_pi[f] + self.discount * P_f[:, i].dot(J[i])
+
+                J[f] = spsolve(A, b)
+
+        else:
+
+            J = self.J.ravel().copy()
+
+            for k in range(self.evaluation_sweeps):
+
+                J = np.where(feasible, G_pi + self.discount * P_pi.dot(J), INF)
+
+        return J
+
+    ###############################
+    def compute_step(self):
+        """ One step of policy iteration: evaluation and improvement """
+
+        if self.policy is None:
+            self.policy = self.greedy_policy(self.compute_Q_discounted(self.J))
+
+        J_pi = self.evaluate_policy(self.policy)
+
+        # Greedy improvement, with the discount of the evaluation
+        Q = self.compute_Q_discounted(J_pi.reshape(self.grid_sys.xgriddim))
+
+        new_policy = self.greedy_policy(Q, self.policy)
+
+        self.policy_changes = np.sum(new_policy != self.policy)
+        self.policy         = new_policy
+
+        print('Policy changes:', self.policy_changes)
+
+        # Outputs like value iteration, -1 where the cost is above INF
+        return self.assign_backup(Q.min(axis=1), new_policy.copy())
@@ -7,15 +7,23 @@ Created on Wed Jul 12 12:09:37 2017
 
 import sys
 import os
+import time
+import itertools
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
 import numpy as np
+from scipy import sparse
 import matplotlib.pyplot as plt
 from scipy.interpolate import RectBivariateSpline as interpol2D
 from scipy.interpolate import RegularGridInterpolator as rgi
 
 from mpl_toolkits.mplot3d import Axes3D
 
+from pyro.dynamic import system
 from pyro.control import controller
+from pyro.planning import discretizer
 
 
 '''
@@ -64,6 +72,119 @@ class ViController(controller.StaticController):
         
         return u
     
+    #############################
+    @system.vectorized('c')
+    def c_batch( self , Y , R , t = 0 ):
+        """ Vectorized lookup when the law is a GridPolicy """
+        
+        if hasattr( self.vi_law , 'batch' ):
+            return self.vi_law.batch( Y ).reshape( Y.shape[0] , self.m )
+        
+        return controller.StaticController.c_batch( self , Y , R , t )
+    
+
+
+class GridPolicy:
+    """ 
+    Compiled lookup of a control policy defined on a regular grid
+    ---------------------------------------------------------------
+    xd     : list of the n grid axes ( evenly spaced )
+    u_grid : control inputs on the grid, dim = xgriddim + ( m , )
+    method : 'linear' ( multilinear interpolation ) or 'nearest'
+    ---------------------------------------------------------------
+    u = policy( x )      for x of dim n
+    U = policy.batch( X ) for X of dim N x n
+    
+    States outside of the grid are clamped to its bounds.
+    
+    """
+    ############################
+    def __init__(self, xd, u_grid, method='linear'):
+        
+        if method not in ('linear', 'nearest'):
+            raise ValueError("Unknown policy interpolation: %s" % method)
+        
+        self.method = method
+        
+        self.xd     = [np.asarray(axis, dtype=float) for axis in xd]
+        self.dims   = np.array([axis.size for axis in self.xd])
+        self.n      = len(self.xd)
+        
+        u_grid = np.asarray(u_grid, dtype=float)
+        
+        self.m      = u_grid.shape[-1]
+        self.table  = u_grid.reshape(-1, self.m)  # C-order ravel of the grid
+        
+        self.lb     = np.array([axis[0] for axis in self.xd])
+        self.step   = np.ones(self.n)
+        for i in range(self.n):
+            if self.dims[i] > 1:
+                self.step[i] = (self.xd[i][-1] - self.xd[i][0]) / (self.dims[i] - 1)
+        
+        # Flat index offsets of the 2^n corners of a cell, the upper corner
+        # of a single node axis ( zero weight ) stays on the node
+        self.strides = np.array([int(np.prod(self.dims[i + 1:]))
+                                 for i in range(self.n)])
+        self.corners = np.array(list(itertools.product((0, 1), repeat=self.n)),
+                                dtype=bool)
+        self.offsets = self.corners.dot(self.strides * (self.dims > 1))
+        
+    #############################
+    def batch(self, X):
+        """ Control inputs of N states : dim = N x m """
+        
+        X = np.asarray(X, dtype=float).reshape(-1, self.n)
+        
+        s = np.clip((X - self.lb) / self.step, 0, self.dims - 1)
+        
+        if self.method == 'nearest':
+            
+            i = np.rint(s).astype(int)
+            
+            return self.table[i.dot(self.strides)]
+        
+        i0 = np.minimum(s.astype(int), np.maximum(self.dims - 2, 0))
+        t  = s - i0
+        
+        # Weights of the corners : N x 2^n
+        w = np.prod(np.where(self.corners, t[:, None, :], 1 - t[:, None, :]),
+                    axis=2)
+        
+        nodes = i0.dot(self.strides)[:, None] + self.offsets
+        
+        return np.einsum('nc,ncm->nm', w, self.table[nodes])
+    
+    #############################
+    def __call__(self, x, t=0):
+        """ Control inputs of a single state : dim = m """
+        
+        return self.batch(x)[0]
+    
+    #############################
+    def save(self, name='vi_policy'):
+        """ Save the policy in a compressed npz file """
+        
+        axes = {'xd_%d' % i: self.xd[i] for i in range(self.n)}
+        
+        np.savez_compressed(name, method=self.method, table=self.table,
+                            dims=self.dims, **axes)
+    
+    #############################
+    @classmethod
+    def load(cls, name='vi_policy'):
+        """ Load a policy saved with save """
+        
+        if not name.endswith('.npz'):
+            name = name + '.npz'
+        
+        data = np.load(name)
+        
+        n  = data['dims'].size
+        xd = [data['xd_%d' % i] for i in range(n)]
+        
+        u_grid = data['table'].reshape(tuple(data['dims']) + (-1,))
+        
+        return cls(xd, u_grid, str(data['method']))
 
 
 ##############################################################################
@@ -145,7 +266,7 @@ class ValueIteration_2D:
                     
                     if self.uselookuptable:
                         
-                        x_next        = self.grid_sys.x_next[node,action,:]
+                        x_next        = self.grid_sys.get_x_next( node , node + 1 )[ 0 , action , : ]
                         action_isok   = self.grid_sys.action_isok[node,action]
                         
                     else:
@@ -350,6 +471,112 @@ class ValueIteration_2D:
         
         
         
+##############################################################################
+# Parallel sweeps: worker processes
+##############################################################################
+
+# Arrays of the worker process, attached once by the pool initializer
+_worker = {}
+
+
+def share_array(a):
+    """ 
+    Copy an array in a new shared memory block
+    ----------------------------------------------
+    return the block and a pickable spec to attach it in other processes
+    
+    """
+
+    a   = np.ascontiguousarray(a)
+    shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+
+    view    = np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)
+    view[:] = a
+
+    return shm, ('shm', shm.name, a.shape, a.dtype.str, 0)
+
+
+def attach_array(spec):
+    """ Numpy view of a shared memory block or of a memmap file """
+
+    kind, name, shape, dtype, offset = spec
+
+    if kind == 'file':
+        return None, np.memmap(name, dtype=dtype, mode='r', shape=shape,
+                               offset=offset)
+
+    # Block owned and unlinked by the parent process ( close_pool )
+    shm = shared_memory.SharedMemory(name=name)
+
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def release_pool(pool, blocks):
+    """ Stop a worker pool and unlink its shared memory blocks """
+
+    if pool is not None:
+        pool.shutdown()
+
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+    blocks.clear()
+
+
+def vi_worker_init(spec):
+    """ Pool initializer: attach the shared arrays of the VI problem """
+
+    _worker.clear()
+    _worker['spec'] = spec
+    _worker['shm']  = []
+
+    for key, array_spec in spec['arrays'].items():
+        shm, a = attach_array(array_spec)
+        _worker[key] = a
+        if shm is not None:
+            _worker['shm'].append(shm)
+
+    if 'P_data' in _worker:
+        _worker['P'] = sparse.csr_matrix(
+            (_worker['P_data'], _worker['P_indices'], _worker['P_indptr']),
+            shape=spec['P_shape'])
+
+
+def vi_worker_backup(start, stop):
+    """ Bellman backup of nodes start to stop, written in shared Jnew """
+
+    spec      = _worker['spec']
+    actions_n = spec['actions_n']
+
+    J    = _worker['J'].reshape(spec['xgriddim'])
+    isok = _worker['action_isok'][start:stop]
+    G    = _worker['G'][start:stop]
+
+    Q = np.full(isok.shape, spec['INF'], dtype=float)
+
+    if 'P' in _worker:
+
+        P_block = _worker['P'][start * actions_n:stop * actions_n]
+        J_next  = P_block.dot(J.ravel()).reshape(isok.shape)
+
+        Q[isok] = G[isok] + J_next[isok]
+
+    else:
+
+        J_interpol = rgi(spec['points'], J, bounds_error=False, fill_value=None)
+
+        x_next = (spec['x_offset']
+                  + spec['x_scale'] * _worker['x_next'][start:stop][isok])
+
+        Q[isok] = G[isok] + J_interpol(x_next)
+
+    _worker['Jnew'][start:stop]   = Q.min(axis=1)
+    _worker['policy'][start:stop] = Q.argmin(axis=1)
+
+    return stop - start
+
+
 ##############################################################################
 # Value Iteration generic algo
 ##############################################################################
@@ -381,35 +608,458 @@ class ValueIteration_ND:
 
         # Options
         self.uselookuptable = True
+        self.usebatchbackup = True  # vectorized backup, needs lookup table
+        self.workers        = 1     # processes used by batch backups
+        self.gaussseidel    = False # in-place updates by blocks of nodes,
+                                    # sequential: workers is not used
+        self.sweep_order    = 'natural' # 'natural', 'alternating', 'distance'
+        self.sweep_target   = None  # state of the 'distance' order, default
+                                    # cf.xbar if defined, else grid center
+        self.gs_blocks      = 100   # number of blocks of a Gauss-Seidel sweep
+        self.sweep_count    = 0
+        self.policy_interpolation = 'linear' # or 'nearest' action
+
+        # Compiled policy of assign_interpol_controller
+        self.grid_policy = None
+
+        # Periodic save of the solution during compute_steps
+        self.checkpoint_file     = None  # name of the npz solution file
+        self.checkpoint_interval = 10    # steps between two checkpoints
+        self.steps_done          = 0     # steps since initialize, or loaded
+
+        # Stage cost g * dt of all node-action pairs (computed once)
+        self.G = None
+
+        # Self-transition split of the transition matrix, for Gauss-Seidel
+        self.P_split = None
+
+        # Log of compute_steps, one record per step
+        self.history_dtype = [('step', int), ('residual', float),
+                              ('residual_mean', float), ('J_max', float),
+                              ('time', float), ('infeasible', float)]
+        self.history = np.zeros(0, dtype=self.history_dtype)
+
+        # Process pool and shared memory blocks of parallel sweeps, released
+        # by close_pool, on leaving a with block, or when the solver is freed
+        self.pool           = None
+        self.pool_finalizer = None
+        self.shared_memory  = []
+        self.shared_arrays  = {}
+
+    ##############################
+    def __enter__(self):
+        return self
+
+    ##############################
+    def __exit__(self, *exc_info):
+        self.close_pool()
 
     ##############################
     def initialize(self):
         """ initialize cost-to-go and policy """
         # Initial evaluation
 
-        # J-arrays and action policy arrays
-        self.J = np.zeros(self.grid_sys.xgriddim, dtype=float)
+        # Final cost of all nodes, ordered like a C-order ravel of the grid
+        J = self.cf.h_batch(self.grid_sys.nodes_state)
+        self.J = np.asarray(J, dtype=float).reshape(self.grid_sys.xgriddim)
+
+        # Action policy array
         self.action_policy = np.zeros(self.grid_sys.xgriddim, dtype=int)
 
+        # Stage cost will be re-evaluated with the current cost function
+        self.G = None
+        self.close_pool()
+
+        self.sweep_count = 0
+        self.steps_done  = 0
+        self.history     = np.zeros(0, dtype=self.history_dtype)
+
         self.Jnew = self.J.copy()
         self.Jplot = self.J.copy()
 
-        # For all state nodes
-        for node in range(self.grid_sys.nodes_n):
-            x = self.grid_sys.nodes_state[node, :]
+        print('J shape:', self.J.shape)
 
-            # use tuple to get dynamic list of indices
-            indices = tuple(self.grid_sys.nodes_index[node, i] for i in range(self.n_dim))
+    ###############################
+    def compute_stage_cost(self):
+        """ Compute the stage cost g * dt of all node-action pairs """
 
-            # Final cost
-            self.J[indices] = self.cf.h(x)
+        nodes_n   = self.grid_sys.nodes_n
+        actions_n = self.grid_sys.actions_n
 
-        print('J shape:', self.J.shape)
+        # All node-action pairs, node major
+        X = np.repeat(self.grid_sys.nodes_state, actions_n, axis=0)
+        U = np.tile(self.grid_sys.actions_input, (nodes_n, 1))
+        Y = self.sys.h_batch(X, U, 0)
+
+        G = self.cf.g_batch(X, U, Y, 0) * np.ravel(self.grid_sys.time_steps())
+
+        self.G = G.reshape(nodes_n, actions_n)
+
+    ###############################
+    def compute_Q(self, J):
+        """ 
+        Q values of all node-action pairs given the cost-to-go J
+        ---------------------------------------------------------
+        Q : array of dim = ( nodes_n , actions_n ), INF for invalid actions
+        
+        """
+
+        if self.G is None:
+            self.compute_stage_cost()
+
+        action_isok = self.grid_sys.action_isok
+
+        Q = np.full(action_isok.shape, self.cf.INF, dtype=float)
+
+        if self.grid_sys.P is not None:
+
+            # Precomputed interpolation weights: single sparse mat-vec
+            J_next = self.grid_sys.P.dot(J.ravel()).reshape(action_isok.shape)
+
+            Q[action_isok] = self.G[action_isok] + J_next[action_isok]
+
+        else:
+
+            # Interpolation of current cost space
+            points     = tuple(self.grid_sys.xd[i] for i in range(self.n_dim))
+            J_interpol = rgi(points, J, bounds_error=False, fill_value=None)
+
+            # Evaluate all next states of a chunk of nodes in a single call
+            for start, stop in self.grid_sys.lookup_chunks():
+
+                isok   = action_isok[start:stop]
+                x_next = self.grid_sys.get_x_next(start, stop)[isok]
+
+                Q[start:stop][isok] = self.G[start:stop][isok] + J_interpol(x_next)
+
+        return Q
+
+    ###############################
+    def split_transition_matrix(self):
+        """ 
+        Split the transition matrix in self-transition weights and others
+        ------------------------------------------------------------------
+        P_self  : weight on its own node of each pair, dim = pairs
+        P_other : P without these weights, dim = ( pairs , nodes_n )
+        
+        """
+
+        P = self.grid_sys.P
+
+        pair  = np.repeat(np.arange(P.shape[0]), np.diff(P.indptr))
+        own   = P.indices == pair // self.grid_sys.actions_n
+
+        P_self = np.bincount(pair[own], P.data[own], minlength=P.shape[0])
+
+        P_other = P.copy()
+        P_other.data[own] = 0.0
+        P_other.eliminate_zeros()
+
+        self.P_split = (P, P_self, P_other)
+
+    ###############################
+    def compute_Q_nodes(self, J, nodes, split=False):
+        """ 
+        Q values of the actions of a list of nodes : len(nodes) x actions_n
+        --------------------------------------------------------------------
+        split : with the transition matrix, the weight P_ii of a pair on its
+                own node i is solved for instead of using the current J_i
+                
+                Q = ( G + sum_j!=i P_ij J_j ) / ( 1 - P_ii )
+                
+                the min over the actions is then the fixed point of node i 
+                given the values of the other nodes
+        
+        """
+
+        if self.G is None:
+            self.compute_stage_cost()
+
+        actions_n = self.grid_sys.actions_n
+
+        isok = self.grid_sys.action_isok[nodes]
+        G    = self.G[nodes]
+
+        Q = np.full(isok.shape, self.cf.INF, dtype=float)
+
+        if self.grid_sys.P is not None and split:
+
+            if self.P_split is None or self.P_split[0] is not self.grid_sys.P:
+                self.split_transition_matrix()
+
+            P, P_self, P_other = self.P_split
+
+            rows    = (nodes[:, None] * actions_n + np.arange(actions_n)).ravel()
+            J_other = P_other[rows].dot(J.ravel()).reshape(isok.shape)
+            w       = P_self[rows].reshape(isok.shape)
+
+            # Pairs staying on their node: plain backup
+            stay = w > 1 - 1e-9
+            J_i  = J.ravel()[nodes][:, None]
+
+            Q_next = np.where(stay, G + J_other + w * J_i,
+                              (G + J_other) / np.where(stay, 1.0, 1 - w))
+
+            Q[isok] = Q_next[isok]
+
+        elif self.grid_sys.P is not None:
+
+            rows   = (nodes[:, None] * actions_n + np.arange(actions_n)).ravel()
+            J_next = self.grid_sys.P[rows].dot(J.ravel()).reshape(isok.shape)
+
+            Q[isok] = G[isok] + J_next[isok]
+
+        else:
+
+            points     = tuple(self.grid_sys.xd[i] for i in range(self.n_dim))
+            J_interpol = rgi(points, J, bounds_error=False, fill_value=None)
+
+            x_next = self.grid_sys.get_x_next_nodes(nodes)[isok]
+
+            Q[isok] = G[isok] + J_interpol(x_next)
+
+        return Q
+
+    ###############################
+    def compute_batch_step(self):
+        """ One step of value iteration using whole-array operations """
+
+        Q = self.compute_Q(self.J)
+
+        return self.assign_backup(Q.min(axis=1), Q.argmin(axis=1))
+
+    ###############################
+    def sweep_ordering(self, sweep=0):
+        """ 
+        Order of the nodes for a Gauss-Seidel sweep
+        ---------------------------------------------
+        natural     : node number order
+        alternating : grid axes reversed following the bits of the sweep #, 
+                      cycling through the 2^n sweep directions
+        distance    : increasing distance to sweep_target, scaled by grid 
+                      ranges ( default cf.xbar if defined, else the grid 
+                      center )
+        
+        """
+
+        g = self.grid_sys
+
+        if self.sweep_order == 'natural':
+
+            return np.arange(g.nodes_n)
+
+        elif self.sweep_order == 'alternating':
+
+            nodes = np.arange(g.nodes_n).reshape(g.xgriddim)
+
+            flip = [i for i in range(self.n_dim) if (sweep >> i) & 1]
+
+            return np.flip(nodes, axis=flip).ravel()
+
+        elif self.sweep_order == 'distance':
+
+            x_min = g.nodes_state.min(axis=0)
+            x_max = g.nodes_state.max(axis=0)
+
+            if self.sweep_target is not None:
+                target = np.asarray(self.sweep_target, dtype=float)
+            elif hasattr(self.cf, 'xbar'):
+                target = self.cf.xbar
+            else:
+                target = 0.5 * (x_min + x_max)
+
+            x_range = x_max - x_min
+            x_range = np.where(x_range > 0, x_range, 1.0)
+
+            d = np.linalg.norm((g.nodes_state - target) / x_range, axis=1)
+
+            return np.argsort(d, kind='stable')
+
+        else:
+            raise ValueError('Unknown sweep order: %s' % self.sweep_order)
+
+    ###############################
+    def compute_gauss_seidel_step(self):
+        """ 
+        One step of value iteration updating J in place by blocks of nodes
+        -------------------------------------------------------------------
+        backups of a block use the values of the blocks already updated 
+        during the sweep, and with the transition matrix the self-transition
+        weight of each node is solved for ( see compute_Q_nodes ). 
+        Sweeps are sequential, use workers = 1.
+        
+        """
+
+        if self.workers > 1:
+            raise ValueError('Gauss-Seidel sweeps are sequential, '
+                             'set workers = 1 or gaussseidel = False')
+
+        order  = self.sweep_ordering(self.sweep_count)
+        blocks = np.array_split(order, min(self.gs_blocks, order.size))
+
+        self.sweep_count = self.sweep_count + 1
+
+        # Working copy updated in place, self.J kept for the residual
+        J      = self.J.copy()
+        J_flat = J.reshape(-1)
+        policy = self.action_policy.ravel().copy()
+
+        for nodes in blocks:
+
+            Q = self.compute_Q_nodes(J, nodes, split=True)
+
+            J_flat[nodes] = Q.min(axis=1)
+            policy[nodes] = Q.argmin(axis=1)
+
+        return self.assign_backup(J_flat, policy)
+
+    ###############################
+    def start_pool(self):
+        """ 
+        Start worker processes sharing the VI arrays
+        ---------------------------------------------
+        J , Jnew , policy , G , action_isok and the lookup table ( or the 
+        transition matrix ) are placed once in shared memory, a memmap 
+        lookup table is opened directly from its file by the workers
+        
+        """
+
+        try:
+            self._start_pool()
+        except BaseException:
+            self.close_pool()
+            raise
+
+        # Backstop if the solver is dropped without close_pool
+        self.pool_finalizer = weakref.finalize(self, release_pool, self.pool,
+                                               self.shared_memory)
+
+    ###############################
+    def _start_pool(self):
+
+        if self.G is None:
+            self.compute_stage_cost()
+
+        g = self.grid_sys
+
+        arrays = {'J'          : self.J.ravel(),
+                  'Jnew'       : np.zeros(g.nodes_n),
+                  'policy'     : np.zeros(g.nodes_n, dtype=int),
+                  'G'          : self.G,
+                  'action_isok': g.action_isok}
+
+        if g.P is not None:
+            arrays['P_data']    = g.P.data
+            arrays['P_indices'] = g.P.indices
+            arrays['P_indptr']  = g.P.indptr
+
+        specs = {}
+        self.shared_arrays = {}
+
+        for key, a in arrays.items():
+            shm, specs[key] = share_array(a)
+            self.shared_memory.append(shm)
+            self.shared_arrays[key] = np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)
+
+        if g.P is None:
+            if isinstance(g.x_next, np.memmap):
+                specs['x_next'] = ('file', g.x_next.filename, g.x_next.shape,
+                                   g.x_next.dtype.str, g.x_next.offset)
+            else:
+                shm, specs['x_next'] = share_array(g.x_next)
+                self.shared_memory.append(shm)
+
+        x_offset, x_scale = g.lookup_decoding()
+
+        spec = {'arrays'   : specs,
+                'xgriddim' : g.xgriddim,
+                'actions_n': g.actions_n,
+                'points'   : tuple(g.xd[i] for i in range(self.n_dim)),
+                'INF'      : self.cf.INF,
+                'x_offset' : x_offset,
+                'x_scale'  : x_scale,
+                'P_shape'  : None if g.P is None else g.P.shape}
+
+        self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                        initializer=vi_worker_init,
+                                        initargs=(spec,))
+
+    ###############################
+    def close_pool(self):
+        """ Stop worker processes and release the shared memory """
+
+        if self.pool_finalizer is not None:
+            self.pool_finalizer.detach()
+            self.pool_finalizer = None
+
+        release_pool(self.pool, self.shared_memory)
+
+        self.pool          = None
+        self.shared_memory = []
+        self.shared_arrays = {}
+
+    ###############################
+    def compute_parallel_step(self):
+        """ One step of value iteration with node blocks in worker processes """
+
+        if self.pool is None:
+            self.start_pool()
+
+        nodes_n = self.grid_sys.nodes_n
+
+        # Blocks: a few per worker for load balancing, bounded by lookup chunks
+        block  = -(-nodes_n // (4 * self.workers))
+        block  = max(1, min(block, self.grid_sys.lookup_chunk_size()))
+        starts = list(range(0, nodes_n, block))
+        stops  = [min(start + block, nodes_n) for start in starts]
+
+        # Only J is sent at each sweep, through shared memory
+        self.shared_arrays['J'][:] = self.J.ravel()
+
+        try:
+            list(self.pool.map(vi_worker_backup, starts, stops))
+        except BaseException:
+            self.close_pool()
+            raise
+
+        Jnew   = self.shared_arrays['Jnew'].copy()
+        policy = self.shared_arrays['policy'].copy()
+
+        return self.assign_backup(Jnew, policy)
+
+    ###############################
+    def assign_backup(self, Jnew, policy):
+        """ Update J and policy from the backup of all nodes """
+
+        # Impossible situation ( unaceptable situation for any control actions )
+        policy[Jnew > (self.cf.INF - 1)] = -1
+
+        # Nodes are ordered like a C-order ravel of the grid
+        self.Jnew          = Jnew.reshape(self.grid_sys.xgriddim)
+        self.action_policy = policy.reshape(self.grid_sys.xgriddim)
+
+        # Convergence check
+        delta = self.J - self.Jnew
+        j_max = self.Jnew.max()
+        delta_max = delta.max()
+        delta_min = delta.min()
+        print('Max:', j_max, 'Delta max:', delta_max, 'Delta min:', delta_min)
+
+        self.J = self.Jnew.copy()
+
+        return delta_min
 
     ###############################
     def compute_step(self):
         """ One step of value iteration """
 
+        if self.usebatchbackup and self.uselookuptable:
+            if self.gaussseidel:
+                return self.compute_gauss_seidel_step()
+            if self.workers > 1:
+                return self.compute_parallel_step()
+            return self.compute_batch_step()
+
         # Get interpolation of current cost space
         if self.n_dim == 2:
             J_interpol = interpol2D(self.grid_sys.xd[0], self.grid_sys.xd[1],
@@ -441,7 +1091,7 @@ class ValueIteration_ND:
 
                 if self.uselookuptable:
 
-                    x_next = self.grid_sys.x_next[node, action, :]
+                    x_next = self.grid_sys.get_x_next(node, node + 1)[0, action, :]
                     action_isok = self.grid_sys.action_isok[node, action]
 
                 else:
@@ -496,94 +1146,108 @@ class ValueIteration_ND:
     def assign_interpol_controller(self):
         """ controller from optimal actions """
 
-        # Compute grid of u
-        self.u_policy_grid = []
+        # Inputs of all nodes, zero where no action is good
+        policy = self.action_policy
+        u_grid = self.grid_sys.actions_input[np.maximum(policy, 0)]
+        u_grid[policy == -1] = 0
 
-        # for all inputs
-        for k in range(self.sys.m):
-            self.u_policy_grid.append(np.zeros(self.grid_sys.xgriddim, dtype=float))
+        # Compute grid of u, one per input
+        self.u_policy_grid = [u_grid[..., k] for k in range(self.sys.m)]
 
-        # For all state nodes
-        for node in range(self.grid_sys.nodes_n):
+        # Compiled lookup of all inputs at once
+        self.grid_policy = GridPolicy(self.grid_sys.xd, u_grid,
+                                      self.policy_interpolation)
 
-            # use tuple to get dynamic list of indices
-            indices = tuple(self.grid_sys.nodes_index[node, i] for i in range(self.n_dim))
+        # Asign Controller
+        self.ctl.vi_law = self.grid_policy
 
-            # If no action is good
-            if (self.action_policy[indices] == -1):
+    ################################
+    def vi_law(self, x, t=0):
+        """ controller from optimal actions """
 
-                # for all inputs
-                for k in range(self.sys.m):
-                    self.u_policy_grid[k][indices] = 0
+        return self.grid_policy(x)
 
-            else:
-                # for all inputs
-                for k in range(self.sys.m):
-                    self.u_policy_grid[k][indices] = self.grid_sys.actions_input[self.action_policy[indices], k]
+    ################################
+    def compute_steps(self, l=50, plot=False, threshold=1.0e-25, maxJ=1000,
+                      rtol=0.0, mean_threshold=None):
+        """ 
+        compute value iteration steps until convergence
+        ------------------------------------------------
+        l              : maximum number of steps after the first one
+        threshold      : stop when max |Jnew - J| <= threshold + rtol * max J
+        rtol           : relative tolerance on the max of feasible J
+        mean_threshold : if given, the mean |Jnew - J| must also be below it
+        
+        return the history of these steps, appended to self.history ( the 
+        log of all the steps since initialize, or of the loaded solution )
+        
+        The solution is saved to checkpoint_file, if given, every 
+        checkpoint_interval steps and at the end.
+        
+        """
 
-        # Compute Interpol function
-        self.interpol_functions = []
+        previous = self.history
+        history  = np.zeros(l + 1, dtype=self.history_dtype)
 
-        # for all inputs
-        for k in range(self.sys.m):
-            if self.n_dim == 2:
-                self.interpol_functions.append(
-                    interpol2D(self.grid_sys.xd[0],
-                               self.grid_sys.xd[1],
-                               self.u_policy_grid[k],
-                               bbox=[None, None, None, None],
-                               kx=1, ky=1, ))
-            elif self.n_dim == 3:
-                self.interpol_functions.append(
-                    rgi([self.grid_sys.xd[0], self.grid_sys.xd[1], self.grid_sys.xd[2]], self.u_policy_grid[k]))
-            else:
-                points = tuple(self.grid_sys.xd[i] for i in range(self.n_dim))
-                self.interpol_functions.append(
-                    rgi(points,
-                                            self.u_policy_grid[k],
-                                            method='linear'))
+        # Worker processes of parallel sweeps are released even on errors
+        try:
 
-        # Asign Controller
-        self.ctl.vi_law = self.vi_law
+            step = 0
+            while step <= l:
 
-    ################################
-    def vi_law(self, x, t=0):
-        """ controller from optimal actions """
+                print('Step:', step)
 
-        u = np.zeros(self.sys.m)
+                J_last = self.J.copy()
+                t0 = time.perf_counter()
+                cur_threshold = self.compute_step()
+                dt = time.perf_counter() - t0
+                print('Current threshold', cur_threshold)
 
-        for i in range(self.sys.n):
-            if x[i] < self.sys.x_lb[i]:
-                x[i] = self.sys.x_lb[i]
-            if x[i] > self.sys.x_ub[i]:
-                x[i] = self.sys.x_ub[i]
+                if plot and step == 0:
+                    self.plot_dynamic_cost2go()
+                elif plot:
+                    self.draw_cost2go( step, maxJ )
 
-        # for all inputs
-        for k in range(self.sys.m):
-            if self.n_dim == 2:
-                u[k] = self.interpol_functions[k](x[0], x[1])
-            else:
-                u[k] = self.interpol_functions[k](x)
+                # Residuals and statistics of the step
+                residual = np.abs(self.J - J_last)
+                feasible = self.action_policy != -1
+                if feasible.any():
+                    j_max = self.J[feasible].max()
+                else:
+                    j_max = self.cf.INF
 
-        return u
+                history[step] = (self.steps_done, residual.max(),
+                                 residual.mean(), j_max, dt,
+                                 1.0 - feasible.mean())
 
-    ################################
-    def compute_steps(self, l=50, plot=False, threshold=1.0e-25, maxJ=1000):
-        """ compute number of step """
-        step = 0
-        print('Step:', step)
-        cur_threshold = self.compute_step()
-        print('Current threshold', cur_threshold)
-        if plot:
-            self.plot_dynamic_cost2go()
-        # while abs(cur_threshold) > threshold:
-        while step < l:
-            step = step + 1
-            print('Step:', step)
-            cur_threshold = self.compute_step()
-            print('Current threshold', cur_threshold)
-            if plot:
-                self.draw_cost2go( step, maxJ )
+                self.steps_done = self.steps_done + 1
+
+                # Stopping rule
+                converged = residual.max() <= threshold + rtol * j_max
+                if mean_threshold is not None:
+                    converged = converged and residual.mean() <= mean_threshold
+
+                step = step + 1
+
+                self.history = np.concatenate((previous, history[:step]))
+
+                if converged:
+                    print('Converged after', step, 'steps, residual:',
+                          residual.max())
+                    break
+
+                # Periodic save to resume after an interruption
+                if (self.checkpoint_file is not None
+                        and step % self.checkpoint_interval == 0):
+                    self.save_checkpoint()
+
+            if self.checkpoint_file is not None:
+                self.save_solution(self.checkpoint_file)
+
+        finally:
+            self.close_pool()
+
+        return history[:step]
 
     ################################
     def plot_dynamic_cost2go(self):
@@ -615,17 +1279,8 @@ class ValueIteration_ND:
         #TODO update next line for deciding axis to plot
         #plot = self.Jplot.T if self.n_dim == 2 else self.Jplot[..., 0].T
         
-        if self.n_dim == 2:
-            plot = self.Jplot.T
-            
-        elif self.n_dim == 3:
-            plot = self.Jplot[..., 0].T
-            
-        elif self.n_dim == 4:
-            plot = self.Jplot[...,0,0].T
-            
-        else:
-            raise NotImplementedError()
+        # Slice of the first two states, other states at their first node
+        plot = self.Jplot[(slice(None), slice(None)) + (0,) * (self.n_dim - 2)].T
             
         
         self.im1_dynamic = plt.pcolormesh(self.grid_sys.xd[0],
@@ -655,17 +1310,8 @@ class ValueIteration_ND:
         self.Jplot = self.J.copy()
         self.create_Jplot()
         
-        if self.n_dim == 2:
-            plot = self.Jplot.T
-            
-        elif self.n_dim == 3:
-            plot = self.Jplot[..., 0].T
-            
-        elif self.n_dim == 4:
-            plot = self.Jplot[...,0,0].T
-            
-        else:
-            raise NotImplementedError()
+        # Slice of the first two states, other states at their first node
+        plot = self.Jplot[(slice(None), slice(None)) + (0,) * (self.n_dim - 2)].T
         
         self.im1_dynamic.set_array(np.ravel(plot))
         self.time_text.set_text(self.step_text_template % ( step ))
@@ -679,23 +1325,7 @@ class ValueIteration_ND:
         maxJ = self.plot_max_J
         
         ## Saturation function for cost
-        if self.n_dim == 2:
-            for i in range(self.grid_sys.xgriddim[0]):
-                for j in range(self.grid_sys.xgriddim[1]):
-                    self.Jplot[i, j] = maxJ if self.J[i, j] >= maxJ else self.J[i, j]
-                    
-        elif self.n_dim == 3:
-            for i in range(self.grid_sys.xgriddim[0]):
-                for j in range(self.grid_sys.xgriddim[1]):
-                    for k in range(len(self.J[i, j])):
-                        self.Jplot[i, j, k] = maxJ if self.J[i, j, k] >= maxJ else self.J[i, j, k]
-                        
-        elif self.n_dim == 4:
-            for i in range(self.grid_sys.xgriddim[0]):
-                for j in range(self.grid_sys.xgriddim[1]):
-                    for k in range(self.grid_sys.xgriddim[2]):
-                        for l in range(self.grid_sys.xgriddim[3]):
-                            self.Jplot[i, j, k, l] = maxJ if self.J[i, j, k, l] >= maxJ else self.J[i, j, k, l]
+        self.Jplot = np.minimum(self.J, maxJ)
         
 
     ################################
@@ -725,17 +1355,8 @@ class ValueIteration_ND:
 
         #plot = policy_plot.T if self.n_dim == 2 else policy_plot[..., 0].T
         
-        if self.n_dim == 2:
-            plot = policy_plot.T
-            
-        elif self.n_dim == 3:
-            plot = policy_plot[..., 0].T
-            
-        elif self.n_dim == 4:
-            plot = policy_plot[...,0,0].T
-            
-        else:
-            raise NotImplementedError()
+        # Slice of the first two states, other states at their first node
+        plot = policy_plot[(slice(None), slice(None)) + (0,) * (self.n_dim - 2)].T
         
         plt.ylabel(yname, fontsize=self.fontsize)
         plt.xlabel(xname, fontsize=self.fontsize)
@@ -818,3 +1439,123 @@ class ValueIteration_ND:
 
         np.save(prefix + name + '_J', self.J)
         np.save(prefix + name + '_a', self.action_policy.astype(int))
+
+        # Controller ready to be loaded with GridPolicy.load
+        if self.grid_policy is not None:
+            self.grid_policy.save(prefix + name + '_policy')
+
+    ################################
+    def solution_hashes(self):
+        """ Hashes of the grid ( system, grids, dt ) and of the cost function """
+
+        return {'grid_hash': self.grid_sys.grid_hash(),
+                'cost_hash': discretizer.parameters_hash(self.cf)}
+
+    ################################
+    def save_solution(self, name='DP_solution', prefix=''):
+        """ 
+        Save the solution in a single compressed npz file
+        --------------------------------------------------
+        J, action_policy, grid axes, actions, dt, numerical parameters of 
+        the cost function ( cf_* ), history and hashes used by load_solution
+        
+        """
+
+        filename = prefix + name
+        if not filename.endswith('.npz'):
+            filename = filename + '.npz'
+
+        data = {'J': self.J,
+                'action_policy': self.action_policy.astype(int),
+                'xgriddim': np.array(self.grid_sys.xgriddim),
+                'actions_input': self.grid_sys.actions_input,
+                'dt': self.grid_sys.dt,
+                'steps_done': self.steps_done,
+                'history': self.history,
+                'cost_function': type(self.cf).__name__}
+
+        for i, axis in enumerate(getattr(self.grid_sys, 'xd', [])):
+            data['xd_%d' % i] = axis
+
+        for key, value in vars(self.cf).items():
+            if isinstance(value, (int, float, bool, np.ndarray)):
+                data['cf_' + key] = value
+
+        data.update(self.solution_hashes())
+
+        # Written next to the file then renamed, an interrupted save
+        # never corrupts the last checkpoint
+        temporary = filename + '.tmp'
+
+        with open(temporary, 'wb') as f:
+            np.savez_compressed(f, **data)
+
+        os.replace(temporary, filename)
+
+    ################################
+    def save_checkpoint(self):
+        """ Save the solution during compute_steps """
+
+        self.save_solution(self.checkpoint_file)
+
+        print('Checkpoint saved after', self.steps_done, 'steps')
+
+    ################################
+    def load_solution(self, name='DP_solution', prefix='', check=True):
+        """ 
+        Load a solution saved with save_solution
+        -----------------------------------------
+        check : raise a ValueError if the file was computed for another 
+                system, grid, dt or cost function
+        
+        """
+
+        filename = prefix + name
+        if not filename.endswith('.npz'):
+            filename = filename + '.npz'
+
+        data = np.load(filename)
+
+        if not tuple(data['xgriddim']) == tuple(self.grid_sys.xgriddim):
+            raise ValueError("Solution %s of grid %s does not match the grid %s"
+                             % (filename, tuple(data['xgriddim']),
+                                tuple(self.grid_sys.xgriddim)))
+
+        if check:
+            for key, value in self.solution_hashes().items():
+                if not str(data[key]) == value:
+                    raise ValueError("Stale solution %s: %s does not match"
+                                     % (filename, key))
+
+        self.J             = data['J']
+        self.action_policy = data['action_policy']
+        self.steps_done    = int(data['steps_done'])
+        self.history       = data['history']
+
+        self.Jnew  = self.J.copy()
+        self.Jplot = self.J.copy()
+
+        print('Solution loaded after', self.steps_done, 'steps')
+
+    ################################
+    def resume(self, name='DP_solution', prefix=''):
+        """ 
+        Initialize, then load a solution or checkpoint if the file exists
+        ------------------------------------------------------------------
+        return True if the solution was loaded
+        
+        """
+
+        self.initialize()
+
+        filename = prefix + name
+        if not filename.endswith('.npz'):
+            filename = filename + '.npz'
+
+        if not os.path.exists(filename):
+            return False
+
+        self.load_solution(name, prefix)
+
+        return True
+